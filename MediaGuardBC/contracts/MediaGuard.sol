@@ -2,6 +2,7 @@
 pragma solidity ^0.8.0;
 
 import "@openzeppelin/contracts/access/Ownable.sol";
+import "@openzeppelin/contracts/utils/cryptography/MerkleProof.sol";
 import "./MediaGuardToken.sol";
 
 contract MediaGuard is Ownable {
@@ -27,6 +28,9 @@ contract MediaGuard is Ownable {
     Post[] public posts;
     mapping(uint256 => bool) public isPostBlocked;
 
+    // Batch anchoring: one Merkle root commits to many already-moderated posts
+    bytes32[] public batchRoots;
+
     event ContentReported(address indexed reporter, address indexed reported);
     event UserBlocked(address indexed user);
     event UserUnblocked(address indexed user);
@@ -34,6 +38,7 @@ contract MediaGuard is Ownable {
     event PostCreated(address indexed author, uint256 indexed postId, string contentHash, uint256 vulgarityScore);
     event PostBlocked(uint256 indexed postId);
     event UnblockRequested(address indexed user);
+    event PostBatchAnchored(uint256 indexed batchId, bytes32 merkleRoot, uint256 postCount);
 
     constructor(address _tokenAddress) {
         token = MediaGuardToken(_tokenAddress);
@@ -83,6 +88,36 @@ contract MediaGuard is Ownable {
         return posts.length;
     }
 
+    function anchorPostBatch(bytes32 _merkleRoot, uint256 _postCount) external onlyOwner {
+        require(_merkleRoot != bytes32(0), "Invalid Merkle root");
+        require(_postCount > 0, "Empty batch");
+
+        uint256 batchId = batchRoots.length;
+        batchRoots.push(_merkleRoot);
+
+        emit PostBatchAnchored(batchId, _merkleRoot, _postCount);
+    }
+
+    function getBatchCount() external view returns (uint256) {
+        return batchRoots.length;
+    }
+
+    function postLeaf(address _author, string memory _contentHash, uint256 _vulgarityScore) public pure returns (bytes32) {
+        // Hashed twice so a leaf can't be passed off as an inner node of the tree
+        return keccak256(abi.encodePacked(keccak256(abi.encode(_author, _contentHash, _vulgarityScore))));
+    }
+
+    function verifyBatchedPost(
+        uint256 _batchId,
+        address _author,
+        string memory _contentHash,
+        uint256 _vulgarityScore,
+        bytes32[] memory _proof
+    ) external view returns (bool) {
+        require(_batchId < batchRoots.length, "Batch does not exist");
+        return MerkleProof.verify(_proof, batchRoots[_batchId], postLeaf(_author, _contentHash, _vulgarityScore));
+    }
+
     function requestUnblock() external {
         require(isBlocked[msg.sender], "User is not blocked");
         require(!hasUnblockRequest[msg.sender], "User already has a pending unblock request");
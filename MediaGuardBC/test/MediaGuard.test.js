@@ -1,6 +1,37 @@
 const MediaGuardToken = artifacts.require("MediaGuardToken");
 const MediaGuard = artifacts.require("MediaGuard");
 
+// Same leaves and tree as build_batch in blockchain.py
+const postLeaf = (author, contentHash, vulgarityScore) =>
+  web3.utils.keccak256(web3.utils.keccak256(
+    web3.eth.abi.encodeParameters(["address", "string", "uint256"], [author, contentHash, vulgarityScore])
+  ));
+
+const hashPair = (a, b) =>
+  a.toLowerCase() < b.toLowerCase() ? web3.utils.keccak256(a + b.slice(2)) : web3.utils.keccak256(b + a.slice(2));
+
+const merkleLayers = leaves => {
+  const layers = [leaves];
+  while (layers[layers.length - 1].length > 1) {
+    const layer = layers[layers.length - 1];
+    const next = [];
+    for (let i = 0; i < layer.length; i += 2) {
+      next.push(i + 1 < layer.length ? hashPair(layer[i], layer[i + 1]) : layer[i]);
+    }
+    layers.push(next);
+  }
+  return layers;
+};
+
+const merkleProof = (layers, index) => {
+  const proof = [];
+  for (const layer of layers.slice(0, -1)) {
+    if ((index ^ 1) < layer.length) proof.push(layer[index ^ 1]);
+    index = Math.floor(index / 2);
+  }
+  return proof;
+};
+
 contract("MediaGuard", accounts => {
   let token;
   let mediaGuard;
@@ -100,4 +131,98 @@ contract("MediaGuard", accounts => {
       assert(!user.hasUnblockRequest);
     });
   });
-}); 
\ No newline at end of file
+
+  describe("Batch Anchoring", () => {
+    const batchPosts = count => Array.from({ length: count }, (_, i) => ({
+      author: i % 2 ? user1 : user2,
+      contentHash: web3.utils.sha3(`post ${i}`).slice(2),
+      vulgarityScore: i % 50
+    }));
+
+    const buildBatch = posts => {
+      const layers = merkleLayers(posts.map(p => postLeaf(p.author, p.contentHash, p.vulgarityScore)));
+      return { layers, root: layers[layers.length - 1][0] };
+    };
+
+    it("should anchor a batch root and emit one event", async () => {
+      const { root } = buildBatch(batchPosts(7));
+      const result = await mediaGuard.anchorPostBatch(root, 7, { from: owner });
+      assert.equal(result.logs.length, 1);
+      assert.equal(result.logs[0].event, "PostBatchAnchored");
+      assert.equal(result.logs[0].args.batchId, 0);
+      assert.equal(result.logs[0].args.merkleRoot, root);
+      assert.equal(result.logs[0].args.postCount, 7);
+      assert.equal(await mediaGuard.getBatchCount(), 1);
+      assert.equal(await mediaGuard.batchRoots(0), root);
+    });
+
+    it("should only let the owner anchor batches", async () => {
+      const { root } = buildBatch(batchPosts(2));
+      try {
+        await mediaGuard.anchorPostBatch(root, 2, { from: user1 });
+        assert.fail("Should have thrown an error");
+      } catch (err) {
+        assert.include(err.message, "Ownable: caller is not the owner");
+      }
+    });
+
+    it("should not anchor an empty batch", async () => {
+      try {
+        await mediaGuard.anchorPostBatch(web3.utils.padLeft("0x0", 64), 1, { from: owner });
+        assert.fail("Should have thrown an error");
+      } catch (err) {
+        assert.include(err.message, "Invalid Merkle root");
+      }
+    });
+
+    it("should compute the same leaves as the batcher", async () => {
+      const [post] = batchPosts(1);
+      assert.equal(await mediaGuard.postLeaf(post.author, post.contentHash, post.vulgarityScore),
+                   postLeaf(post.author, post.contentHash, post.vulgarityScore));
+    });
+
+    it("should verify the inclusion of every post in a batch", async () => {
+      const posts = batchPosts(13);
+      const { layers, root } = buildBatch(posts);
+      await mediaGuard.anchorPostBatch(root, posts.length, { from: owner });
+      for (let i = 0; i < posts.length; i++) {
+        const p = posts[i];
+        assert(await mediaGuard.verifyBatchedPost(0, p.author, p.contentHash, p.vulgarityScore, merkleProof(layers, i)),
+               `post ${i} should verify`);
+      }
+    });
+
+    it("should reject posts that are not in the batch", async () => {
+      const posts = batchPosts(8);
+      const { layers, root } = buildBatch(posts);
+      await mediaGuard.anchorPostBatch(root, posts.length, { from: owner });
+      const p = posts[3];
+      const proof = merkleProof(layers, 3);
+      assert(!await mediaGuard.verifyBatchedPost(0, p.author, p.contentHash, p.vulgarityScore + 1, proof));
+      assert(!await mediaGuard.verifyBatchedPost(0, owner, p.contentHash, p.vulgarityScore, proof));
+      assert(!await mediaGuard.verifyBatchedPost(0, p.author, p.contentHash, p.vulgarityScore, merkleProof(layers, 4)));
+      try {
+        await mediaGuard.verifyBatchedPost(1, p.author, p.contentHash, p.vulgarityScore, proof);
+        assert.fail("Should have thrown an error");
+      } catch (err) {
+        assert.include(err.message, "Batch does not exist");
+      }
+    });
+
+    it("should anchor a batch for less gas than two createPost calls", async () => {
+      // Users are registered by reporting their own content
+      await mediaGuard.reportContent(user1, { from: user1 });
+      const posts = batchPosts(64).map(p => ({ ...p, author: user1 }));
+      let perPostGas = 0;
+      for (const p of posts.slice(0, 2)) {
+        const result = await mediaGuard.createPost(p.contentHash, p.vulgarityScore, { from: user1 });
+        perPostGas += result.receipt.gasUsed;
+      }
+      const { root } = buildBatch(posts);
+      const batch = await mediaGuard.anchorPostBatch(root, posts.length, { from: owner });
+      console.log(`      createPost: ${perPostGas / 2} gas per post; ` +
+                  `anchorPostBatch: ${batch.receipt.gasUsed} gas for ${posts.length} posts`);
+      assert.isBelow(batch.receipt.gasUsed, perPostGas);
+    });
+  });
+});
@@ -1,60 +1,70 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, abort
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.exc import IntegrityError
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.local import LocalProxy
 from datetime import datetime, timedelta
 import os
+import sys
+import json
+import time
+import shutil
+import threading
+from collections import Counter
 from PIL import Image
-from slugify import slugify
-from transformers import CLIPProcessor, CLIPModel
-import torch
-import cv2
-import numpy as np
-from moviepy.editor import VideoFileClip
 from flask_wtf import FlaskForm
 from wtforms import StringField, FileField, TextAreaField
 from wtforms.validators import DataRequired, Length
 from markupsafe import Markup
-from werkzeug.utils import secure_filename
 from functools import wraps
-from content_analyzer import analyze_content
-from blockchain import blockchain
-import hashlib
+from model_registry import registry as model_registry
+from moderation_queue import ModerationQueue
+from tx_submitter import TransactionSubmitter
+from chain_indexer import ChainIndexer
+from pagination import keyset_page, encode_cursor
+from ingest import StreamingUploadRequest, IngestError, ingest_upload, sniff_type, file_sha256
+from media_store import create_media_backend, blob_key, derived_key, derived_prefix, is_blob_key, copy_to_temp
+from derivatives import derivative_key, generate_image_derivatives
+from transcode import transcode_video, MASTER_PLAYLIST, FALLBACK_VIDEO, POSTER
+from worker_pool import WorkerPool
+from embedding_index import TieredEmbeddingIndex, decode_embedding
+from moderation_policy import REJECT_THRESHOLD, content_category, is_safe
 from flask_migrate import Migrate
+import click
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mediaGuard.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static/img/uploads')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-
-# Initialize CLIP model for content moderation
-try:
-    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    model.eval()
-except Exception as e:
-    print(f"Error loading CLIP model: {e}")
-    model = None
-    processor = None
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+db = SQLAlchemy()
+migrate = Migrate()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+# Routes, template globals and CLI commands; registered on the app by create_app
+main = Blueprint('main', __name__, cli_group=None)
+
+# Per-app services created by create_app
+media_backend = LocalProxy(lambda: current_app.extensions['media_backend'])
+derivative_pool = LocalProxy(lambda: current_app.extensions['derivative_pool'])
+transcode_pool = LocalProxy(lambda: current_app.extensions['transcode_pool'])
+moderation_queue = LocalProxy(lambda: current_app.extensions['moderation_queue'])
+embedding_index = LocalProxy(lambda: current_app.extensions['embedding_index'])
+transaction_submitter = LocalProxy(lambda: current_app.extensions['transaction_submitter'])
+chain_indexer = LocalProxy(lambda: current_app.extensions['chain_indexer'])
 
 # Database Models
 class Follows(db.Model):
     follower_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
     followed_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_follows_followed_follower', 'followed_id', 'follower_id'),
+        db.Index('ix_follows_followed_created', 'followed_id', 'created_at'),
+        db.Index('ix_follows_follower_created', 'follower_id', 'created_at'),
+    )
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -73,6 +83,10 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     wallet_address = db.Column(db.String(42), unique=True, nullable=True)
     is_registered_on_blockchain = db.Column(db.Boolean, default=False)
+    # Kept by update_follower_count so feeds never count the follows table
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Posts are merged into followers' feeds at read time instead of fanned out
+    is_celebrity = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     # Add following relationship
     following = db.relationship(
@@ -84,6 +98,12 @@ class User(UserMixin, db.Model):
         lazy='dynamic'
     )
     
+    # Admin dashboard filters
+    __table_args__ = (
+        db.Index('ix_user_is_blocked_blocked_at', 'is_blocked', 'blocked_at'),
+        db.Index('ix_user_unblock_request_date', 'unblock_request', 'unblock_request_date'),
+    )
+    
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
         if not self.is_admin and not self.wallet_address:
@@ -103,9 +123,13 @@ class User(UserMixin, db.Model):
         db.session.commit()
 
     def request_unblock(self):
-        self.unblock_request = True
-        self.unblock_request_date = datetime.utcnow()
+        """Record an unblock request; False if one is already pending."""
+        # Conditional update so concurrent clicks record, and send, one request
+        requested = User.query.filter(User.id == self.id, User.unblock_request.isnot(True)).update(
+            {'unblock_request': True, 'unblock_request_date': datetime.utcnow()}, synchronize_session=False
+        )
         db.session.commit()
+        return requested > 0
 
     def unblock(self):
         self.is_blocked = False
@@ -120,6 +144,12 @@ class PostLike(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
     is_like = db.Column(db.Boolean, nullable=False)  # True for like, False for dislike
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('uq_post_like_post_user', 'post_id', 'user_id', unique=True),
+        db.Index('ix_post_like_post_is_like', 'post_id', 'is_like'),
+        db.Index('ix_post_like_user_id', 'user_id'),
+    )
 
 class CommentLike(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -127,6 +157,11 @@ class CommentLike(db.Model):
     comment_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=False)
     is_like = db.Column(db.Boolean, nullable=False)  # True for like, False for dislike
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('uq_comment_like_comment_user', 'comment_id', 'user_id', unique=True),
+        db.Index('ix_comment_like_comment_is_like', 'comment_id', 'is_like'),
+    )
 
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -137,11 +172,20 @@ class Post(db.Model):
     likes = db.relationship('PostLike', backref='post', lazy=True)
     dislikes = db.relationship('PostLike', backref='post_disliked', lazy=True)
     comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
+    blob = db.relationship('MediaBlob', primaryjoin='foreign(Post.image) == MediaBlob.key', viewonly=True, uselist=False)
     is_video = db.Column(db.Boolean, default=False)
     vulgarity_score = db.Column(db.Float, default=0.0)
     content_category = db.Column(db.String(20), default='safe')
     content_hash = db.Column(db.String(64))
     blockchain_post_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), default='published')  # pending, processing, published, rejected or failed
+    
+    __table_args__ = (
+        db.Index('ix_post_user_created', 'user_id', 'created_at'),
+        db.Index('ix_post_created_id', 'created_at', 'id'),
+        db.Index('ix_post_content_category', 'content_category'),
+        db.Index('ix_post_content_hash', 'content_hash'),
+    )
 
     def get_likes_count(self):
         return PostLike.query.filter_by(post_id=self.id, is_like=True).count()
@@ -168,6 +212,10 @@ class Comment(db.Model):
     user = db.relationship('User', backref=db.backref('comments', lazy=True))
     likes = db.relationship('CommentLike', backref='comment', lazy=True)
     dislikes = db.relationship('CommentLike', backref='comment_disliked', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_comment_post_id', 'post_id'),
+    )
 
     def get_likes_count(self):
         return CommentLike.query.filter_by(comment_id=self.id, is_like=True).count()
@@ -185,6 +233,121 @@ class Comment(db.Model):
             return False
         return CommentLike.query.filter_by(comment_id=self.id, user_id=user.id, is_like=False).first() is not None
 
+class TimelineEntry(db.Model):
+    """A post fanned out into one user's home timeline."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_timeline_entry_user_created', 'user_id', 'created_at', 'post_id'),
+        db.Index('ix_timeline_entry_user_author', 'user_id', 'author_id'),
+        db.Index('ix_timeline_entry_author', 'author_id'),
+    )
+
+class MediaBlob(db.Model):
+    """A stored media file, shared by every post or avatar with the same content."""
+    content_hash = db.Column(db.String(64), primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    derivative_widths = db.Column(db.String(64))  # e.g. '1080,640,320', set once generated
+    derivative_formats = db.Column(db.String(32))  # e.g. 'avif,webp,jpg'
+    duration = db.Column(db.Float)
+    video_renditions = db.Column(db.String(32))  # e.g. '720,360', set once transcoded
+    
+    def derivatives(self):
+        """(width, format) pairs of the stored derivatives."""
+        if not self.derivative_widths:
+            return []
+        return [(int(width), fmt) for width in self.derivative_widths.split(',')
+                for fmt in self.derivative_formats.split(',')]
+
+class AnchorBatch(db.Model):
+    """Posts anchored on chain together under one Merkle root."""
+    id = db.Column(db.Integer, primary_key=True)
+    merkle_root = db.Column(db.String(66), nullable=False)
+    post_count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    chain_batch_id = db.Column(db.Integer)  # set once anchorPostBatch is mined
+    tx_hash = db.Column(db.String(66))
+
+class PostAnchor(db.Model):
+    """A post's leaf in an anchor batch and the proof of its inclusion."""
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('anchor_batch.id'), nullable=False)
+    # The leaf commits to these values as they were when the post was anchored
+    author = db.Column(db.String(42), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    vulgarity_score = db.Column(db.Integer, nullable=False)
+    leaf = db.Column(db.String(66), nullable=False)
+    proof = db.Column(db.Text, nullable=False)  # JSON list of sibling hashes
+    batch = db.relationship('AnchorBatch')
+    
+    __table_args__ = (
+        db.Index('ix_post_anchor_batch_id', 'batch_id'),
+    )
+
+class ChainEvent(db.Model):
+    """A MediaGuard event read by the chain indexer; ChainUser and ChainPost are built from these."""
+    id = db.Column(db.Integer, primary_key=True)
+    block_number = db.Column(db.Integer, nullable=False)
+    log_index = db.Column(db.Integer, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False)
+    event = db.Column(db.String(32), nullable=False)
+    # Lowercase address the event is about: the reported user for ContentReported, the author for PostCreated
+    address = db.Column(db.String(42))
+    reporter = db.Column(db.String(42))
+    post_id = db.Column(db.Integer)
+    data = db.Column(db.Text)  # JSON of the remaining arguments
+    created_at = db.Column(db.DateTime, nullable=False)  # block timestamp
+
+    __table_args__ = (
+        db.UniqueConstraint('block_number', 'log_index', name='uq_chain_event_position'),
+        db.Index('ix_chain_event_address', 'address'),
+        db.Index('ix_chain_event_reporter', 'reporter'),
+        db.Index('ix_chain_event_post_id', 'post_id'),
+    )
+
+class ChainUser(db.Model):
+    """A wallet's state in the MediaGuard contract, as of the last indexed block."""
+    address = db.Column(db.String(42), primary_key=True)  # lowercase
+    report_count = db.Column(db.Integer, nullable=False, default=0)
+    is_blocked = db.Column(db.Boolean, nullable=False, default=False)
+    has_reported = db.Column(db.Boolean, nullable=False, default=False)
+    last_report_at = db.Column(db.DateTime)
+    has_unblock_request = db.Column(db.Boolean, nullable=False, default=False)
+    unblock_requested_at = db.Column(db.DateTime)
+    rewards_paid = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def is_registered(self):
+        # Users are registered by reporting their own content
+        return self.has_reported or self.is_blocked
+
+class ChainPost(db.Model):
+    """A post created on chain, keyed by its on-chain id (Post.blockchain_post_id)."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    author = db.Column(db.String(42), nullable=False)  # lowercase
+    content_hash = db.Column(db.String(128), nullable=False)
+    vulgarity_score = db.Column(db.Integer, nullable=False)
+    is_blocked = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_chain_post_author', 'author'),
+    )
+
+class ChainBlock(db.Model):
+    """Hash of a block the chain indexer has read, to notice when a reorg replaces it."""
+    number = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    hash = db.Column(db.String(66), nullable=False)
+
 class PostForm(FlaskForm):
     image = FileField('Image', validators=[DataRequired()])
     caption = TextAreaField('Caption', validators=[Length(max=500)])
@@ -197,31 +360,354 @@ class EditProfileForm(FlaskForm):
 class CommentForm(FlaskForm):
     content = TextAreaField('Comment', validators=[DataRequired(), Length(max=500)])
 
+def _reaction_state(like_model, key_column, ids, user):
+    """Grouped like/dislike counts and the user's own reaction for a set of ids."""
+    counts = {}
+    mine = {}
+    if not ids:
+        return counts, mine
+    
+    rows = db.session.query(key_column, like_model.is_like, db.func.count(like_model.id)) \
+        .filter(key_column.in_(ids)) \
+        .group_by(key_column, like_model.is_like).all()
+    for key, is_like, count in rows:
+        counts[(key, is_like)] = count
+    
+    if user.is_authenticated:
+        mine = dict(db.session.query(key_column, like_model.is_like)
+                    .filter(key_column.in_(ids), like_model.user_id == user.id).all())
+    return counts, mine
+
+def load_reaction_state(posts, user, with_comments=True):
+    """Precompute like/dislike/comment counts and the viewer's reactions.
+    
+    Templates read the attributes set here instead of calling the per-row
+    query helpers on Post and Comment, so a page costs a fixed number of
+    grouped queries regardless of how many posts and comments it shows.
+    """
+    post_ids = [post.id for post in posts]
+    counts, mine = _reaction_state(PostLike, PostLike.post_id, post_ids, user)
+    comment_counts = {}
+    if post_ids:
+        comment_counts = dict(db.session.query(Comment.post_id, db.func.count(Comment.id))
+                              .filter(Comment.post_id.in_(post_ids))
+                              .group_by(Comment.post_id).all())
+    
+    for post in posts:
+        post.likes_count = counts.get((post.id, True), 0)
+        post.dislikes_count = counts.get((post.id, False), 0)
+        post.liked = mine.get(post.id) is True
+        post.disliked = mine.get(post.id) is False
+        post.comments_count = comment_counts.get(post.id, 0)
+    
+    if with_comments:
+        comments = [comment for post in posts for comment in post.comments]
+        counts, mine = _reaction_state(CommentLike, CommentLike.comment_id, [c.id for c in comments], user)
+        for comment in comments:
+            comment.likes_count = counts.get((comment.id, True), 0)
+            comment.dislikes_count = counts.get((comment.id, False), 0)
+            comment.liked = mine.get(comment.id) is True
+            comment.disliked = mine.get(comment.id) is False
+    
+    return posts
+
+def feed_query():
+    """Published posts with authors and comments eagerly loaded for feed pages."""
+    return Post.query.filter_by(status='published').options(
+        joinedload(Post.author),
+        joinedload(Post.blob),
+        selectinload(Post.comments).joinedload(Comment.user)
+    )
+
+def store_media(path, content_hash, extension, size=None):
+    """Move a finished file into the media store and take a reference to it.
+    
+    Returns the blob's storage key. Identical content is stored once; later
+    uploads only bump the reference count.
+    """
+    blob = MediaBlob.query.get(content_hash)
+    if blob is None:
+        blob = MediaBlob(content_hash=content_hash, key=blob_key(content_hash, extension), size=size, ref_count=0)
+        db.session.add(blob)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # A concurrent upload of the same content created it first
+            db.session.rollback()
+            blob = MediaBlob.query.get(content_hash)
+    MediaBlob.query.filter_by(content_hash=content_hash).update({MediaBlob.ref_count: MediaBlob.ref_count + 1})
+    db.session.commit()
+    media_backend.put(path, blob.key)
+    return blob.key
+
+def release_media(key):
+    """Drop one reference to a stored file and delete it with the last one."""
+    if not key or key == 'default.jpg':
+        return
+    blob = MediaBlob.query.filter_by(key=key).first()
+    if blob is None:
+        # Files uploaded before the media store are not reference counted
+        if not is_blob_key(key):
+            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], key)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        return
+    MediaBlob.query.filter_by(content_hash=blob.content_hash).update({MediaBlob.ref_count: MediaBlob.ref_count - 1})
+    db.session.refresh(blob)
+    if blob.ref_count <= 0:
+        # Derivatives and renditions live under the blob's own prefix
+        media_backend.delete_prefix(derived_prefix(key))
+        db.session.delete(blob)
+        media_backend.delete(key)
+
+def media_local_path(key):
+    """Path to a readable local copy of a stored file, for workers."""
+    if is_blob_key(key):
+        return media_backend.local_path(key)
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], key)
+
+def needs_derivatives(blob):
+    # Animated GIFs are served as uploaded
+    return blob.derivative_widths is None and blob.key.endswith(('.jpg', '.png', '.webp'))
+
+def apply_derivatives(content_hash, result):
+    """Move generated derivatives into the media store and record them on the blob."""
+    files = result.get('files', [])
+    blob = MediaBlob.query.get(content_hash)
+    if blob is None or result.get('error'):
+        # The blob was released while its derivatives were being generated
+        for _, _, path in files:
+            if os.path.exists(path):
+                os.remove(path)
+        return
+    for width, fmt, path in files:
+        media_backend.put(path, derivative_key(blob.key, width, fmt))
+    blob.width = result['width']
+    blob.height = result['height']
+    blob.derivative_widths = ','.join(str(width) for width in sorted({width for width, _, _ in files}, reverse=True))
+    blob.derivative_formats = ','.join(dict.fromkeys(fmt for _, fmt, _ in files))
+    db.session.commit()
+
+def apply_transcode(content_hash, result):
+    """Store a finished transcode and publish the video posts waiting on it."""
+    blob = MediaBlob.query.get(content_hash)
+    waiting = Post.query.filter_by(status='processing').filter(Post.image == blob.key).all() if blob else []
+    if blob is None or result.get('error'):
+        for post in waiting:
+            # Failed posts give up their reference, as rejected ones do
+            release_media(post.image)
+            post.status = 'failed'
+        db.session.commit()
+    else:
+        for name, path in result['files']:
+            media_backend.put(path, derived_key(blob.key, name))
+        blob.width = result['width']
+        blob.height = result['height']
+        blob.duration = result['duration']
+        blob.video_renditions = ','.join(str(height) for height in result['renditions'])
+        for post in waiting:
+            post.status = 'published'
+            fan_out_post(post)
+        db.session.commit()
+    if result.get('work_dir'):
+        shutil.rmtree(result['work_dir'], ignore_errors=True)
+
+@main.record_once
+def register_video_file_names(state):
+    # Names of the files transcode_video writes for each video, for _media.html
+    state.app.jinja_env.globals.update(MASTER_PLAYLIST=MASTER_PLAYLIST, FALLBACK_VIDEO=FALLBACK_VIDEO, POSTER=POSTER)
+
+@main.app_template_global()
+def derived_media_url(key, name):
+    """URL of a file generated from an upload, such as a poster or HLS playlist."""
+    return media_url(derived_key(key, name))
+
+@main.app_template_global()
+def media_srcset(blob, fmt):
+    """srcset attribute value listing every stored width of a blob in one format."""
+    return ', '.join(f"{media_url(derivative_key(blob.key, width, f))} {width}w"
+                     for width, f in blob.derivatives() if f == fmt)
+
+@main.app_template_global()
+def over_threshold(score):
+    """Whether a vulgarity score is above the rejection threshold, e.g. after re-scoring."""
+    return score is not None and not is_safe(score)
+
+@main.app_template_global()
+def media_url(key):
+    """URL of an uploaded file, wherever the media backend keeps it."""
+    if is_blob_key(key):
+        return media_backend.url(key)
+    return url_for('static', filename='img/uploads/' + key)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Routes
-@app.route('/')
-def index():
+# Celebrities go back to fan-out only below this share of the threshold, so follows
+# around it don't keep moving their posts in and out of timelines
+CELEBRITY_EXIT_RATIO = 0.9
+
+def update_follower_count(user, delta):
+    """Count a new or removed follower and move the user across the celebrity threshold."""
+    User.query.filter_by(id=user.id).update({User.follower_count: User.follower_count + delta}, synchronize_session=False)
+    db.session.refresh(user)
+    threshold = current_app.config['CELEBRITY_FOLLOWER_THRESHOLD']
+    if not user.is_celebrity and user.follower_count >= threshold:
+        set_celebrity(user, True)
+    elif user.is_celebrity and user.follower_count < threshold * CELEBRITY_EXIT_RATIO:
+        set_celebrity(user, False)
+
+def set_celebrity(user, celebrity):
+    """Switch a user's posts between fan-out on write and merging at read time.
+    
+    Entries fanned out before the switch are removed or backfilled, so each
+    author's posts reach followers' feeds through only one of the two paths.
+    """
+    # Another request may have made the same switch first
+    switched = User.query.filter_by(id=user.id, is_celebrity=not celebrity) \
+        .update({User.is_celebrity: celebrity}, synchronize_session=False)
+    db.session.refresh(user)
+    if not switched:
+        return
+    if celebrity:
+        TimelineEntry.query.filter(TimelineEntry.author_id == user.id, TimelineEntry.user_id != user.id) \
+            .delete(synchronize_session=False)
+        return
+    # Followers stop reading these posts at read time; copy the recent ones into their timelines
+    recent = db.session.query(Post.id, Post.created_at) \
+        .filter_by(user_id=user.id, status='published') \
+        .order_by(Post.created_at.desc()) \
+        .limit(current_app.config['TIMELINE_BACKFILL_LIMIT']).subquery()
+    rows = db.session.query(Follows.follower_id, recent.c.id, db.literal(user.id), recent.c.created_at) \
+        .select_from(Follows).join(recent, db.true()) \
+        .filter(Follows.followed_id == user.id) \
+        .filter(~db.session.query(TimelineEntry.post_id).filter(
+            TimelineEntry.user_id == Follows.follower_id, TimelineEntry.post_id == recent.c.id
+        ).exists())
+    db.session.execute(TimelineEntry.__table__.insert().from_select(
+        ['user_id', 'post_id', 'author_id', 'created_at'], rows
+    ))
+
+def followed_celebrity_ids(user):
+    """Ids of followed users whose posts are merged into feeds at read time."""
+    rows = db.session.query(Follows.followed_id) \
+        .join(User, User.id == Follows.followed_id) \
+        .filter(Follows.follower_id == user.id, User.is_celebrity).all()
+    return [followed_id for followed_id, in rows]
+
+def fan_out_post(post):
+    """Push a newly published post into the timelines of its author and followers.
+    
+    Posts by authors above the celebrity threshold only go into the author's own
+    timeline; followers pick them up at read time instead.
+    """
+    recipients = [post.user_id]
+    if not post.author.is_celebrity:
+        recipients += [follower_id for follower_id, in
+                       db.session.query(Follows.follower_id).filter(Follows.followed_id == post.user_id)]
+    db.session.execute(TimelineEntry.__table__.insert(), [
+        {'user_id': user_id, 'post_id': post.id, 'author_id': post.user_id, 'created_at': post.created_at}
+        for user_id in recipients
+    ])
+
+def backfill_timeline(follower, followed):
+    """Copy recent posts of a newly followed user into the follower's timeline."""
+    if followed.is_celebrity:
+        return
+    posts = Post.query.with_entities(Post.id, Post.created_at) \
+        .filter_by(user_id=followed.id, status='published') \
+        .order_by(Post.created_at.desc()) \
+        .limit(current_app.config['TIMELINE_BACKFILL_LIMIT']).all()
+    existing = {post_id for post_id, in db.session.query(TimelineEntry.post_id)
+                .filter_by(user_id=follower.id, author_id=followed.id)}
+    rows = [
+        {'user_id': follower.id, 'post_id': post_id, 'author_id': followed.id, 'created_at': created_at}
+        for post_id, created_at in posts if post_id not in existing
+    ]
+    if rows:
+        db.session.execute(TimelineEntry.__table__.insert(), rows)
+
+def prune_timeline(follower, followed):
+    """Drop an unfollowed user's posts from the follower's timeline."""
+    TimelineEntry.query.filter_by(user_id=follower.id, author_id=followed.id).delete(synchronize_session=False)
+
+def remove_from_timelines(post):
+    TimelineEntry.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+
+def timeline_page(user, cursor, limit):
+    """One page of the user's materialized timeline merged with followed celebrities.
+    
+    Returns (post_ids, next_cursor, has_timeline); has_timeline is False only
+    for a user who follows nobody and has no timeline entries, e.g. a new
+    account. Following only celebrities, or paging past the last entry,
+    still counts as having a timeline.
+    """
+    entries, timeline_next = keyset_page(
+        TimelineEntry.query.with_entities(TimelineEntry.created_at, TimelineEntry.post_id).filter_by(user_id=user.id),
+        TimelineEntry.created_at, TimelineEntry.post_id,
+        cursor=cursor, limit=limit, key=lambda entry: (entry.created_at, entry.post_id)
+    )
+    keys = {(entry.created_at, entry.post_id) for entry in entries}
+    has_more = timeline_next is not None
+    
+    celebrity_ids = followed_celebrity_ids(user)
+    if celebrity_ids:
+        celebrity_posts, celebrity_next = keyset_page(
+            Post.query.with_entities(Post.created_at, Post.id)
+                .filter(Post.user_id.in_(celebrity_ids), Post.status == 'published'),
+            Post.created_at, Post.id, cursor=cursor, limit=limit
+        )
+        keys |= {(post.created_at, post.id) for post in celebrity_posts}
+        has_more = has_more or celebrity_next is not None
+    
+    merged = sorted(keys, reverse=True)
+    if len(merged) > limit:
+        merged = merged[:limit]
+        has_more = True
+    next_cursor = encode_cursor(*merged[-1]) if merged and has_more else None
+    
+    has_timeline = bool(merged) or bool(celebrity_ids) or \
+        db.session.query(TimelineEntry.query.filter_by(user_id=user.id).exists()).scalar() or \
+        db.session.query(Follows.query.filter_by(follower_id=user.id).exists()).scalar()
+    return [post_id for _, post_id in merged], next_cursor, has_timeline
+
+def home_feed_page(cursor=None):
+    limit = current_app.config['FEED_PAGE_SIZE']
     if current_user.is_authenticated:
-        # Get posts from users that the current user follows
-        followed_users = [user.id for user in current_user.following]
-        followed_users.append(current_user.id)
-        posts = Post.query.filter(Post.user_id.in_(followed_users)).order_by(Post.created_at.desc()).all()
-        
-        # If no posts from followed users, get all posts
-        if not posts:
-            posts = Post.query.order_by(Post.created_at.desc()).all()
-    else:
-        # For non-logged in users, show all posts
-        posts = Post.query.order_by(Post.created_at.desc()).all()
+        post_ids, next_cursor, has_timeline = timeline_page(current_user, cursor, limit)
+        if has_timeline:
+            posts_by_id = {post.id: post for post in feed_query().filter(Post.id.in_(post_ids))} if post_ids else {}
+            posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+            load_reaction_state(posts, current_user)
+            return posts, next_cursor
     
-    post_form = PostForm()
+    # New users who follow nobody yet, and visitors, see all posts
+    posts, next_cursor = keyset_page(
+        feed_query(), Post.created_at, Post.id, cursor=cursor, limit=limit
+    )
+    load_reaction_state(posts, current_user)
+    return posts, next_cursor
+
+# Routes
+@main.route('/')
+def index():
+    posts, next_cursor = home_feed_page(request.args.get('cursor'))
+    comment_form = CommentForm()
+    return render_template('index.html', posts=posts, next_cursor=next_cursor, form=comment_form)
+
+@main.route('/api/feed')
+def feed_api():
+    """Next page of the home feed for infinite scroll."""
+    posts, next_cursor = home_feed_page(request.args.get('cursor'))
     comment_form = CommentForm()
-    return render_template('index.html', posts=posts, form=comment_form)
+    return jsonify({
+        'posts': [post.id for post in posts],
+        'html': ''.join(render_template('_post_card.html', post=post, form=comment_form) for post in posts),
+        'next_cursor': next_cursor
+    })
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -231,20 +717,20 @@ def register():
         
         if User.query.filter_by(username=username).first():
             flash('Username already exists', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         if User.query.filter_by(email=email).first():
             flash('Email already exists', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         if User.query.filter_by(wallet_address=wallet_address).first():
             flash('Wallet address already registered', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         # Validate wallet address format
         if not wallet_address.startswith('0x') or len(wallet_address) != 42:
             flash('Invalid wallet address format. Please enter a valid Ethereum address.', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         try:
             # Create user in database
@@ -253,29 +739,24 @@ def register():
             db.session.add(user)
             db.session.commit()
             
-            # Register user on blockchain
+            # Register user on blockchain; is_registered_on_blockchain is set once it is mined
             try:
-                if blockchain.register_user(wallet_address):
-                    user.is_registered_on_blockchain = True
-                    db.session.commit()
-                    flash('Registration successful! Please login.', 'success')
-                else:
-                    # If blockchain registration fails, we'll still keep the user but mark them as not registered on blockchain
-                    flash('Registration successful but blockchain registration failed. You can still use the platform, but some features may be limited.', 'warning')
+                transaction_submitter.submit('register_user', user.id, wallet_address)
+                flash('Registration successful! Please login.', 'success')
             except Exception as e:
                 print(f"Blockchain registration error: {str(e)}")
                 flash('Registration successful but blockchain registration failed. You can still use the platform, but some features may be limited.', 'warning')
             
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
         except Exception as e:
             db.session.rollback()
             flash('An error occurred during registration. Please try again.', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
     
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -285,66 +766,61 @@ def login():
         if user and user.check_password(password):
             login_user(user)
             if user.is_admin:
-                return redirect(url_for('admin_dashboard'))
-            return redirect(url_for('index'))
+                return redirect(url_for('main.admin_dashboard'))
+            return redirect(url_for('main.index'))
         
         flash('Invalid username or password', 'error')
     return render_template('login.html')
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/profile/<username>')
+@main.route('/profile/<username>')
 def profile(username):
     user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(user_id=user.id).order_by(Post.created_at.desc()).all()
-    return render_template('profile.html', user=user, posts=posts)
+    posts, next_cursor = keyset_page(
+        Post.query.filter_by(user_id=user.id, status='published').options(joinedload(Post.blob)), Post.created_at, Post.id,
+        cursor=request.args.get('cursor'), limit=current_app.config['FEED_PAGE_SIZE']
+    )
+    load_reaction_state(posts, current_user, with_comments=False)
+    return render_template('profile.html', user=user, posts=posts, next_cursor=next_cursor)
 
-@app.route('/profile/edit', methods=['GET', 'POST'])
+@main.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     form = EditProfileForm()
     
     if form.validate_on_submit():
-        # Update username if changed
-        if form.username.data != current_user.username:
-            # Check if username is already taken
-            if User.query.filter_by(username=form.username.data).first():
-                flash('Username already taken')
-                return redirect(url_for('edit_profile'))
-            current_user.username = form.username.data
-        
-        # Update bio
-        current_user.bio = form.bio.data
+        # Check if a changed username is already taken
+        if form.username.data != current_user.username and User.query.filter_by(username=form.username.data).first():
+            flash('Username already taken')
+            return redirect(url_for('main.edit_profile'))
         
-        # Handle profile picture upload
+        # Handle profile picture upload before the other edits; store_media commits, and
+        # rolls back when a concurrent upload created the same blob first
         if form.profile_pic.data:
             file = form.profile_pic.data
             if file.filename:
-                # Generate unique filename
-                filename = f"profile-{slugify(current_user.username)}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jpg"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                
                 # Process and save image
                 img = Image.open(file)
                 img = img.convert('RGB')
                 img.thumbnail((200, 200))  # Profile picture size
-                img.save(filepath, 'JPEG', quality=85)
+                tmp_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f".profile-{current_user.id}-{os.getpid()}.jpg")
+                img.save(tmp_path, 'JPEG', quality=85)
                 
-                # Delete old profile picture if it exists and is not the default
-                if current_user.profile_pic != 'default.jpg':
-                    old_filepath = os.path.join(app.config['UPLOAD_FOLDER'], current_user.profile_pic)
-                    if os.path.exists(old_filepath):
-                        os.remove(old_filepath)
-                
-                current_user.profile_pic = filename
+                # Swap the reference from the old picture to the new one
+                key = store_media(tmp_path, file_sha256(tmp_path), 'jpg', os.path.getsize(tmp_path))
+                release_media(current_user.profile_pic)
+                current_user.profile_pic = key
         
+        current_user.username = form.username.data
+        current_user.bio = form.bio.data
         db.session.commit()
         flash('Profile updated successfully')
-        return redirect(url_for('profile', username=current_user.username))
+        return redirect(url_for('main.profile', username=current_user.username))
     
     # Pre-fill form with current user data
     form.username.data = current_user.username
@@ -352,206 +828,330 @@ def edit_profile():
     
     return render_template('edit_profile.html', form=form)
 
-def calculate_vulgarity_score(image_features, text_features, inappropriate_features, safe_features):
-    """Calculate a numerical vulgarity score between 0.0 and 1.0."""
-    # Calculate similarity scores
-    inappropriate_scores = torch.cosine_similarity(image_features, inappropriate_features)
-    safe_scores = torch.cosine_similarity(image_features, safe_features)
-    
-    # Get maximum scores
-    max_inappropriate = torch.max(inappropriate_scores).item()
-    max_safe = torch.max(safe_scores).item()
-    
-    # Calculate score (0.0 to 1.0)
-    total = max_inappropriate + max_safe
-    if total == 0:
-        return 0.0
-    score = max_inappropriate / total
-    
-    return score
-
-def get_content_category(score):
-    """Convert vulgarity score to content category."""
-    if score < 0.2:
-        return "safe"
-    elif score < 0.4:
-        return "mild"
-    elif score < 0.7:
-        return "moderate"
+def index_embedding(post, result):
+    """Add a moderated post's image embedding to the similarity index of the tier that computed it."""
+    if result.get('embedding'):
+        vector = decode_embedding(result['embedding'])
+        tier = result.get('embedding_tier') or 'full'
+    elif result.get('duplicate_of'):
+        # Verdict cache hits skip the model; reuse the embedding of an earlier copy
+        tier, vector = None, None
+        earlier = Post.query.with_entities(Post.id).filter(
+            Post.content_hash == result['duplicate_of'], Post.id != post.id
+        ).order_by(Post.id.desc()).limit(10)
+        for (earlier_id,) in earlier:
+            tier, vector = embedding_index.get(earlier_id)
+            if vector is not None:
+                break
     else:
-        return "explicit"
-
-def analyze_content(image, caption):
-    """Analyze both image and caption for inappropriate content."""
-    if not model or not processor:
-        return True, 0.0, "safe"  # Allow content if model is not available
-    
-    # Define inappropriate content categories
-    inappropriate_categories = [
-        "adult content", "explicit content", "nsfw", "inappropriate content",
-        "vulgar content", "offensive content", "hate speech", "violence",
-        "graphic content", "disturbing content", "sexual content",
-        "drugs and alcohol", "gore", "extreme violence"
-    ]
-    
-    # Define safe content categories
-    safe_categories = [
-        "family friendly", "safe content", "appropriate content",
-        "wholesome content", "general audience", "suitable for all",
-        "educational content", "artistic content", "nature content",
-        "food and cooking", "travel and adventure"
-    ]
-    
+        return
+    if vector is None:
+        return
     try:
-        # Process image
-        image_inputs = processor(images=image, return_tensors="pt")
-        image_features = model.get_image_features(**image_inputs)
-        
-        # Process text (caption)
-        text_inputs = processor(text=caption, return_tensors="pt", padding=True, truncation=True)
-        text_features = model.get_text_features(**text_inputs)
-        
-        # Compare with inappropriate categories
-        inappropriate_texts = processor(text=inappropriate_categories, return_tensors="pt", padding=True, truncation=True)
-        inappropriate_features = model.get_text_features(**inappropriate_texts)
-        
-        # Compare with safe categories
-        safe_texts = processor(text=safe_categories, return_tensors="pt", padding=True, truncation=True)
-        safe_features = model.get_text_features(**safe_texts)
-        
-        # Calculate vulgarity score
-        score = calculate_vulgarity_score(image_features, text_features, inappropriate_features, safe_features)
-        category = get_content_category(score)
-        
-        # Allow content if score is below threshold
-        return score < 0.7, score, category
-        
+        embedding_index.add(post.id, vector, tier)
     except Exception as e:
-        print(f"Error in content analysis: {e}")
-        return True, 0.0, "safe"  # Allow content if analysis fails
+        print(f"Error indexing embedding for post {post.id}: {e}")
 
-def extract_video_frames(video_path, max_frames=10):
-    """Extract frames from video for analysis."""
-    frames = []
-    try:
-        video = cv2.VideoCapture(video_path)
-        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = video.get(cv2.CAP_PROP_FPS)
-        
-        # Calculate frame interval
-        interval = total_frames // max_frames
-        
-        for i in range(max_frames):
-            video.set(cv2.CAP_PROP_POS_FRAMES, i * interval)
-            ret, frame = video.read()
-            if ret:
-                # Convert BGR to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frames.append(Image.fromarray(frame_rgb))
-        
-        video.release()
-    except Exception as e:
-        print(f"Error extracting video frames: {e}")
+# Verdicts per cascade tier, counted here so process workers are included
+verdict_tiers = Counter()
+verdict_tiers_lock = threading.Lock()
+
+def apply_moderation_result(post_id, result):
+    """Publish or reject a pending post once its moderation verdict arrives."""
+    post = Post.query.get(post_id)
+    if post is None or post.status != 'pending':
+        # Deleted, or already decided by an earlier run of the same job
+        return
+    if not result.get('error'):
+        with verdict_tiers_lock:
+            verdict_tiers[result.get('tier') or 'unscored'] += 1
+    
+    if result.get('error'):
+        print(f"Error processing file: {result['error']}")
+        release_media(post.image)
+        post.status = 'failed'
+        db.session.commit()
+        return
+    
+    post.vulgarity_score = result['vulgarity_score']
+    post.content_category = result['content_category']
+    post.content_hash = result['content_hash']
+    # Rejected posts are indexed too, so re-uploads of them can be found
+    index_embedding(post, result)
     
-    return frames
+    if not result['is_safe'] or not is_safe(post.vulgarity_score):  # If content is unsafe or scores above the rejection threshold
+        # Drop the post's reference to the uploaded file
+        release_media(post.image)
+        post.status = 'rejected'
+        # Increment user's violation count
+        post.author.increment_violation()
+        return
+    
+    if current_app.config['ANCHOR_MODE'] == 'batch':
+        # Anchored with other posts under one Merkle root; see record_anchor_batch
+        get_post_batcher().add(post.id, post.author.wallet_address, post.content_hash, int(post.vulgarity_score * 100))
+    else:
+        # Create post on blockchain; blockchain_post_id is set once it is mined
+        transaction_submitter.submit('create_post', post.id, post.author.wallet_address,
+                                     post.content_hash, int(post.vulgarity_score * 100))
+    if post.is_video and post.blob is not None and not post.blob.video_renditions:
+        # Stay hidden until the playable renditions exist
+        post.status = 'processing'
+        transcode_pool.submit(post.blob.content_hash, media_local_path(post.image),
+                              current_app.config['UPLOAD_FOLDER'], current_app.config['TRANSCODE_THREADS'])
+    else:
+        post.status = 'published'
+        fan_out_post(post)
+    db.session.commit()
+
+@main.before_app_first_request
+def start_moderation_queue():
+    # Jobs queued before a restart don't wait for the next upload
+    moderation_queue.resume()
+
+@main.before_app_first_request
+def start_transaction_submitter():
+    # Also sends what previous processes and CLI commands left queued or unconfirmed
+    transaction_submitter.start()
+
+post_batcher_lock = threading.Lock()
+
+def get_post_batcher():
+    """The app's post batcher, created on first use so web3 is only imported by processes that anchor."""
+    app = current_app._get_current_object()
+    with post_batcher_lock:
+        if 'post_batcher' not in app.extensions:
+            from blockchain import PostBatcher
+            app.extensions['post_batcher'] = PostBatcher(
+                in_app_context(app, record_anchor_batch),
+                max_items=app.config['ANCHOR_BATCH_SIZE'],
+                max_seconds=app.config['ANCHOR_BATCH_SECONDS']
+            )
+        return app.extensions['post_batcher']
+
+def record_anchor_batch(root, entries, submit=True):
+    """Store a cut batch's proofs and queue its root to be anchored."""
+    batch = AnchorBatch(merkle_root=root, post_count=len(entries))
+    db.session.add(batch)
+    db.session.flush()
+    for entry in entries:
+        db.session.add(PostAnchor(
+            post_id=entry['post_id'], batch_id=batch.id, author=entry['author'], content_hash=entry['content_hash'],
+            vulgarity_score=entry['vulgarity_score'], leaf=entry['leaf'], proof=json.dumps(entry['proof'])
+        ))
+    db.session.commit()
+    # The contract owner sends it, so it doesn't wait on any user's registration
+    if submit:
+        transaction_submitter.submit('anchor_batch', batch.id, 'owner', root, len(entries))
+    else:
+        transaction_submitter.queue('anchor_batch', batch.id, 'owner', root, len(entries))
+    return batch
+
+def apply_transaction(kind, target_id, result):
+    """Record a mined blockchain transaction on its post or user."""
+    if result.get('error'):
+        print(f"Blockchain {kind} failed for {target_id}: {result['error']}")
+        return
+    if kind == 'create_post':
+        post = Post.query.get(target_id)
+        if post is not None and result.get('post_id') is not None:
+            post.blockchain_post_id = result['post_id']
+    elif kind == 'register_user':
+        user = User.query.get(target_id)
+        if user is not None:
+            user.is_registered_on_blockchain = True
+    elif kind == 'anchor_batch':
+        batch = AnchorBatch.query.get(target_id)
+        if batch is not None:
+            batch.chain_batch_id = result.get('batch_id')
+            batch.tx_hash = result['tx_hash']
+    db.session.commit()
+
+@main.before_app_first_request
+def start_chain_indexer():
+    if current_app.config['CHAIN_INDEXER']:
+        chain_indexer.start()
+
+# Block hashes kept to find where a reorg forked; a deeper one re-indexes from the start
+CHAIN_BLOCKS_KEPT = 128
+
+def load_chain_blocks():
+    """(number, hash) of the blocks the chain indexer has read, newest first."""
+    return [(block.number, block.hash) for block in
+            ChainBlock.query.order_by(ChainBlock.number.desc()).limit(CHAIN_BLOCKS_KEPT)]
+
+def chain_event_row(event):
+    args = dict(event['args'])
+    address = next((args.pop(key) for key in ('reported', 'user', 'author') if key in args), None)
+    reporter = args.pop('reporter', None)
+    return ChainEvent(
+        block_number=event['block_number'], log_index=event['log_index'], tx_hash=event['tx_hash'],
+        event=event['event'], address=address.lower() if address else None,
+        reporter=reporter.lower() if reporter else None, post_id=args.pop('postId', None),
+        data=json.dumps(args), created_at=datetime.utcfromtimestamp(event['timestamp'])
+    )
+
+def apply_chain_event(event, get_user, get_post):
+    """Update the mirrored state of the users and post an event is about.
+
+    ``get_user`` and ``get_post`` return the row to update, or None to leave it alone.
+    """
+    data = json.loads(event.data)
+    user = get_user(event.address) if event.address else None
+    if event.event == 'PostCreated':
+        post = get_post(event.post_id)
+        if post is not None:
+            post.author = event.address
+            post.content_hash = data['contentHash']
+            post.vulgarity_score = data['vulgarityScore']
+            post.created_at = event.created_at
+            post.tx_hash = event.tx_hash
+    elif event.event == 'PostBlocked':
+        post = get_post(event.post_id)
+        if post is not None:
+            post.is_blocked = True
+    elif event.event == 'ContentReported':
+        reporter = get_user(event.reporter)
+        if reporter is not None:
+            reporter.has_reported = True
+            reporter.last_report_at = event.created_at
+        if user is not None:
+            user.report_count += 1
+    elif user is None:
+        return
+    elif event.event == 'UserBlocked':
+        user.is_blocked = True
+    elif event.event == 'UserUnblocked':
+        user.is_blocked = False
+        user.report_count = 0
+    elif event.event == 'UnblockRequested':
+        user.has_unblock_request = True
+        user.unblock_requested_at = event.created_at
+    elif event.event == 'RewardPaid':
+        user.rewards_paid += 1
+
+def new_chain_user(address):
+    user = ChainUser(address=address, report_count=0, is_blocked=False, has_reported=False,
+                     has_unblock_request=False, rewards_paid=0)
+    db.session.add(user)
+    return user
+
+def new_chain_post(post_id):
+    post = ChainPost(id=post_id, is_blocked=False)
+    db.session.add(post)
+    return post
+
+def record_chain_events(events, blocks):
+    """Store events read by the chain indexer and update the mirrored users and posts."""
+    users, posts = {}, {}
+
+    def get_user(address):
+        if address not in users:
+            users[address] = ChainUser.query.get(address) or new_chain_user(address)
+        return users[address]
+
+    def get_post(post_id):
+        if post_id not in posts:
+            posts[post_id] = ChainPost.query.get(post_id) or new_chain_post(post_id)
+        return posts[post_id]
+
+    for event in events:
+        row = chain_event_row(event)
+        db.session.add(row)
+        apply_chain_event(row, get_user, get_post)
+    for number, block_hash in blocks:
+        db.session.merge(ChainBlock(number=number, hash=block_hash))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process indexed these blocks first
+        db.session.rollback()
+        return
+    oldest_kept = db.session.query(ChainBlock.number).order_by(ChainBlock.number.desc()) \
+        .offset(CHAIN_BLOCKS_KEPT - 1).limit(1).scalar()
+    if oldest_kept is not None:
+        ChainBlock.query.filter(ChainBlock.number < oldest_kept).delete(synchronize_session=False)
+        db.session.commit()
+
+def rollback_chain(block_number):
+    """Drop what was indexed after ``block_number`` and rebuild the users and
+    posts it touched from their remaining events.
+    """
+    undone = ChainEvent.query.filter(ChainEvent.block_number > block_number).all()
+    addresses = {address for event in undone for address in (event.address, event.reporter) if address}
+    post_ids = {event.post_id for event in undone if event.post_id is not None}
+    ChainEvent.query.filter(ChainEvent.block_number > block_number).delete(synchronize_session=False)
+    ChainBlock.query.filter(ChainBlock.number > block_number).delete(synchronize_session=False)
+    ChainUser.query.filter(ChainUser.address.in_(addresses)).delete(synchronize_session=False)
+    ChainPost.query.filter(ChainPost.id.in_(post_ids)).delete(synchronize_session=False)
 
-@app.route('/create_post', methods=['GET', 'POST'])
+    users, posts = {}, {}
+
+    # Events also name users and posts that weren't undone; those are left alone
+    def get_user(address):
+        if address in addresses and address not in users:
+            users[address] = new_chain_user(address)
+        return users.get(address)
+
+    def get_post(post_id):
+        if post_id in post_ids and post_id not in posts:
+            posts[post_id] = new_chain_post(post_id)
+        return posts.get(post_id)
+
+    replay = ChainEvent.query.filter(db.or_(
+        ChainEvent.address.in_(addresses), ChainEvent.reporter.in_(addresses), ChainEvent.post_id.in_(post_ids)
+    )).order_by(ChainEvent.block_number, ChainEvent.log_index)
+    for event in replay:
+        apply_chain_event(event, get_user, get_post)
+    db.session.commit()
+
+def chain_users(wallets):
+    """{wallet: its mirrored ChainUser, or None if not registered on chain}."""
+    found = {user.address: user for user in ChainUser.query.filter(ChainUser.address.in_([wallet.lower() for wallet in wallets]))}
+    return {wallet: found[wallet.lower()] if wallet.lower() in found and found[wallet.lower()].is_registered else None
+            for wallet in wallets}
+
+@main.route('/create_post', methods=['GET', 'POST'])
 @login_required
 def create_post():
     if current_user.is_blocked:
         flash('Your account has been blocked due to multiple content violations. Please request an unblock from the admin.', 'error')
-        return redirect(url_for('profile', username=current_user.username))
+        return redirect(url_for('main.profile', username=current_user.username))
 
     form = PostForm()
     if form.validate_on_submit():
         if form.image.data:
-            filename = secure_filename(form.image.data.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            form.image.data.save(file_path)
+            try:
+                upload = ingest_upload(form.image.data, current_app.config['UPLOAD_FOLDER'], current_app.config['MAX_CONTENT_LENGTH'])
+            except IngestError as e:
+                flash(f'{e}. Please upload a JPEG, PNG, GIF or WebP image or an MP4, MOV, AVI or WMV video.', 'error')
+                return render_template('create_post.html', form=form)
             
-            # Check if it's a video
-            is_video = filename.lower().endswith(('.mp4', '.avi', '.mov', '.wmv'))
+            is_video = upload.kind == 'video'
+            key = store_media(upload.path, upload.content_hash, upload.extension, upload.size)
+            blob = MediaBlob.query.get(upload.content_hash)
+            if not is_video and needs_derivatives(blob):
+                derivative_pool.submit(upload.content_hash, media_local_path(key), current_app.config['UPLOAD_FOLDER'])
             
-            try:
-                if is_video:
-                    # Extract frames from video for analysis
-                    frames = extract_video_frames(file_path)
-                    if not frames:
-                        flash('Error processing video file')
-                        os.remove(file_path)
-                        return redirect(url_for('create_post'))
-                    
-                    # Analyze each frame
-                    max_score = 0.0
-                    max_category = "safe"
-                    for frame in frames:
-                        is_safe, score, category = analyze_content(frame, form.caption.data)
-                        max_score = max(max_score, score)
-                        if score > max_score:
-                            max_category = category
-                    
-                    # Clean up frames
-                    for frame in frames:
-                        frame.close()
-                    
-                    is_safe = max_score < 0.7
-                    vulgarity_score = max_score
-                    content_category = max_category
-                else:
-                    # Load and process image
-                    img = Image.open(file_path)
-                    img = img.convert('RGB')
-                    img.thumbnail((1080, 1080))  # Instagram-like size
-                    img.save(file_path, 'JPEG', quality=85)
-                    
-                    # Analyze content
-                    is_safe, vulgarity_score, content_category = analyze_content(img, form.caption.data)
-                
-                if not is_safe or vulgarity_score > 0.5:  # If content is unsafe or vulgarity score is above 50%
-                    # Delete the uploaded file
-                    os.remove(file_path)
-                    # Increment user's violation count
-                    current_user.increment_violation()
-                    
-                    if current_user.is_blocked:
-                        flash('Your account has been blocked due to multiple content violations. Please request an unblock from the admin.', 'error')
-                    else:
-                        flash(f'Warning: Your post contains inappropriate content (Vulgarity Score: {vulgarity_score:.1%}). This is violation #{current_user.violation_count}. Your account will be blocked after 3 violations.', 'warning')
-                    return redirect(url_for('create_post'))
-                
-                # Calculate content hash
-                with open(file_path, 'rb') as f:
-                    content_hash = hashlib.sha256(f.read()).hexdigest()
-                
-                # Create post on blockchain
-                if blockchain.create_post(current_user.wallet_address, content_hash, int(vulgarity_score * 100)):
-                    post = Post(
-                        image=filename,
-                        caption=form.caption.data,
-                        user_id=current_user.id,
-                        is_video=is_video,
-                        vulgarity_score=vulgarity_score,
-                        content_category=content_category,
-                        content_hash=content_hash,
-                        blockchain_post_id=blockchain.media_guard_contract.functions.getPostCount().call() - 1
-                    )
-                    db.session.add(post)
-                    db.session.commit()
-                    flash('Post created successfully!', 'success')
-                else:
-                    flash('Post created but blockchain registration failed. Please contact support.', 'warning')
-                return redirect(url_for('index'))
-                
-            except Exception as e:
-                print(f"Error processing file: {e}")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                flash('Error processing your file. Please try again.')
-                return redirect(url_for('create_post'))
+            # Keep the post hidden until the moderation worker has a verdict
+            post = Post(
+                image=key,
+                caption=form.caption.data,
+                user_id=current_user.id,
+                is_video=is_video,
+                content_hash=upload.content_hash,
+                status='pending'
+            )
+            db.session.add(post)
+            db.session.commit()
+            
+            moderation_queue.enqueue(post.id, media_local_path(key), form.caption.data, is_video, upload.content_hash)
+            flash('Your post is being reviewed and will be published once the content check finishes.', 'info')
+            return redirect(url_for('main.post_detail', post_id=post.id))
                 
     return render_template('create_post.html', form=form)
 
-@app.route('/post/<int:post_id>/like', methods=['POST'])
+@main.route('/post/<int:post_id>/like', methods=['POST'])
 @login_required
 def like_post(post_id):
     post = Post.query.get_or_404(post_id)
@@ -566,10 +1166,14 @@ def like_post(post_id):
         new_like = PostLike(user_id=current_user.id, post_id=post_id, is_like=True)
         db.session.add(new_like)
     
-    db.session.commit()
-    return redirect(url_for('post_detail', post_id=post_id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request already recorded a reaction for this user
+        db.session.rollback()
+    return redirect(url_for('main.post_detail', post_id=post_id))
 
-@app.route('/post/<int:post_id>/dislike', methods=['POST'])
+@main.route('/post/<int:post_id>/dislike', methods=['POST'])
 @login_required
 def dislike_post(post_id):
     post = Post.query.get_or_404(post_id)
@@ -584,16 +1188,85 @@ def dislike_post(post_id):
         new_like = PostLike(user_id=current_user.id, post_id=post_id, is_like=False)
         db.session.add(new_like)
     
-    db.session.commit()
-    return redirect(url_for('post_detail', post_id=post_id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request already recorded a reaction for this user
+        db.session.rollback()
+    return redirect(url_for('main.post_detail', post_id=post_id))
 
-@app.route('/post/<int:post_id>')
+@main.route('/post/<int:post_id>')
 def post_detail(post_id):
     post = Post.query.get_or_404(post_id)
+    if post.status != 'published' and not (current_user.is_authenticated and
+                                            (current_user.id == post.user_id or current_user.is_admin)):
+        abort(404)
+    load_reaction_state([post], current_user)
     form = CommentForm()
     return render_template('post_detail.html', post=post, form=form)
 
-@app.route('/post/<int:post_id>/comment', methods=['POST'])
+@main.route('/post/<int:post_id>/status')
+@login_required
+def post_status(post_id):
+    """Moderation status of a post, polled by the post page while it is pending."""
+    post = Post.query.get_or_404(post_id)
+    if post.user_id != current_user.id and not current_user.is_admin:
+        abort(404)
+    
+    if post.status == 'pending':
+        message = 'Your post is being reviewed.'
+    elif post.status == 'processing':
+        message = 'Your video passed review and is being prepared for playback.'
+    elif post.status == 'published':
+        message = 'Post created successfully!'
+    elif post.status == 'rejected':
+        if post.author.is_blocked:
+            message = 'Your account has been blocked due to multiple content violations. Please request an unblock from the admin.'
+        else:
+            message = f'Warning: Your post contains inappropriate content (Vulgarity Score: {post.vulgarity_score:.1%}). This is violation #{post.author.violation_count}. Your account will be blocked after 3 violations.'
+    else:
+        message = 'Error processing your file. Please try again.'
+    
+    return jsonify({
+        'post_id': post.id,
+        'status': post.status,
+        'vulgarity_score': post.vulgarity_score,
+        'content_category': post.content_category,
+        'message': message
+    })
+
+@main.route('/post/<int:post_id>/proof')
+def post_proof(post_id):
+    """Where a post is anchored on chain, with the Merkle proof of its inclusion if it was batched."""
+    post = Post.query.get_or_404(post_id)
+    if post.status != 'published' and not (current_user.is_authenticated and
+                                            (current_user.id == post.user_id or current_user.is_admin)):
+        abort(404)
+    if post.blockchain_post_id is not None:
+        return jsonify({'post_id': post.id, 'mode': 'post', 'blockchain_post_id': post.blockchain_post_id})
+    anchor = PostAnchor.query.get(post.id)
+    if anchor is None:
+        return jsonify({'error': 'Post is not anchored on the blockchain yet'}), 404
+    
+    from blockchain import verify_post_proof
+    proof = json.loads(anchor.proof)
+    return jsonify({
+        'post_id': post.id,
+        'mode': 'batch',
+        'author': anchor.author,
+        'content_hash': anchor.content_hash,
+        'vulgarity_score': anchor.vulgarity_score,
+        'leaf': anchor.leaf,
+        'proof': proof,
+        'merkle_root': anchor.batch.merkle_root,
+        # Arguments for MediaGuard.verifyBatchedPost once anchored
+        'batch_id': anchor.batch.chain_batch_id,
+        'tx_hash': anchor.batch.tx_hash,
+        'anchored': anchor.batch.chain_batch_id is not None,
+        'verified': verify_post_proof(anchor.author, anchor.content_hash, anchor.vulgarity_score, proof, anchor.batch.merkle_root)
+    })
+
+@main.route('/post/<int:post_id>/comment', methods=['POST'])
 @login_required
 def add_comment(post_id):
     post = Post.query.get_or_404(post_id)
@@ -609,24 +1282,24 @@ def add_comment(post_id):
         db.session.commit()
         flash('Comment added successfully')
     
-    return redirect(url_for('post_detail', post_id=post_id))
+    return redirect(url_for('main.post_detail', post_id=post_id))
 
-@app.route('/comment/<int:comment_id>/delete', methods=['POST'])
+@main.route('/comment/<int:comment_id>/delete', methods=['POST'])
 @login_required
 def delete_comment(comment_id):
     comment = Comment.query.get_or_404(comment_id)
     
     if comment.user_id != current_user.id:
         flash('You cannot delete this comment')
-        return redirect(url_for('post_detail', post_id=comment.post_id))
+        return redirect(url_for('main.post_detail', post_id=comment.post_id))
     
     db.session.delete(comment)
     db.session.commit()
     flash('Comment deleted successfully')
     
-    return redirect(url_for('post_detail', post_id=comment.post_id))
+    return redirect(url_for('main.post_detail', post_id=comment.post_id))
 
-@app.route('/comment/<int:comment_id>/like', methods=['POST'])
+@main.route('/comment/<int:comment_id>/like', methods=['POST'])
 @login_required
 def like_comment(comment_id):
     comment = Comment.query.get_or_404(comment_id)
@@ -641,10 +1314,14 @@ def like_comment(comment_id):
         new_like = CommentLike(user_id=current_user.id, comment_id=comment_id, is_like=True)
         db.session.add(new_like)
     
-    db.session.commit()
-    return redirect(url_for('post_detail', post_id=comment.post_id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request already recorded a reaction for this user
+        db.session.rollback()
+    return redirect(url_for('main.post_detail', post_id=comment.post_id))
 
-@app.route('/comment/<int:comment_id>/dislike', methods=['POST'])
+@main.route('/comment/<int:comment_id>/dislike', methods=['POST'])
 @login_required
 def dislike_comment(comment_id):
     comment = Comment.query.get_or_404(comment_id)
@@ -659,38 +1336,49 @@ def dislike_comment(comment_id):
         new_like = CommentLike(user_id=current_user.id, comment_id=comment_id, is_like=False)
         db.session.add(new_like)
     
-    db.session.commit()
-    return redirect(url_for('post_detail', post_id=comment.post_id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request already recorded a reaction for this user
+        db.session.rollback()
+    return redirect(url_for('main.post_detail', post_id=comment.post_id))
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin:
             flash('You need admin privileges to access this page.', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/admin/blocked_users')
+@main.route('/admin/blocked_users')
 @login_required
 @admin_required
 def blocked_users():
     blocked_users = User.query.filter_by(is_blocked=True).order_by(User.blocked_at.desc()).all()
-    return render_template('admin/blocked_users.html', blocked_users=blocked_users)
+    # On-chain status as mirrored by the chain indexer; unavailable until it has read the chain
+    chain_status = chain_users([user.wallet_address for user in blocked_users if user.wallet_address]) \
+        if ChainBlock.query.first() else None
+    return render_template('admin/blocked_users.html', blocked_users=blocked_users, chain_status=chain_status)
 
-@app.route('/admin/analyze_user/<int:user_id>')
+@main.route('/admin/analyze_user/<int:user_id>')
 @login_required
 @admin_required
 def analyze_user(user_id):
     user = User.query.get_or_404(user_id)
-    high_vulgarity_posts = Post.query.filter_by(user_id=user_id).filter(Post.vulgarity_score > 0.5).all()
+    high_vulgarity_posts = Post.query.filter_by(user_id=user_id).filter(Post.vulgarity_score > REJECT_THRESHOLD).all()
     
     # Delete high vulgarity posts
     for post in high_vulgarity_posts:
-        # Delete the file
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], post.image)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Rejected and failed posts already gave up their reference; the file
+        # itself is only deleted with its last reference
+        if post.status not in ('rejected', 'failed'):
+            release_media(post.image)
+        remove_from_timelines(post)
+        embedding_index.remove(post.id)
+        # The batch's root still commits to it; only the stored proof goes
+        PostAnchor.query.filter_by(post_id=post.id).delete(synchronize_session=False)
         db.session.delete(post)
     
     # Unblock user
@@ -698,40 +1386,28 @@ def analyze_user(user_id):
     db.session.commit()
     
     flash(f'User {user.username} has been unblocked and {len(high_vulgarity_posts)} inappropriate posts have been removed.', 'success')
-    return redirect(url_for('blocked_users'))
+    return redirect(url_for('main.blocked_users'))
 
-@app.route('/request_unblock', methods=['POST'])
+@main.route('/request_unblock', methods=['POST'])
 @login_required
 def request_unblock():
     if current_user.is_blocked:
-        # First check if user is blocked on blockchain
-        user_status = blockchain.get_user_status(current_user.wallet_address)
-        if user_status and user_status['is_blocked']:
-            if blockchain.request_unblock(current_user.wallet_address):
-                if current_user.request_unblock():
-                    db.session.commit()
-                    flash('Unblock request submitted successfully', 'success')
-                else:
-                    flash('You already have a pending unblock request', 'warning')
-            else:
-                flash('Failed to submit unblock request on blockchain', 'error')
+        if current_user.request_unblock():
+            # Sent in the background; skipped there if the user is only blocked in the database
+            transaction_submitter.submit('request_unblock', current_user.id, current_user.wallet_address)
+            flash('Unblock request submitted successfully', 'success')
         else:
-            # If user is blocked in database but not on blockchain, just update database
-            if current_user.request_unblock():
-                db.session.commit()
-                flash('Unblock request submitted successfully', 'success')
-            else:
-                flash('You already have a pending unblock request', 'warning')
+            flash('You already have a pending unblock request', 'warning')
     else:
         flash('Your account is not blocked', 'info')
-    return redirect(url_for('profile', username=current_user.username))
+    return redirect(url_for('main.profile', username=current_user.username))
 
-@app.route('/setup_admin', methods=['GET', 'POST'])
+@main.route('/setup_admin', methods=['GET', 'POST'])
 def setup_admin():
     # Check if any admin exists
     if User.query.filter_by(is_admin=True).first():
         flash('Admin user already exists.', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     if request.method == 'POST':
         username = request.form.get('username')
@@ -740,11 +1416,11 @@ def setup_admin():
         
         if User.query.filter_by(username=username).first():
             flash('Username already exists')
-            return redirect(url_for('setup_admin'))
+            return redirect(url_for('main.setup_admin'))
             
         if User.query.filter_by(email=email).first():
             flash('Email already registered')
-            return redirect(url_for('setup_admin'))
+            return redirect(url_for('main.setup_admin'))
         
         # Create admin user
         admin = User(username=username, email=email, is_admin=True)
@@ -753,11 +1429,11 @@ def setup_admin():
         db.session.commit()
         
         flash('Admin user created successfully. Please login.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
         
     return render_template('setup_admin.html')
 
-@app.route('/admin/dashboard')
+@main.route('/admin/dashboard')
 @login_required
 @admin_required
 def admin_dashboard():
@@ -774,71 +1450,497 @@ def admin_dashboard():
         'content_categories': db.session.query(Post.content_category, db.func.count(Post.id)).group_by(Post.content_category).all()
     }
     
+    # On-chain records of the recent posts, as mirrored by the chain indexer
+    chain_ids = [post.blockchain_post_id for post in stats['recent_posts'] if post.blockchain_post_id is not None]
+    stats['chain_posts'] = {post.id: post for post in ChainPost.query.filter(ChainPost.id.in_(chain_ids))} if chain_ids else {}
+    
     return render_template('admin/dashboard.html', stats=stats)
 
-@app.route('/follow/<username>', methods=['POST'])
+@main.route('/admin/metrics')
+@login_required
+@admin_required
+def admin_metrics():
+    """Moderation throughput counters for tuning batch size and wait time."""
+    # Reported only if a job already loaded it; importing it here would pull in torch
+    moderation = sys.modules.get('moderation')
+    return jsonify({
+        'moderation_queue': {
+            'pending_jobs': moderation_queue.pending_count(),
+            'workers': moderation_queue.max_workers,
+            'executor': moderation_queue.executor_kind
+        },
+        # Populated once a job has run, unless MODERATION_EXECUTOR=process moved them to workers
+        'inference': moderation.image_feature_server.metrics() if moderation else None,
+        'cascade': {
+            'verdicts_by_tier': dict(verdict_tiers),
+            # Per-item tier hit rates, likewise only with the thread executor
+            'tiers': moderation.cascade_metrics() if moderation else None
+        },
+        # Load time and resident memory of the models loaded in this process
+        'models': model_registry.stats(),
+        'embedding_index': embedding_index.stats(),
+        # Blockchain transactions by status: queued, sending, pending, confirmed, skipped or failed
+        'transactions': transaction_submitter.stats(),
+        # Newest block whose events are mirrored into the database
+        'chain_index': {'block': db.session.query(db.func.max(ChainBlock.number)).scalar()}
+    })
+
+@main.route('/admin/similar/<int:post_id>')
+@login_required
+@admin_required
+def similar_posts(post_id):
+    """Posts whose images are closest to this one's, e.g. to find re-uploads of rejected content."""
+    post = Post.query.get_or_404(post_id)
+    tier, vector = embedding_index.get(post.id)
+    if vector is None:
+        return jsonify({'error': 'No embedding stored for this post'}), 404
+    k = max(1, min(request.args.get('k', 10, type=int), 100))
+    
+    # Only posts embedded by the same cascade tier are comparable
+    started = time.perf_counter()
+    hits = [(hit_id, similarity) for hit_id, similarity in embedding_index.search(vector, tier, k + 1) if hit_id != post.id][:k]
+    search_ms = (time.perf_counter() - started) * 1000
+    
+    posts = {p.id: p for p in Post.query.options(joinedload(Post.author)).filter(Post.id.in_([hit_id for hit_id, _ in hits]))}
+    threshold = current_app.config['REUPLOAD_SIMILARITY']
+    results = []
+    for hit_id, similarity in hits:
+        hit = posts.get(hit_id)
+        if hit is None:
+            continue
+        results.append({
+            'post_id': hit.id,
+            'similarity': round(similarity, 4),
+            'status': hit.status,
+            'content_category': hit.content_category,
+            'vulgarity_score': hit.vulgarity_score,
+            'user_id': hit.user_id,
+            'username': hit.author.username,
+            'author_blocked': hit.author.is_blocked,
+            'created_at': hit.created_at.isoformat(),
+            # Near-identical to content that was rejected or posted by a blocked user
+            'possible_reupload': similarity >= threshold and (hit.status == 'rejected' or hit.author.is_blocked)
+        })
+    return jsonify({
+        'post_id': post.id,
+        'tier': tier,
+        'search_ms': round(search_ms, 2),
+        'results': results
+    })
+
+@main.route('/follow/<username>', methods=['POST'])
 @login_required
 def follow_user(username):
     user = User.query.filter_by(username=username).first_or_404()
     
     if user == current_user:
         flash('You cannot follow yourself.', 'error')
-        return redirect(url_for('profile', username=username))
+        return redirect(url_for('main.profile', username=username))
     
     if user in current_user.following:
         flash('You are already following this user.', 'error')
-        return redirect(url_for('profile', username=username))
+        return redirect(url_for('main.profile', username=username))
     
     current_user.following.append(user)
+    db.session.flush()
+    update_follower_count(user, 1)
+    backfill_timeline(current_user, user)
     db.session.commit()
     flash(f'You are now following {username}.', 'success')
-    return redirect(url_for('profile', username=username))
+    return redirect(url_for('main.profile', username=username))
 
-@app.route('/unfollow/<username>', methods=['POST'])
+@main.route('/unfollow/<username>', methods=['POST'])
 @login_required
 def unfollow_user(username):
     user = User.query.filter_by(username=username).first_or_404()
     
     if user == current_user:
         flash('You cannot unfollow yourself.', 'error')
-        return redirect(url_for('profile', username=username))
+        return redirect(url_for('main.profile', username=username))
     
     if user not in current_user.following:
         flash('You are not following this user.', 'error')
-        return redirect(url_for('profile', username=username))
+        return redirect(url_for('main.profile', username=username))
     
     current_user.following.remove(user)
+    prune_timeline(current_user, user)
+    db.session.flush()
+    update_follower_count(user, -1)
     db.session.commit()
     flash(f'You have unfollowed {username}.', 'success')
-    return redirect(url_for('profile', username=username))
+    return redirect(url_for('main.profile', username=username))
 
-@app.route('/followers/<username>')
+@main.route('/followers/<username>')
 def followers(username):
     user = User.query.filter_by(username=username).first_or_404()
-    followers = user.followers.all()
-    return render_template('followers.html', user=user, followers=followers)
+    rows, next_cursor = keyset_page(
+        user.followers.add_columns(Follows.created_at), Follows.created_at, User.id,
+        cursor=request.args.get('cursor'), limit=current_app.config['FEED_PAGE_SIZE'],
+        key=lambda row: (row[1], row[0].id)
+    )
+    followers = [follower for follower, _ in rows]
+    return render_template('followers.html', user=user, followers=followers, next_cursor=next_cursor)
 
-@app.route('/following/<username>')
+@main.route('/following/<username>')
 def following(username):
     user = User.query.filter_by(username=username).first_or_404()
-    following = user.following.all()
-    return render_template('following.html', user=user, following=following)
+    rows, next_cursor = keyset_page(
+        user.following.add_columns(Follows.created_at), Follows.created_at, User.id,
+        cursor=request.args.get('cursor'), limit=current_app.config['FEED_PAGE_SIZE'],
+        key=lambda row: (row[1], row[0].id)
+    )
+    following = [followed for followed, _ in rows]
+    return render_template('following.html', user=user, following=following, next_cursor=next_cursor)
 
-@app.route('/search')
+@main.route('/search')
 def search():
     query = request.args.get('q', '')
+    next_cursor = None
     if query:
         # Search for users by username or bio
-        users = User.query.filter(
-            (User.username.ilike(f'%{query}%')) |
-            (User.bio.ilike(f'%{query}%'))
-        ).all()
+        users, next_cursor = keyset_page(
+            User.query.filter(
+                (User.username.ilike(f'%{query}%')) |
+                (User.bio.ilike(f'%{query}%'))
+            ),
+            User.created_at, User.id,
+            cursor=request.args.get('cursor'), limit=current_app.config['FEED_PAGE_SIZE']
+        )
     else:
         users = []
     
-    return render_template('search.html', users=users, query=query)
+    return render_template('search.html', users=users, query=query, next_cursor=next_cursor)
+
+@main.cli.command('rebuild-timelines')
+def rebuild_timelines():
+    """Rebuild every home timeline and follower count from the follow graph and published posts.
+    
+    Also run it after changing CELEBRITY_FOLLOWER_THRESHOLD.
+    """
+    TimelineEntry.query.delete()
+    follower_counts = dict(db.session.query(Follows.followed_id, db.func.count(Follows.follower_id))
+                           .group_by(Follows.followed_id))
+    users = User.query.all()
+    for user in users:
+        user.follower_count = follower_counts.get(user.id, 0)
+        user.is_celebrity = user.follower_count >= current_app.config['CELEBRITY_FOLLOWER_THRESHOLD']
+    db.session.flush()
+    for user in users:
+        for post in Post.query.filter_by(user_id=user.id, status='published') \
+                .order_by(Post.created_at.desc()).limit(current_app.config['TIMELINE_BACKFILL_LIMIT']):
+            db.session.add(TimelineEntry(user_id=user.id, post_id=post.id, author_id=user.id, created_at=post.created_at))
+        for followed in user.following:
+            backfill_timeline(user, followed)
+        db.session.commit()
+    print('Timelines rebuilt.')
+
+@main.cli.command('import-legacy-media')
+def import_legacy_media():
+    """Move flat files in the upload folder into the content-addressed media store."""
+    imported = {}
+    rows = [(post, 'image') for post in Post.query.all()] + [(user, 'profile_pic') for user in User.query.all()]
+    for row, column in rows:
+        name = getattr(row, column)
+        if not name or is_blob_key(name) or name == 'default.jpg':
+            continue
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], name)
+        if name not in imported:
+            if not os.path.exists(path):
+                print(f"Missing file {name}, skipping")
+                continue
+            with open(path, 'rb') as f:
+                detected = sniff_type(f.read(16))
+            if detected is None:
+                print(f"Unrecognized file type for {name}, skipping")
+                continue
+            imported[name] = (file_sha256(path), detected[0])
+        content_hash, extension = imported[name]
+        tmp_path = copy_to_temp(path, current_app.config['UPLOAD_FOLDER'])
+        setattr(row, column, store_media(tmp_path, content_hash, extension, os.path.getsize(path)))
+        db.session.commit()
+    for name in imported:
+        os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], name))
+    print(f'Imported {len(imported)} files.')
+
+@main.cli.command('generate-derivatives')
+def generate_derivatives():
+    """Generate responsive derivatives for stored images that don't have them yet."""
+    blobs = [(blob.content_hash, blob.key) for blob in MediaBlob.query.filter(MediaBlob.derivative_widths.is_(None))
+             if needs_derivatives(blob)]
+    count = 0
+    for content_hash, key in blobs:
+        try:
+            result = generate_image_derivatives(media_local_path(key), current_app.config['UPLOAD_FOLDER'])
+        except Exception as e:
+            print(f"Error generating derivatives for {key}: {e}")
+            continue
+        apply_derivatives(content_hash, result)
+        count += 1
+    print(f'Generated derivatives for {count} images.')
+
+@main.cli.command('train-embedding-index')
+def train_embedding_index():
+    """Rebuild the similarity indexes' inverted lists from the stored embeddings."""
+    for tier, lists in embedding_index.train().items():
+        print(f'{tier} embedding index trained with {lists} lists.' if lists else f'Nothing to train in the {tier} embedding index.')
+
+@main.cli.command('transcode-videos')
+def transcode_videos():
+    """Transcode videos whose posts are still waiting for playable renditions."""
+    hashes = {post.blob.content_hash for post in Post.query.filter_by(status='processing', is_video=True)
+              if post.blob is not None and not post.blob.video_renditions}
+    for content_hash in hashes:
+        key = MediaBlob.query.get(content_hash).key
+        try:
+            result = transcode_video(media_local_path(key), current_app.config['UPLOAD_FOLDER'], current_app.config['TRANSCODE_THREADS'])
+        except Exception as e:
+            print(f"Error transcoding {key}: {e}")
+            result = {'error': str(e)}
+        apply_transcode(content_hash, result)
+    print(f'Transcoded {len(hashes)} videos.')
+
+@main.cli.command('retry-transactions')
+def retry_transactions():
+    """Queue blockchain transactions that ran out of attempts to be sent again."""
+    print(f'Queued {transaction_submitter.retry_failed()} failed transactions again.')
+
+@main.cli.command('anchor-posts')
+def anchor_posts():
+    """Anchor published posts that are on chain neither individually nor in a batch.
+
+    Picks up posts a stopped process was still collecting for a batch.
+    """
+    rows = db.session.query(Post.id, User.wallet_address, Post.content_hash, Post.vulgarity_score) \
+        .join(User, Post.user_id == User.id) \
+        .outerjoin(PostAnchor, PostAnchor.post_id == Post.id) \
+        .filter(Post.status == 'published', Post.blockchain_post_id.is_(None), PostAnchor.post_id.is_(None),
+                Post.content_hash.isnot(None), User.wallet_address.isnot(None)) \
+        .order_by(Post.id).all()
+    if not rows:
+        print('No posts to anchor.')
+        return
+    from blockchain import build_batch
+    size = current_app.config['ANCHOR_BATCH_SIZE']
+    for start in range(0, len(rows), size):
+        posts = [(post_id, wallet, content_hash, int(score * 100)) for post_id, wallet, content_hash, score in rows[start:start + size]]
+        record_anchor_batch(*build_batch(posts), submit=False)
+    print(f'Queued {len(rows)} posts in {(len(rows) + size - 1) // size} batches; the web app sends them.')
+
+@main.cli.command('index-chain')
+@click.option('--follow', is_flag=True, help='Keep indexing new blocks instead of stopping at the chain head.')
+def index_chain(follow):
+    """Mirror MediaGuard's events into the database.
+
+    With --follow this process does the indexing, so web processes can run
+    with CHAIN_INDEXER=0.
+    """
+    chain_indexer.run(until_synced=not follow)
+    print(f"Indexed up to block {db.session.query(db.func.max(ChainBlock.number)).scalar()}.")
+
+@main.cli.command('rescore-posts')
+@click.option('--chunk-size', default=10000, show_default=True, help='Posts read and updated per transaction.')
+@click.option('--recompute/--no-recompute', default=True, show_default=True,
+              help='Run the vision model for posts without a stored full-resolution embedding.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of an interrupted run.')
+def rescore_posts(chunk_size, recompute, restart):
+    """Re-score every post with the current prompts, thresholds and categories."""
+    # Loads CLIP, so only imported by this command
+    from rescore import Rescorer, load_checkpoint, save_checkpoint
+    rescorer = Rescorer(embedding_index, recompute=recompute)
+    checkpoint = current_app.config['RESCORE_CHECKPOINT']
+    state = None if restart else load_checkpoint(checkpoint, rescorer.key)
+    if state:
+        print(f"Resuming after post {state['last_id']} ({state['scanned']} posts already scanned)")
+    else:
+        state = {'key': rescorer.key, 'last_id': 0, 'scanned': 0, 'updated': 0, 'recomputed': 0,
+                 'unscored': 0, 'published_over_threshold': 0}
+    
+    started = time.perf_counter()
+    scanned_before = state['scanned']
+    while True:
+        rows = Post.query.with_entities(
+            Post.id, Post.is_video, Post.image, Post.status, Post.vulgarity_score, Post.content_category
+        ).filter(Post.id > state['last_id']).order_by(Post.id).limit(chunk_size).all()
+        if not rows:
+            break
+        # Media of rejected and failed posts has been released
+        scores, recomputed = rescorer.score([
+            (row.id, row.is_video, media_local_path(row.image) if row.status not in ('rejected', 'failed') else None)
+            for row in rows
+        ])
+        updates = []
+        for row in rows:
+            score = scores.get(row.id)
+            if score is None:
+                state['unscored'] += 1
+                continue
+            category = content_category(score)
+            if row.vulgarity_score is None or abs(score - row.vulgarity_score) > 1e-4 or category != row.content_category:
+                updates.append({'id': row.id, 'vulgarity_score': score, 'content_category': category})
+            if row.status == 'published' and not is_safe(score):
+                state['published_over_threshold'] += 1
+        db.session.bulk_update_mappings(Post, updates)
+        db.session.commit()
+        
+        state['last_id'] = rows[-1].id
+        state['scanned'] += len(rows)
+        state['updated'] += len(updates)
+        state['recomputed'] += recomputed
+        save_checkpoint(checkpoint, state)
+        rate = (state['scanned'] - scanned_before) / (time.perf_counter() - started)
+        print(f"{state['scanned']} posts scanned, {state['updated']} updated ({rate:.0f} posts/s)")
+    
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    print(f"Re-scored {state['scanned']} posts: {state['updated']} updated, {state['recomputed']} embeddings recomputed, "
+          f"{state['unscored']} without an embedding or media.")
+    if state['published_over_threshold']:
+        # Unpublishing is left to an admin; these are now blurred in feeds
+        print(f"{state['published_over_threshold']} published posts now score above {REJECT_THRESHOLD}.")
+
+def in_app_context(app, func):
+    """Wrap a pool callback so it runs inside ``app``'s application context."""
+    @wraps(func)
+    def wrapper(*args):
+        with app.app_context():
+            return func(*args)
+    return wrapper
+
+def create_app(config=None):
+    """Create the web app.
+
+    Moderation models and the blockchain connection are not touched here:
+    moderation jobs name their handler by import path so only the workers
+    import torch, and the transaction submitter connects to the chain from
+    its own thread once there is something to send.
+    """
+    app = Flask(__name__)
+    app.request_class = StreamingUploadRequest
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default-secret-key')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mediaGuard.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static/img/uploads')
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['MODERATION_QUEUE_DB'] = os.getenv('MODERATION_QUEUE_DB', os.path.join(app.root_path, 'moderation_queue.db'))
+    app.config['MODERATION_WORKERS'] = int(os.getenv('MODERATION_WORKERS', '2'))
+    app.config['FEED_PAGE_SIZE'] = int(os.getenv('FEED_PAGE_SIZE', '20'))
+    # Authors with at least this many followers are merged into feeds at read time
+    app.config['CELEBRITY_FOLLOWER_THRESHOLD'] = int(os.getenv('CELEBRITY_FOLLOWER_THRESHOLD', '10000'))
+    app.config['TIMELINE_BACKFILL_LIMIT'] = int(os.getenv('TIMELINE_BACKFILL_LIMIT', '200'))
+    # 'thread' runs every job against this process's models, so images from concurrent uploads
+    # share the inference batcher; with 'process' each worker batches only its own job's frames
+    app.config['MODERATION_EXECUTOR'] = os.getenv('MODERATION_EXECUTOR', 'thread')
+    # Load models at startup instead of on the first upload; with gunicorn --preload
+    # this happens before the fork, so workers share the weights copy-on-write
+    app.config['PRELOAD_MODELS'] = os.getenv('PRELOAD_MODELS', '0') == '1'
+    app.config['MEDIA_BACKEND'] = os.getenv('MEDIA_BACKEND', 'local')  # 'local' or 's3'
+    app.config['MEDIA_CACHE_DIR'] = os.getenv('MEDIA_CACHE_DIR', os.path.join(app.root_path, 'cache', 'media'))
+    app.config['MEDIA_S3_BUCKET'] = os.getenv('MEDIA_S3_BUCKET')
+    app.config['MEDIA_S3_ENDPOINT_URL'] = os.getenv('MEDIA_S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+    app.config['MEDIA_S3_PREFIX'] = os.getenv('MEDIA_S3_PREFIX', '')
+    app.config['MEDIA_S3_PUBLIC_URL'] = os.getenv('MEDIA_S3_PUBLIC_URL')
+    app.config['DERIVATIVE_WORKERS'] = int(os.getenv('DERIVATIVE_WORKERS', '2'))
+    # Concurrent ffmpeg processes per node, and threads each may use
+    app.config['TRANSCODE_WORKERS'] = int(os.getenv('TRANSCODE_WORKERS', '1'))
+    app.config['TRANSCODE_THREADS'] = int(os.getenv('TRANSCODE_THREADS', '2'))
+    # Full-resolution embeddings; the cascade prefilter's are kept in its 'prefilter' subdirectory
+    app.config['EMBEDDING_INDEX_DIR'] = os.getenv('EMBEDDING_INDEX_DIR', os.path.join(app.root_path, 'cache', 'embeddings'))
+    # Lists scanned per similarity query: higher is more accurate and slower
+    app.config['EMBEDDING_INDEX_NPROBE'] = int(os.getenv('EMBEDDING_INDEX_NPROBE', '8'))
+    # Search is exact below this many posts, then an inverted-list index is trained
+    app.config['EMBEDDING_INDEX_MIN_TRAIN'] = int(os.getenv('EMBEDDING_INDEX_MIN_TRAIN', '20000'))
+    app.config['REUPLOAD_SIMILARITY'] = float(os.getenv('REUPLOAD_SIMILARITY', '0.95'))
+    app.config['RESCORE_CHECKPOINT'] = os.getenv('RESCORE_CHECKPOINT', os.path.join(app.root_path, 'cache', 'rescore_checkpoint.json'))
+    app.config['BLOCKCHAIN_RPC_URL'] = os.getenv('BLOCKCHAIN_RPC_URL', 'http://127.0.0.1:7545')
+    app.config['TRANSACTION_DB'] = os.getenv('TRANSACTION_DB', os.path.join(app.root_path, 'transactions.db'))
+    # Sends of a transaction before it is given up on, backing off from TRANSACTION_BACKOFF seconds
+    app.config['TRANSACTION_MAX_ATTEMPTS'] = int(os.getenv('TRANSACTION_MAX_ATTEMPTS', '5'))
+    app.config['TRANSACTION_BACKOFF'] = float(os.getenv('TRANSACTION_BACKOFF', '10'))
+    # Private key of the contract owner; when set, its transactions are signed locally
+    # instead of by the node, with nonces shared through TRANSACTION_DB
+    app.config['CHAIN_OWNER_PRIVATE_KEY'] = os.getenv('CHAIN_OWNER_PRIVATE_KEY')
+    # 'post' sends createPost for every post; 'batch' anchors posts under one Merkle root
+    # per ANCHOR_BATCH_SIZE posts or ANCHOR_BATCH_SECONDS, whichever comes first
+    app.config['ANCHOR_MODE'] = os.getenv('ANCHOR_MODE', 'post')
+    app.config['ANCHOR_BATCH_SIZE'] = int(os.getenv('ANCHOR_BATCH_SIZE', '256'))
+    app.config['ANCHOR_BATCH_SECONDS'] = float(os.getenv('ANCHOR_BATCH_SECONDS', '30'))
+    # Mirror contract events into the database from each web process
+    app.config['CHAIN_INDEXER'] = os.getenv('CHAIN_INDEXER', '1') == '1'
+    app.config['CHAIN_INDEXER_START_BLOCK'] = int(os.getenv('CHAIN_INDEXER_START_BLOCK', '0'))
+    # Blocks this close to the head aren't indexed yet; reorgs of deeper blocks are undone when noticed
+    app.config['CHAIN_INDEXER_CONFIRMATIONS'] = int(os.getenv('CHAIN_INDEXER_CONFIRMATIONS', '0'))
+    app.config['CHAIN_INDEXER_CHUNK'] = int(os.getenv('CHAIN_INDEXER_CHUNK', '2000'))
+    app.config['CHAIN_INDEXER_POLL'] = float(os.getenv('CHAIN_INDEXER_POLL', '2'))
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    app.extensions['media_backend'] = create_media_backend(app.config)
+    app.extensions['derivative_pool'] = WorkerPool(
+        generate_image_derivatives,
+        in_app_context(app, apply_derivatives),
+        max_workers=app.config['DERIVATIVE_WORKERS'],
+        executor=app.config['MODERATION_EXECUTOR'],
+        name='derivatives'
+    )
+    # ffmpeg does the work in a subprocess, so threads are enough to bound it
+    app.extensions['transcode_pool'] = WorkerPool(
+        transcode_video,
+        in_app_context(app, apply_transcode),
+        max_workers=app.config['TRANSCODE_WORKERS'],
+        executor='thread',
+        name='transcode'
+    )
+    app.extensions['embedding_index'] = TieredEmbeddingIndex(
+        app.config['EMBEDDING_INDEX_DIR'],
+        nprobe=app.config['EMBEDDING_INDEX_NPROBE'],
+        min_train=app.config['EMBEDDING_INDEX_MIN_TRAIN']
+    )
+    app.extensions['moderation_queue'] = ModerationQueue(
+        app.config['MODERATION_QUEUE_DB'],
+        handler='moderation:moderate_upload',
+        on_result=in_app_context(app, apply_moderation_result),
+        max_workers=app.config['MODERATION_WORKERS'],
+        executor=app.config['MODERATION_EXECUTOR'],
+        initializer='moderation:preload_models' if app.config['PRELOAD_MODELS'] else None
+    )
+    app.extensions['transaction_submitter'] = TransactionSubmitter(
+        app.config['TRANSACTION_DB'],
+        on_result=in_app_context(app, apply_transaction),
+        provider_url=app.config['BLOCKCHAIN_RPC_URL'],
+        max_attempts=app.config['TRANSACTION_MAX_ATTEMPTS'],
+        backoff_seconds=app.config['TRANSACTION_BACKOFF'],
+        owner_key=app.config['CHAIN_OWNER_PRIVATE_KEY']
+    )
+
+    app.extensions['chain_indexer'] = ChainIndexer(
+        in_app_context(app, load_chain_blocks),
+        in_app_context(app, record_chain_events),
+        in_app_context(app, rollback_chain),
+        provider_url=app.config['BLOCKCHAIN_RPC_URL'],
+        start_block=app.config['CHAIN_INDEXER_START_BLOCK'],
+        confirmations=app.config['CHAIN_INDEXER_CONFIRMATIONS'],
+        chunk_size=app.config['CHAIN_INDEXER_CHUNK'],
+        poll_interval=app.config['CHAIN_INDEXER_POLL']
+    )
+
+    app.register_blueprint(main)
+
+    # Thread workers use this process's models; process workers load their own
+    if app.config['PRELOAD_MODELS'] and app.config['MODERATION_EXECUTOR'] == 'thread':
+        from moderation import preload_models
+        preload_models()
+
+    return app
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(debug=True) 
\ No newline at end of file
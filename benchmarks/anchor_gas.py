@@ -0,0 +1,68 @@
+"""Compare the gas of anchoring posts one createPost at a time with anchoring
+them as one Merkle root through anchorPostBatch.
+
+Deploys fresh MediaGuardToken and MediaGuard contracts from the Truffle build
+(run `truffle compile` in MediaGuardBC first) on a local Ganache, sends the
+same posts both ways and checks every batched post's proof on chain.
+
+    python benchmarks/anchor_gas.py --posts 1,16,256
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from web3 import Web3  # noqa: E402
+from blockchain import PROVIDER_URL, build_batch  # noqa: E402
+
+def deploy(w3, name, *args):
+    with open(os.path.join(ROOT, 'MediaGuardBC', 'build', 'contracts', f'{name}.json')) as f:
+        artifact = json.load(f)
+    tx_hash = w3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode']).constructor(*args).transact()
+    address = w3.eth.wait_for_transaction_receipt(tx_hash)['contractAddress']
+    return w3.eth.contract(address=address, abi=artifact['abi'])
+
+def gas_used(w3, tx_hashes):
+    return sum(w3.eth.wait_for_transaction_receipt(tx_hash)['gasUsed'] for tx_hash in tx_hashes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', default='1,16,256', help='comma separated batch sizes to measure')
+    parser.add_argument('--rpc', default=PROVIDER_URL, help='JSON-RPC endpoint of the node')
+    args = parser.parse_args()
+
+    w3 = Web3(Web3.HTTPProvider(args.rpc))
+    owner, author = w3.eth.accounts[0], w3.eth.accounts[1]
+    w3.eth.default_account = owner
+    token = deploy(w3, 'MediaGuardToken')
+    media_guard = deploy(w3, 'MediaGuard', token.address)
+    if not any(item.get('name') == 'anchorPostBatch' for item in media_guard.abi):
+        sys.exit('The MediaGuard build has no anchorPostBatch; run `truffle compile` in MediaGuardBC')
+    # Users are registered by reporting their own content
+    w3.eth.wait_for_transaction_receipt(media_guard.functions.reportContent(author).transact({'from': author}))
+
+    print(f"{'posts':>6} {'createPost gas':>15} {'per post':>9} {'batch gas':>10} {'per post':>9} {'saving':>7}")
+    for count in [int(n) for n in args.posts.split(',')]:
+        posts = [(i, author, Web3.keccak(text=f'{count} {i}').hex()[-64:], i % 60) for i in range(count)]
+
+        per_post = gas_used(w3, [
+            media_guard.functions.createPost(content_hash, score).transact({'from': author})
+            for _, _, content_hash, score in posts
+        ])
+
+        root, entries = build_batch(posts)
+        batch_id = media_guard.functions.getBatchCount().call()
+        batch = gas_used(w3, [media_guard.functions.anchorPostBatch(root, count).transact()])
+        for entry in entries:
+            if not media_guard.functions.verifyBatchedPost(batch_id, entry['author'], entry['content_hash'],
+                                                           entry['vulgarity_score'], entry['proof']).call():
+                sys.exit(f"Proof of post {entry['post_id']} in a batch of {count} did not verify on chain")
+
+        print(f'{count:>6} {per_post:>15} {per_post // count:>9} {batch:>10} {batch // count:>9} '
+              f'{per_post / batch:>6.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Evaluate the moderation cascade on a labeled dataset: accuracy and unsafe
+recall against the share of full-resolution compute saved, over a grid of
+prefilter bands.
+
+The dataset uses the layout created by train_model.prepare_dataset_structure,
+data/{train,val,test}/{romance,explicit,implicit,safe}/<images>. The band is
+picked on one split and reported on another, so it is not judged by the data
+it was fit to. Verdicts follow the app: a post is rejected when its score is
+above --threshold, using the prefilter score when it falls outside the band
+and the full-resolution score otherwise.
+
+    python benchmarks/cascade_eval.py --data data --tune-split val --eval-split test
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Score the tiers directly instead of through the app's cascade
+os.environ.setdefault('MODERATION_CASCADE', '0')
+
+import moderation  # noqa: E402
+from moderation_policy import REJECT_THRESHOLD  # noqa: E402
+from cascade import LowResolutionEncoder  # noqa: E402
+
+CATEGORIES = ['romance', 'explicit', 'implicit', 'safe']
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+def load_split(data_dir, split, unsafe_categories):
+    """Return [(path, is_unsafe)] for every image in one split."""
+    items = []
+    for category in CATEGORIES:
+        directory = os.path.join(data_dir, split, category)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                items.append((os.path.join(directory, name), category in unsafe_categories))
+    return items
+
+def score_items(items, encode, batch_size):
+    """Score images in batches; returns (scores, seconds spent encoding)."""
+    prompt_store = moderation.get_models().prompt_store
+    inappropriate = prompt_store.get(moderation.INAPPROPRIATE_CATEGORIES)
+    safe = prompt_store.get(moderation.SAFE_CATEGORIES)
+    scores = []
+    elapsed = 0.0
+    for start in range(0, len(items), batch_size):
+        images = []
+        for path, _ in items[start:start + batch_size]:
+            with Image.open(path) as image:
+                images.append(image.convert('RGB'))
+        started = time.perf_counter()
+        features = torch.stack(encode(images))
+        elapsed += time.perf_counter() - started
+        scores.extend(moderation.calculate_vulgarity_scores(features, inappropriate, safe))
+    return np.array(scores), elapsed
+
+def evaluate(prefilter, full, labels, threshold, safe_below, unsafe_from, prefilter_cost):
+    """Accuracy, unsafe recall, escalation rate and compute saved for one band."""
+    escalated = (prefilter >= safe_below) & (prefilter < unsafe_from)
+    final = np.where(escalated, full, prefilter)
+    predicted = final > threshold
+    escalation_rate = escalated.mean()
+    return {
+        'safe_below': safe_below,
+        'unsafe_from': unsafe_from,
+        'accuracy': (predicted == labels).mean(),
+        'unsafe_recall': predicted[labels].mean() if labels.any() else 1.0,
+        'agreement': (predicted == (full > threshold)).mean(),
+        'escalation_rate': escalation_rate,
+        # Full-model compute relative to running it on everything
+        'compute_saved': 1.0 - (prefilter_cost + escalation_rate)
+    }
+
+def sweep(prefilter, full, labels, threshold, prefilter_cost, step):
+    results = []
+    for safe_below in np.arange(0.0, threshold + 1e-9, step):
+        for unsafe_from in np.arange(threshold, 1.0 + 1e-9, step):
+            results.append(evaluate(prefilter, full, labels, threshold, safe_below, unsafe_from, prefilter_cost))
+    return results
+
+def format_row(name, result):
+    return (f"{name:<18} {result['safe_below']:>6.2f} {result['unsafe_from']:>6.2f} "
+            f"{result['accuracy']:>8.3f} {result['unsafe_recall']:>8.3f} {result['agreement']:>9.3f} "
+            f"{result['escalation_rate']:>9.3f} {result['compute_saved']:>8.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=os.path.join(ROOT, 'data'), help='dataset root')
+    parser.add_argument('--tune-split', default='val', help='split used to pick the band')
+    parser.add_argument('--eval-split', default='test', help='split the chosen band is reported on')
+    parser.add_argument('--unsafe', default='explicit,implicit', help='categories that should be rejected')
+    parser.add_argument('--threshold', type=float, default=REJECT_THRESHOLD, help='score above which the app rejects a post')
+    parser.add_argument('--size', type=int, default=int(os.getenv('MODERATION_PREFILTER_SIZE', '128')),
+                        help='prefilter input size in pixels')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.005,
+                        help='largest accuracy loss against the full model accepted on the tune split')
+    parser.add_argument('--step', type=float, default=0.01, help='band grid step')
+    parser.add_argument('--batch-size', type=int, default=16)
+    args = parser.parse_args()
+
+    models = moderation.get_models()
+    if models is None:
+        sys.exit(f'CLIP model {moderation.CLIP_MODEL_NAME} could not be loaded')
+    unsafe_categories = set(args.unsafe.split(','))
+    prefilter_encoder = LowResolutionEncoder(models.vision_backend.module, models.processor, args.size)
+
+    splits = {}
+    for split in (args.tune_split, args.eval_split):
+        if split in splits:
+            continue
+        items = load_split(args.data, split, unsafe_categories)
+        if not items:
+            sys.exit(f'No images found in {os.path.join(args.data, split)}')
+        print(f'Scoring {len(items)} images from {split}...', file=sys.stderr)
+        full, full_time = score_items(items, moderation.encode_images, args.batch_size)
+        prefilter, prefilter_time = score_items(items, prefilter_encoder, args.batch_size)
+        labels = np.array([is_unsafe for _, is_unsafe in items])
+        splits[split] = (prefilter, full, labels, prefilter_time / full_time)
+        print(f'{split}: full {full_time * 1000 / len(items):.1f} ms/image, '
+              f'prefilter {prefilter_encoder.size}px {prefilter_time * 1000 / len(items):.1f} ms/image',
+              file=sys.stderr)
+
+    prefilter, full, labels, prefilter_cost = splits[args.tune_split]
+    full_only = evaluate(prefilter, full, labels, args.threshold, 0.0, 1.01, prefilter_cost)
+    candidates = [
+        result for result in sweep(prefilter, full, labels, args.threshold, prefilter_cost, args.step)
+        if result['accuracy'] >= full_only['accuracy'] - args.max_accuracy_drop
+    ]
+    chosen = max(candidates, key=lambda result: (result['compute_saved'], result['accuracy']))
+
+    prefilter, full, labels, prefilter_cost = splits[args.eval_split]
+    header = (f"{'':<18} {'safe<':>6} {'unsafe>=':>6} {'accuracy':>8} {'recall':>8} "
+              f"{'agreement':>9} {'escalated':>9} {'saved':>8}")
+    print(f'\n== {args.eval_split} ({len(labels)} images, {int(labels.sum())} unsafe), '
+          f'band picked on {args.tune_split}')
+    print(header)
+    # Running the full model on everything costs no prefilter pass
+    print(format_row('full model only', dict(
+        evaluate(prefilter, full, labels, args.threshold, 0.0, 1.01, prefilter_cost),
+        safe_below=0.0, unsafe_from=1.0, escalation_rate=1.0, compute_saved=0.0)))
+    print(format_row('prefilter only', evaluate(
+        prefilter, full, labels, args.threshold, 0.0, 0.0, prefilter_cost)))
+    print(format_row('cascade', evaluate(
+        prefilter, full, labels, args.threshold, chosen['safe_below'], chosen['unsafe_from'], prefilter_cost)))
+
+    print('\nSuggested settings:')
+    print(f"MODERATION_PREFILTER_SIZE={prefilter_encoder.size}")
+    print(f"MODERATION_PREFILTER_SAFE_BELOW={chosen['safe_below']:.2f}")
+    print(f"MODERATION_PREFILTER_UNSAFE_FROM={chosen['unsafe_from']:.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Measure the cold start of the web app: ``import app`` plus ``create_app()``
+in a fresh interpreter, and which heavy modules it pulled in.
+
+Migrations, CLI commands and tests only need the web app, so none of the
+moderation or chain dependencies should be imported while building it. Exits
+non-zero when one of --forbid is imported or the median start time is above
+--budget, so it can track cold-start time in CI.
+
+    python benchmarks/import_time.py --runs 5 --budget 2.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = 'torch,transformers,cv2,moviepy,web3,onnxruntime'
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - started
+app.create_app()
+total_seconds = time.perf_counter() - started
+print(json.dumps({
+    'import_seconds': import_seconds,
+    'total_seconds': total_seconds,
+    'modules': sorted({name.split('.')[0] for name in sys.modules})
+}))
+'''
+
+def measure(env):
+    """Run the probe in a new interpreter and return its report."""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+        check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='cold starts to take the median of')
+    parser.add_argument('--budget', type=float, help='largest accepted median start time in seconds')
+    parser.add_argument('--forbid', default=HEAVY_MODULES,
+                        help='comma separated modules the web app must not import')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Model preloading imports torch on purpose; measure the plain web process
+    env['PRELOAD_MODELS'] = '0'
+    env.setdefault('DATABASE_URL', 'sqlite://')
+
+    reports = [measure(env) for _ in range(args.runs)]
+    import_seconds = statistics.median(report['import_seconds'] for report in reports)
+    total_seconds = statistics.median(report['total_seconds'] for report in reports)
+    imported = [name for name in args.forbid.split(',') if name in reports[-1]['modules']]
+
+    print(f'import app      {import_seconds * 1000:>8.0f} ms')
+    print(f'+ create_app()  {total_seconds * 1000:>8.0f} ms   (median of {args.runs})')
+    print(f"heavy modules   {', '.join(imported) or 'none'}")
+
+    failures = []
+    if imported:
+        failures.append(f"imported {', '.join(imported)}")
+    if args.budget is not None and total_seconds > args.budget:
+        failures.append(f'start time {total_seconds:.2f}s above budget {args.budget:.2f}s')
+    if failures:
+        sys.exit('; '.join(failures))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Compare moderation inference backends against fp32 PyTorch: vulgarity
+score drift, verdict flips and vision throughput on this machine.
+
+Exits non-zero when a backend's largest score drift exceeds --max-drift, so
+it can gate a backend change in CI. Scores images from --images when given,
+otherwise synthetic gradients and noise.
+
+    python benchmarks/inference_backends.py --backends torch,int8,onnx --images data/test/safe
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('MODERATION_CASCADE', '0')
+
+import moderation  # noqa: E402
+from moderation_policy import REJECT_THRESHOLD  # noqa: E402
+from inference_backends import create_vision_backend  # noqa: E402
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+def load_images(directory, count):
+    if directory:
+        names = sorted(name for name in os.listdir(directory)
+                       if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)[:count]
+        images = []
+        for name in names:
+            with Image.open(os.path.join(directory, name)) as image:
+                images.append(image.convert('RGB'))
+        return images
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        if i % 2:
+            images.append(Image.fromarray(rng.integers(0, 256, (360, 480, 3), dtype=np.uint8)))
+        else:
+            images.append(Image.radial_gradient('L').resize((480, 360)).convert('RGB').rotate(i * 7))
+    return images
+
+def run(backend, images, batch_size):
+    """Features for every image and the seconds spent in the backend."""
+    features = []
+    started = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        features.extend(backend(images[start:start + batch_size]))
+    return torch.stack(features).float(), time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', default='torch,int8,onnx', help='comma separated backends to compare')
+    parser.add_argument('--images', help='directory of images to score')
+    parser.add_argument('--count', type=int, default=64, help='number of images')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--threads', type=int, default=int(os.getenv('MODERATION_INFERENCE_THREADS', '0')) or None)
+    parser.add_argument('--threshold', type=float, default=REJECT_THRESHOLD, help='score above which the app rejects a post')
+    parser.add_argument('--max-drift', type=float, default=0.02, help='largest accepted score difference to fp32')
+    args = parser.parse_args()
+
+    models = moderation.get_models()
+    if models is None:
+        sys.exit(f'CLIP model {moderation.CLIP_MODEL_NAME} could not be loaded')
+    images = load_images(args.images, args.count)
+    if not images:
+        sys.exit(f'No images found in {args.images}')
+    inappropriate = models.prompt_store.get(moderation.INAPPROPRIATE_CATEGORIES)
+    safe = models.prompt_store.get(moderation.SAFE_CATEGORIES)
+
+    reference = create_vision_backend('torch', models.model, models.processor,
+                                      moderation.CLIP_MODEL_NAME, args.threads)
+    # Warm up once so one-off allocation doesn't count against the baseline
+    reference(images[:1])
+    reference_features, reference_time = run(reference, images, args.batch_size)
+    reference_scores = np.array(moderation.calculate_vulgarity_scores(reference_features, inappropriate, safe))
+
+    print(f"{'backend':<8} {'img/s':>8} {'speedup':>8} {'max drift':>10} {'mean drift':>11} "
+          f"{'min cos':>8} {'flips':>6}")
+    failed = False
+    for kind in args.backends.split(','):
+        try:
+            started = time.perf_counter()
+            backend = create_vision_backend(kind, models.model, models.processor,
+                                            moderation.CLIP_MODEL_NAME, args.threads)
+            setup = time.perf_counter() - started
+            backend(images[:1])
+        except Exception as e:
+            print(f'{kind:<8} unavailable: {e}')
+            continue
+        features, elapsed = run(backend, images, args.batch_size)
+        scores = np.array(moderation.calculate_vulgarity_scores(features, inappropriate, safe))
+        drift = np.abs(scores - reference_scores)
+        cosine = torch.nn.functional.cosine_similarity(features, reference_features).min().item()
+        flips = int(((scores > args.threshold) != (reference_scores > args.threshold)).sum())
+        print(f'{kind:<8} {len(images) / elapsed:>8.1f} {reference_time / elapsed:>7.2f}x '
+              f'{drift.max():>10.5f} {drift.mean():>11.5f} {cosine:>8.4f} {flips:>6}'
+              f'   (setup {setup:.1f}s)')
+        if drift.max() > args.max_drift:
+            failed = True
+    if failed:
+        sys.exit(f'Score drift above {args.max_drift}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""Compare query plans and timings of the hot lookup paths before and after
+the a9d2e4f6c803 index migration on a seeded SQLite database.
+
+The schema is built by running the real Alembic migrations, so the benchmark
+always measures what `flask db upgrade` produces.
+
+    python benchmarks/query_plans.py --rows 1000000
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERSIONS = os.path.join(ROOT, 'migrations', 'versions')
+BASE_REVISIONS = ['13607c57d22a', '4b1f9c2e7d10', '7c3e5a91b2f4']
+INDEX_REVISION = 'a9d2e4f6c803'
+
+QUERIES = {
+    'reaction lookup': (
+        'SELECT id, is_like FROM post_like WHERE post_id = :post_id AND user_id = :user_id',
+        lambda p: {'post_id': p['post_id'], 'user_id': p['user_id']}
+    ),
+    'feed like counts': (
+        'SELECT post_id, is_like, count(id) FROM post_like WHERE post_id IN ({post_ids}) '
+        'GROUP BY post_id, is_like',
+        None
+    ),
+    'profile posts': (
+        "SELECT id FROM post WHERE user_id = :user_id AND status = 'published' "
+        'ORDER BY created_at DESC, id DESC LIMIT 21',
+        lambda p: {'user_id': p['user_id']}
+    ),
+    'global feed page': (
+        "SELECT id FROM post WHERE status = 'published' AND "
+        'created_at <= :created_at AND (created_at < :created_at OR id < :id) '
+        'ORDER BY created_at DESC, id DESC LIMIT 21',
+        lambda p: {'created_at': p['created_at'], 'id': p['post_id']}
+    ),
+    'followers page': (
+        'SELECT follower_id FROM follows WHERE followed_id = :user_id ORDER BY created_at DESC LIMIT 21',
+        lambda p: {'user_id': p['user_id']}
+    ),
+    'blocked users': (
+        'SELECT id FROM user WHERE is_blocked = 1 ORDER BY blocked_at DESC LIMIT 5',
+        lambda p: {}
+    ),
+    'unblock requests': (
+        'SELECT id FROM user WHERE unblock_request = 1 ORDER BY unblock_request_date DESC LIMIT 5',
+        lambda p: {}
+    ),
+    'comment counts': (
+        'SELECT post_id, count(id) FROM comment WHERE post_id IN ({post_ids}) GROUP BY post_id',
+        None
+    ),
+}
+
+def load_migration(revision):
+    for name in os.listdir(VERSIONS):
+        if name.startswith(revision) and name.endswith('.py'):
+            spec = importlib.util.spec_from_file_location(f'migration_{revision}', os.path.join(VERSIONS, name))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return module
+    raise FileNotFoundError(f'Migration {revision} not found')
+
+def run_migration(connection, revision):
+    context = MigrationContext.configure(connection, opts={'render_as_batch': True})
+    with Operations.context(context):
+        load_migration(revision).upgrade()
+
+def seed(connection, rows):
+    users = max(rows // 100, 100)
+    posts = max(rows // 5, 1000)
+    comments = max(rows // 5, 1000)
+    follows = max(rows // 10, 1000)
+    start = datetime(2025, 1, 1)
+    rng = random.Random(42)
+
+    def batched(sql, generator, size=50000):
+        batch = []
+        for row in generator:
+            batch.append(row)
+            if len(batch) >= size:
+                connection.execute(sa.text(sql), batch)
+                batch = []
+        if batch:
+            connection.execute(sa.text(sql), batch)
+
+    batched(
+        'INSERT INTO user (id, username, email, password_hash, wallet_address, created_at, is_blocked, '
+        'blocked_at, unblock_request, unblock_request_date, violation_count) '
+        'VALUES (:id, :username, :email, :pw, :wallet, :created_at, :blocked, :blocked_at, :unblock, :unblock_at, 0)',
+        ({
+            'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'pw': 'x',
+            'wallet': f'0x{i:040x}', 'created_at': start + timedelta(minutes=i),
+            'blocked': i % 200 == 0, 'blocked_at': start + timedelta(hours=i) if i % 200 == 0 else None,
+            'unblock': i % 400 == 0, 'unblock_at': start + timedelta(hours=i) if i % 400 == 0 else None
+        } for i in range(1, users + 1))
+    )
+    batched(
+        'INSERT INTO post (id, image, user_id, created_at, status, content_category, vulgarity_score) '
+        "VALUES (:id, 'x.jpg', :user_id, :created_at, 'published', 'safe', 0.1)",
+        ({'id': i, 'user_id': rng.randint(1, users), 'created_at': start + timedelta(seconds=i * 30)}
+         for i in range(1, posts + 1))
+    )
+    batched(
+        "INSERT INTO comment (id, content, user_id, post_id, created_at) VALUES (:id, 'hi', :user_id, :post_id, :created_at)",
+        ({'id': i, 'user_id': rng.randint(1, users), 'post_id': rng.randint(1, posts),
+          'created_at': start + timedelta(seconds=i * 30)} for i in range(1, comments + 1))
+    )
+    seen = set()
+
+    def likes():
+        i = 0
+        while i < rows:
+            key = (rng.randint(1, posts), rng.randint(1, users))
+            if key in seen:
+                continue
+            seen.add(key)
+            i += 1
+            yield {'id': i, 'post_id': key[0], 'user_id': key[1], 'is_like': rng.random() < 0.8,
+                   'created_at': start + timedelta(seconds=i)}
+
+    batched(
+        'INSERT INTO post_like (id, post_id, user_id, is_like, created_at) VALUES (:id, :post_id, :user_id, :is_like, :created_at)',
+        likes()
+    )
+    seen.clear()
+
+    def follow_rows():
+        count = 0
+        while count < follows:
+            key = (rng.randint(1, users), rng.randint(1, users))
+            if key[0] == key[1] or key in seen:
+                continue
+            seen.add(key)
+            count += 1
+            yield {'follower_id': key[0], 'followed_id': key[1], 'created_at': start + timedelta(seconds=count)}
+
+    batched(
+        'INSERT INTO follows (follower_id, followed_id, created_at) VALUES (:follower_id, :followed_id, :created_at)',
+        follow_rows()
+    )
+    return {'users': users, 'posts': posts}
+
+def measure(connection, sizes, repeat):
+    rng = random.Random(7)
+    results = {}
+    for name, (sql, params_for) in QUERIES.items():
+        plan_sql = sql
+        if '{post_ids}' in sql:
+            plan_sql = sql.format(post_ids=', '.join(str(rng.randint(1, sizes['posts'])) for _ in range(20)))
+        probe = {
+            'post_id': rng.randint(1, sizes['posts']),
+            'user_id': rng.randint(1, sizes['users']),
+            'created_at': datetime(2025, 1, 1) + timedelta(seconds=sizes['posts'] * 15)
+        }
+        params = params_for(probe) if params_for else {}
+        plan = [row[-1] for row in connection.execute(sa.text(f'EXPLAIN QUERY PLAN {plan_sql}'), params)]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            connection.execute(sa.text(plan_sql), params).fetchall()
+        elapsed = (time.perf_counter() - started) * 1000 / repeat
+        results[name] = (plan, elapsed)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='number of post_like rows to seed')
+    parser.add_argument('--repeat', type=int, default=20, help='executions per query when timing')
+    parser.add_argument('--db', help='SQLite file to use (defaults to a temporary file)')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+    engine = sa.create_engine(f'sqlite:///{db_path}')
+    with engine.begin() as connection:
+        for revision in BASE_REVISIONS:
+            run_migration(connection, revision)
+        print(f'Seeding {args.rows} reactions into {db_path}...', file=sys.stderr)
+        sizes = seed(connection, args.rows)
+        connection.execute(sa.text('ANALYZE'))
+
+    with engine.connect() as connection:
+        before = measure(connection, sizes, args.repeat)
+    with engine.begin() as connection:
+        run_migration(connection, INDEX_REVISION)
+        connection.execute(sa.text('ANALYZE'))
+    with engine.connect() as connection:
+        after = measure(connection, sizes, args.repeat)
+
+    for name in QUERIES:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f'\n== {name}: {ms_before:.3f} ms -> {ms_after:.3f} ms')
+        print('   before: ' + ' | '.join(plan_before))
+        print('   after:  ' + ' | '.join(plan_after))
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,138 @@
-from web3 import Web3
+from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
+from web3.exceptions import TransactionNotFound
+from web3.logs import DISCARD
 from eth_account import Account
+from eth_abi import encode
+from eth_utils import keccak, to_canonical_address
+import asyncio
 import json
 import os
+import threading
+import time
+
+PROVIDER_URL = 'http://127.0.0.1:7545'
+
+# Gas a user's balance must cover before a transaction is sent for them
+GAS_ALLOWANCE = 100000
+
+def load_contracts():
+    """(abi, address) of the MediaGuardToken and MediaGuard contracts from the last deployment."""
+    try:
+        with open('MediaGuardBC/build/contracts/MediaGuardToken.json') as f:
+            token = json.load(f)
+        with open('MediaGuardBC/build/contracts/MediaGuard.json') as f:
+            media_guard = json.load(f)
+    except FileNotFoundError as e:
+        raise Exception(f"Contract files not found. Please make sure you have run 'truffle migrate' in the MediaGuardBC directory. Error: {str(e)}")
+    return (
+        (token['abi'], token['networks']['5777']['address']),
+        (media_guard['abi'], media_guard['networks']['5777']['address'])
+    )
+
+class ReadBatch:
+    """Reads sent to the node together as one JSON-RPC batch request.
+
+    Queue contract view calls and account reads, then ``execute`` (or
+    ``async_execute`` with an async provider) makes one round trip per
+    ``max_size`` reads and returns the decoded results in the order they
+    were queued. With ``return_exceptions`` a read the node failed, e.g. a
+    reverted call, comes back as the exception instead of raising it.
+    """
+
+    def __init__(self, w3, max_size=500):
+        self.w3 = w3
+        self.max_size = max_size
+        self._requests = []
+        self._decoders = []
+
+    def call(self, function):
+        """Queue a contract view call, e.g. ``contract.functions.isBlocked(address)``."""
+        types = [output['type'] for output in function.abi['outputs']]
+
+        def decode(result):
+            values = [Web3.to_checksum_address(value) if type_ == 'address' else value
+                      for type_, value in zip(types, self.w3.codec.decode(types, Web3.to_bytes(hexstr=result)))]
+            return values[0] if len(values) == 1 else tuple(values)
+
+        self._add('eth_call', [{'to': function.address, 'data': function._encode_transaction_data()}, 'latest'], decode)
+
+    def balance(self, address):
+        self._add('eth_getBalance', [address, 'latest'], lambda result: int(result, 16))
+
+    def gas_price(self):
+        self._add('eth_gasPrice', [], lambda result: int(result, 16))
+
+    def block(self, number):
+        """Queue a block header read; decodes to ``{'hash', 'timestamp'}``, or None past the head."""
+        self._add('eth_getBlockByNumber', [hex(number), False], lambda result: result and {
+            'hash': result['hash'],
+            'timestamp': int(result['timestamp'], 16)
+        })
+
+    def _add(self, method, params, decode):
+        self._requests.append((method, params))
+        self._decoders.append(decode)
+
+    def _chunks(self):
+        return [self._requests[start:start + self.max_size] for start in range(0, len(self._requests), self.max_size)]
+
+    def execute(self, return_exceptions=False):
+        responses = []
+        for chunk in self._chunks():
+            responses.extend(self._check(self.w3.provider.make_batch_request(chunk)))
+        return self._decode(responses, return_exceptions)
+
+    async def async_execute(self, return_exceptions=False):
+        responses = []
+        for chunk in self._chunks():
+            responses.extend(self._check(await self.w3.provider.make_batch_request(chunk)))
+        return self._decode(responses, return_exceptions)
+
+    @staticmethod
+    def _check(responses):
+        # A batch the node rejects as a whole gets a single error response
+        if not isinstance(responses, list):
+            raise Exception(f"Batch request failed: {responses.get('error', responses)}")
+        return responses
+
+    def _decode(self, responses, return_exceptions):
+        results = []
+        for decode, response in zip(self._decoders, responses):
+            try:
+                if response.get('error'):
+                    raise Exception(response['error'].get('message', response['error']))
+                results.append(decode(response['result']))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+def user_reads(batch, media_guard_contract, user_address):
+    """Queue the reads every user transaction checks first: has_reported,
+    is_blocked, balance and gas_price.
+    """
+    functions = media_guard_contract.functions
+    batch.call(functions.hasReported(user_address))
+    batch.call(functions.isBlocked(user_address))
+    batch.balance(user_address)
+    batch.gas_price()
+
+def post_details(post):
+    author, content_hash, vulgarity_score, is_blocked, created_at = post
+    return {
+        'author': author,
+        'content_hash': content_hash,
+        'vulgarity_score': vulgarity_score,
+        'is_blocked': is_blocked,
+        'created_at': created_at
+    }
 
 class BlockchainManager:
-    def __init__(self):
+    def __init__(self, provider_url=PROVIDER_URL):
         try:
             # Connect to Ganache
-            self.w3 = Web3(Web3.HTTPProvider('http://127.0.0.1:7545'))
+            self.w3 = Web3(Web3.HTTPProvider(provider_url))
             
             # Check connection by trying to get the latest block
             try:
@@ -16,19 +141,7 @@ class BlockchainManager:
                 raise Exception("Could not connect to Ganache. Please make sure Ganache is running.")
             
             # Load contract ABIs and addresses
-            try:
-                with open('MediaGuardBC/build/contracts/MediaGuardToken.json') as f:
-                    token_abi = json.load(f)['abi']
-                with open('MediaGuardBC/build/contracts/MediaGuard.json') as f:
-                    media_guard_abi = json.load(f)['abi']
-                
-                # Get contract addresses from the last deployment
-                with open('MediaGuardBC/build/contracts/MediaGuardToken.json') as f:
-                    token_address = json.load(f)['networks']['5777']['address']
-                with open('MediaGuardBC/build/contracts/MediaGuard.json') as f:
-                    media_guard_address = json.load(f)['networks']['5777']['address']
-            except FileNotFoundError as e:
-                raise Exception(f"Contract files not found. Please make sure you have run 'truffle migrate' in the MediaGuardBC directory. Error: {str(e)}")
+            (token_abi, token_address), (media_guard_abi, media_guard_address) = load_contracts()
             
             # Initialize contract instances
             self.token_contract = self.w3.eth.contract(
@@ -49,18 +162,23 @@ class BlockchainManager:
             print(f"Error initializing blockchain manager: {str(e)}")
             raise
     
+    def _user_state(self, user_address):
+        """(has_reported, is_blocked, balance, gas_price) of a user in one round trip."""
+        batch = ReadBatch(self.w3)
+        user_reads(batch, self.media_guard_contract, user_address)
+        return batch.execute()
+    
     def register_user(self, user_address):
         """Register a new user on the blockchain"""
         try:
+            user_address = Web3.to_checksum_address(user_address)
+            has_reported, is_blocked, balance, gas_price = self._user_state(user_address)
+            
             # Check if user has enough balance for gas
-            balance = self.w3.eth.get_balance(user_address)
-            if balance < self.w3.eth.gas_price * 100000:  # Assuming max gas of 100,000
+            if balance < gas_price * 100000:  # Assuming max gas of 100,000
                 raise Exception("Insufficient balance for gas fees. Please add some test ETH to your wallet.")
             
             # Check if user is already registered (has reported content or is blocked)
-            has_reported = self.media_guard_contract.functions.hasReported(user_address).call()
-            is_blocked = self.media_guard_contract.functions.isBlocked(user_address).call()
-            
             if has_reported or is_blocked:
                 return True
             
@@ -82,16 +200,15 @@ class BlockchainManager:
     def create_post(self, user_address, content_hash, vulgarity_score):
         """Create a new post on the blockchain"""
         try:
-            # Check if user is registered by checking if they have reported content or have been blocked
-            has_reported = self.media_guard_contract.functions.hasReported(user_address).call()
-            is_blocked = self.media_guard_contract.functions.isBlocked(user_address).call()
+            user_address = Web3.to_checksum_address(user_address)
+            has_reported, is_blocked, balance, gas_price = self._user_state(user_address)
             
+            # Check if user is registered by checking if they have reported content or have been blocked
             if not has_reported and not is_blocked:
                 raise Exception("User not registered on blockchain")
             
             # Check if user has enough balance for gas
-            balance = self.w3.eth.get_balance(user_address)
-            if balance < self.w3.eth.gas_price * 100000:  # Assuming max gas of 100,000
+            if balance < gas_price * 100000:  # Assuming max gas of 100,000
                 raise Exception("Insufficient balance for gas fees. Please add some test ETH to your wallet.")
             
             tx_hash = self.media_guard_contract.functions.createPost(
@@ -114,16 +231,15 @@ class BlockchainManager:
     def request_unblock(self, user_address):
         """Request unblock for a blocked user"""
         try:
-            # Check if user is registered by checking if they have reported content or have been blocked
-            has_reported = self.media_guard_contract.functions.hasReported(user_address).call()
-            is_blocked = self.media_guard_contract.functions.isBlocked(user_address).call()
+            user_address = Web3.to_checksum_address(user_address)
+            has_reported, is_blocked, balance, gas_price = self._user_state(user_address)
             
+            # Check if user is registered by checking if they have reported content or have been blocked
             if not has_reported and not is_blocked:
                 raise Exception("User not registered on blockchain")
             
             # Check if user has enough balance for gas
-            balance = self.w3.eth.get_balance(user_address)
-            if balance < self.w3.eth.gas_price * 100000:  # Assuming max gas of 100,000
+            if balance < gas_price * 100000:  # Assuming max gas of 100,000
                 raise Exception("Insufficient balance for gas fees. Please add some test ETH to your wallet.")
             
             tx_hash = self.media_guard_contract.functions.requestUnblock().transact({
@@ -143,10 +259,10 @@ class BlockchainManager:
     def analyze_and_unblock_user(self, user_address):
         """Admin function to analyze and unblock a user"""
         try:
-            # Check if user is registered by checking if they have reported content or have been blocked
-            has_reported = self.media_guard_contract.functions.hasReported(user_address).call()
-            is_blocked = self.media_guard_contract.functions.isBlocked(user_address).call()
+            user_address = Web3.to_checksum_address(user_address)
+            has_reported, is_blocked, _, _ = self._user_state(user_address)
             
+            # Check if user is registered by checking if they have reported content or have been blocked
             if not has_reported and not is_blocked:
                 raise Exception("User not registered on blockchain")
             
@@ -166,42 +282,508 @@ class BlockchainManager:
     
     def get_user_status(self, user_address):
         """Get the current status of a user"""
+        return self.get_users_status([user_address]).get(user_address)
+    
+    def get_users_status(self, user_addresses):
+        """Get the status of many users from one batch request, keyed by address.
+
+        Users who aren't registered on the blockchain map to None, and none
+        are returned if the node can't be reached.
+        """
         try:
+            batch = ReadBatch(self.w3)
+            functions = self.media_guard_contract.functions
+            for user_address in user_addresses:
+                user_address = Web3.to_checksum_address(user_address)
+                batch.call(functions.hasReported(user_address))
+                batch.call(functions.isBlocked(user_address))
+                batch.call(functions.reportCount(user_address))
+            results = batch.execute()
+        except Exception as e:
+            print(f"Error getting user status: {str(e)}")
+            return {}
+        
+        statuses = {}
+        for index, user_address in enumerate(user_addresses):
+            has_reported, is_blocked, report_count = results[3 * index:3 * index + 3]
             # Check if user is registered by checking if they have reported content or have been blocked
-            has_reported = self.media_guard_contract.functions.hasReported(user_address).call()
-            is_blocked = self.media_guard_contract.functions.isBlocked(user_address).call()
-            
             if not has_reported and not is_blocked:
-                return None
-            
-            return {
+                statuses[user_address] = None
+                continue
+            statuses[user_address] = {
                 'is_registered': True,
                 'is_blocked': is_blocked,
                 'has_reported': has_reported,
-                'report_count': self.media_guard_contract.functions.reportCount(user_address).call()
+                'report_count': report_count
             }
-        except Exception as e:
-            print(f"Error getting user status: {str(e)}")
-            return None
+        return statuses
     
     def get_post(self, post_id):
         """Get the details of a specific post"""
+        return self.get_posts([post_id]).get(post_id)
+    
+    def get_posts(self, post_ids):
+        """Get the details of many posts from one batch request, keyed by id; missing posts are left out."""
         try:
-            post = self.media_guard_contract.functions.getPost(post_id).call()
-            return {
-                'author': post[0],
-                'content_hash': post[1],
-                'vulgarity_score': post[2],
-                'is_blocked': post[3],
-                'created_at': post[4]
-            }
+            batch = ReadBatch(self.w3)
+            for post_id in post_ids:
+                batch.call(self.media_guard_contract.functions.getPost(post_id))
+            results = batch.execute(return_exceptions=True)
         except Exception as e:
-            print(f"Error getting post: {str(e)}")
+            print(f"Error getting posts: {str(e)}")
+            return {}
+        
+        posts = {}
+        for post_id, post in zip(post_ids, results):
+            if isinstance(post, Exception):
+                print(f"Error getting post {post_id}: {str(post)}")
+                continue
+            posts[post_id] = post_details(post)
+        return posts
+
+# Seconds a fetched gas price is reused for by LocalSigner
+GAS_PRICE_SECONDS = 10
+
+# How nodes (geth, Ganache, Nethermind) reject a nonce the account already used
+STALE_NONCE_ERRORS = ('nonce too low', "doesn't have the correct nonce", 'oldnonce')
+class LocalSigner:
+    """Signs one account's transactions locally and sends them raw.
+
+    Nonces come from a ``NonceManager`` instead of the node, so transactions
+    from the account go out back to back from any number of workers rather
+    than one at a time through the node's account. Gas is estimated once
+    per contract function, and the gas price fetched at most every
+    ``GAS_PRICE_SECONDS``.
+    """
+
+    def __init__(self, w3, private_key, nonces):
+        self.w3 = w3
+        self.account = Account.from_key(private_key)
+        self.nonces = nonces
+        self._chain_id = None
+        self._gas = {}
+        self._gas_price = None
+        self._gas_price_at = 0
+        self._resync_lock = asyncio.Lock()
+
+    @property
+    def address(self):
+        return self.account.address
+
+    async def _estimate_gas(self, transaction):
+        # Keyed by function selector; the functions sent this way don't vary
+        # much in gas with their arguments, and the estimate has headroom
+        selector = transaction['data'][:10]
+        if selector not in self._gas:
+            self._gas[selector] = int(await self.w3.eth.estimate_gas(transaction) * 1.2)
+        return self._gas[selector]
+
+    async def _current_gas_price(self):
+        if self._gas_price is None or time.monotonic() - self._gas_price_at >= GAS_PRICE_SECONDS:
+            self._gas_price = await self.w3.eth.gas_price
+            self._gas_price_at = time.monotonic()
+        return self._gas_price
+
+    async def resync(self, fill_gaps=False):
+        """Catch up with the account's nonces on the node; see ``NonceManager.resync``."""
+        async with self._resync_lock:
+            mined = await self.w3.eth.get_transaction_count(self.address, 'latest')
+            pending = await self.w3.eth.get_transaction_count(self.address, 'pending')
+            self.nonces.resync(self.address, mined, pending, fill_gaps)
+
+    async def _allocate_nonce(self):
+        allocated = self.nonces.allocate(self.address)
+        if allocated is None:
+            # The first send of many in flight at once syncs for all of them
+            async with self._resync_lock:
+                allocated = self.nonces.allocate(self.address)
+            if allocated is None:
+                await self.resync()
+                allocated = self.nonces.allocate(self.address)
+        return allocated
+
+    async def send(self, function):
+        """Sign and send a contract function call; returns the transaction hash."""
+        if self._chain_id is None:
+            self._chain_id = await self.w3.eth.chain_id
+        transaction = {'from': self.address, 'to': function.address, 'data': function._encode_transaction_data()}
+        transaction['gas'] = await self._estimate_gas(transaction)
+        gas_price = await self._current_gas_price()
+        for attempt in range(2):
+            nonce, reused = await self._allocate_nonce()
+            signed = self.account.sign_transaction(dict(
+                transaction, nonce=nonce, chainId=self._chain_id,
+                # A reused nonce's dropped transaction may still be in a mempool; outbid it
+                gasPrice=gas_price * 9 // 8 + 1 if reused else gas_price
+            ))
+            try:
+                tx_hash = await self.w3.eth.send_raw_transaction(signed.raw_transaction)
+            except Exception as e:
+                if 'already known' in str(e):
+                    self.nonces.sent(self.address, nonce)
+                    return signed.hash
+                message = str(e).lower()
+                if attempt == 0 and any(error in message for error in STALE_NONCE_ERRORS):
+                    # Used by something else sending from the account; catch up
+                    self.nonces.sent(self.address, nonce)
+                    await self.resync()
+                    continue
+                self.nonces.release(self.address, nonce)
+                raise
+            self.nonces.sent(self.address, nonce)
+            return tx_hash
+
+class AsyncBlockchainManager:
+    """Non-blocking counterpart of ``BlockchainManager`` for the transaction submitter.
+
+    ``send`` runs the same checks as the blocking methods, read in one batch
+    request, and returns as soon as the node has accepted the transaction;
+    ``receipts`` then looks up many transactions at once, concurrently over
+    one connection. With an ``owner_signer``, the owner's transactions are
+    signed locally instead of by the node.
+    """
+
+    def __init__(self, w3, token_contract, media_guard_contract, owner_signer=None):
+        self.w3 = w3
+        self.token_contract = token_contract
+        self.media_guard_contract = media_guard_contract
+        self.owner_signer = owner_signer
+
+    @classmethod
+    async def connect(cls, provider_url=PROVIDER_URL, owner_key=None, nonces=None):
+        """Connect to the node; with ``owner_key`` the owner's transactions are
+        signed locally, with nonces from the ``nonces`` manager.
+        """
+        w3 = AsyncWeb3(AsyncHTTPProvider(provider_url))
+        try:
+            await w3.eth.get_block('latest')
+        except Exception:
+            raise Exception("Could not connect to Ganache. Please make sure Ganache is running.")
+
+        (token_abi, token_address), (media_guard_abi, media_guard_address) = load_contracts()
+        owner_signer = LocalSigner(w3, owner_key, nonces) if owner_key else None
+        if owner_signer is not None:
+            w3.eth.default_account = owner_signer.address
+        else:
+            accounts = await w3.eth.accounts
+            if not accounts:
+                raise Exception("No accounts found in Ganache. Please make sure Ganache is running and has accounts.")
+            w3.eth.default_account = accounts[0]
+        return cls(
+            w3,
+            w3.eth.contract(address=token_address, abi=token_abi),
+            w3.eth.contract(address=media_guard_address, abi=media_guard_abi),
+            owner_signer
+        )
+
+    async def _send_as_owner(self, function):
+        if self.owner_signer is not None:
+            return await self.owner_signer.send(function)
+        return await function.transact()
+
+    async def recover_nonces(self):
+        """Resync locally signed nonces after a transaction was dropped."""
+        if self.owner_signer is not None:
+            await self.owner_signer.resync(fill_gaps=True)
+
+    async def _user_state(self, user_address):
+        """(has_reported, is_blocked, balance, gas_price) of a user in one round trip."""
+        batch = ReadBatch(self.w3)
+        user_reads(batch, self.media_guard_contract, user_address)
+        return await batch.async_execute()
+
+    @staticmethod
+    def _check_balance(balance, gas_price):
+        if balance < gas_price * GAS_ALLOWANCE:
+            raise Exception("Insufficient balance for gas fees. Please add some test ETH to your wallet.")
+
+    async def send(self, kind, *args):
+        """Send a ``kind`` transaction ('register_user', 'create_post',
+        'anchor_batch' or 'request_unblock') and return its hash, or None if
+        the chain already has what it would do.
+        """
+        handler = getattr(self, f'_send_{kind}', None)
+        if handler is None:
+            raise ValueError(f"Unknown transaction kind {kind}")
+        tx_hash = await handler(*args)
+        return Web3.to_hex(tx_hash) if tx_hash is not None else None
+
+    async def _send_register_user(self, user_address):
+        user_address = Web3.to_checksum_address(user_address)
+        has_reported, is_blocked, balance, gas_price = await self._user_state(user_address)
+        self._check_balance(balance, gas_price)
+        if has_reported or is_blocked:
             return None
+        # Users are registered by reporting their own content
+        return await self.media_guard_contract.functions.reportContent(user_address).transact({'from': user_address})
+
+    async def _send_create_post(self, user_address, content_hash, vulgarity_score):
+        user_address = Web3.to_checksum_address(user_address)
+        has_reported, is_blocked, balance, gas_price = await self._user_state(user_address)
+        if not has_reported and not is_blocked:
+            raise Exception("User not registered on blockchain")
+        self._check_balance(balance, gas_price)
+        return await self.media_guard_contract.functions.createPost(content_hash, vulgarity_score).transact({'from': user_address})
+
+    async def _send_anchor_batch(self, sender, merkle_root, post_count):
+        # Only the contract owner can anchor batches
+        return await self._send_as_owner(self.media_guard_contract.functions.anchorPostBatch(merkle_root, post_count))
+
+    async def _send_request_unblock(self, user_address):
+        user_address = Web3.to_checksum_address(user_address)
+        has_reported, is_blocked, balance, gas_price = await self._user_state(user_address)
+        if not is_blocked:
+            # Only the database has the user blocked
+            return None
+        self._check_balance(balance, gas_price)
+        return await self.media_guard_contract.functions.requestUnblock().transact({'from': user_address})
+
+    async def receipts(self, tx_hashes):
+        """{tx hash: receipt} for those of ``tx_hashes`` that have been mined."""
+        results = await asyncio.gather(
+            *(self.w3.eth.get_transaction_receipt(tx_hash) for tx_hash in tx_hashes),
+            return_exceptions=True
+        )
+        receipts = {}
+        for tx_hash, result in zip(tx_hashes, results):
+            if isinstance(result, TransactionNotFound):
+                continue
+            if isinstance(result, Exception):
+                print(f"Error fetching receipt for {tx_hash}: {result}")
+                continue
+            receipts[tx_hash] = result
+        return receipts
+
+    async def known_transactions(self, tx_hashes):
+        """Those of ``tx_hashes`` the node still has, mined or waiting to be."""
+        results = await asyncio.gather(
+            *(self.w3.eth.get_transaction(tx_hash) for tx_hash in tx_hashes),
+            return_exceptions=True
+        )
+        known = set()
+        for tx_hash, result in zip(tx_hashes, results):
+            if isinstance(result, TransactionNotFound):
+                continue
+            if isinstance(result, Exception):
+                # Assume it is still there rather than risk sending it twice
+                print(f"Error looking up transaction {tx_hash}: {result}")
+            known.add(tx_hash)
+        return known
+
+    def describe(self, kind, receipt):
+        """What a confirmed transaction did, e.g. the on-chain id of a created post."""
+        result = {'tx_hash': Web3.to_hex(receipt['transactionHash']), 'block_number': receipt['blockNumber']}
+        if kind == 'create_post':
+            events = self.media_guard_contract.events.PostCreated().process_receipt(receipt, errors=DISCARD)
+            if events:
+                result['post_id'] = events[0]['args']['postId']
+        elif kind == 'anchor_batch':
+            events = self.media_guard_contract.events.PostBatchAnchored().process_receipt(receipt, errors=DISCARD)
+            if events:
+                result['batch_id'] = events[0]['args']['batchId']
+        return result
+
+# MediaGuard events the chain indexer mirrors into the database
+INDEXED_EVENTS = ('PostCreated', 'PostBlocked', 'ContentReported', 'UserBlocked',
+                  'UserUnblocked', 'UnblockRequested', 'RewardPaid')
+
+class EventReader:
+    """Reads MediaGuard's events and block headers for the chain indexer.
+
+    ``events`` fetches every indexed event in a block range with one
+    eth_getLogs request, splitting the range if the node refuses to return
+    that many logs at once.
+    """
+
+    def __init__(self, provider_url=PROVIDER_URL):
+        self.w3 = Web3(Web3.HTTPProvider(provider_url))
+        try:
+            self.w3.eth.get_block('latest')
+        except Exception:
+            raise Exception("Could not connect to Ganache. Please make sure Ganache is running.")
+        _, (media_guard_abi, media_guard_address) = load_contracts()
+        self.media_guard_contract = self.w3.eth.contract(address=media_guard_address, abi=media_guard_abi)
+        self._events = {}
+        for name in INDEXED_EVENTS:
+            event = self.media_guard_contract.events[name]()
+            self._events[event.topic] = event
+
+    def head(self):
+        return self.w3.eth.block_number
+
+    def blocks(self, numbers):
+        """{number: {'hash', 'timestamp'}} of the blocks that exist, from one batch request."""
+        numbers = sorted(numbers)
+        batch = ReadBatch(self.w3)
+        for number in numbers:
+            batch.block(number)
+        return {number: block for number, block in zip(numbers, batch.execute()) if block}
 
-# Initialize the blockchain manager
-try:
-    blockchain = BlockchainManager()
-except Exception as e:
-    print(f"Failed to initialize blockchain manager: {str(e)}")
-    blockchain = None 
\ No newline at end of file
+    def events(self, from_block, to_block):
+        """Indexed events mined in ``from_block``..``to_block``, in chain order."""
+        try:
+            logs = self.w3.eth.get_logs({
+                'address': self.media_guard_contract.address,
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'topics': [list(self._events)]
+            })
+        except Exception as e:
+            if from_block == to_block:
+                raise
+            # Nodes cap the logs one request returns; read each half separately
+            print(f"Splitting event read of blocks {from_block}-{to_block}: {e}")
+            middle = (from_block + to_block) // 2
+            return self.events(from_block, middle) + self.events(middle + 1, to_block)
+        events = []
+        for log in logs:
+            event = self._events.get(Web3.to_hex(log['topics'][0]))
+            if event is None:
+                continue
+            decoded = event.process_log(log)
+            events.append({
+                'event': decoded['event'],
+                'args': dict(decoded['args']),
+                'block_number': log['blockNumber'],
+                'block_hash': Web3.to_hex(log['blockHash']),
+                'log_index': log['logIndex'],
+                'tx_hash': Web3.to_hex(log['transactionHash'])
+            })
+        events.sort(key=lambda event: (event['block_number'], event['log_index']))
+        return events
+
+def post_leaf(author, content_hash, vulgarity_score):
+    """Merkle leaf committing to one post, as ``MediaGuard.postLeaf`` computes it."""
+    encoded = encode(['address', 'string', 'uint256'], [to_canonical_address(author), content_hash, vulgarity_score])
+    return keccak(keccak(encoded))
+
+def _hash_pair(a, b):
+    # Sorted like OpenZeppelin's MerkleProof, so proofs don't need left/right flags
+    return keccak(a + b) if a < b else keccak(b + a)
+
+def merkle_layers(leaves):
+    """Every layer of the Merkle tree over ``leaves``, ending with the root's.
+
+    A node without a sibling is carried up to the next layer unchanged.
+    """
+    layers = [list(leaves)]
+    while len(layers[-1]) > 1:
+        layer = layers[-1]
+        layers.append([_hash_pair(layer[i], layer[i + 1]) if i + 1 < len(layer) else layer[i]
+                       for i in range(0, len(layer), 2)])
+    return layers
+
+def merkle_proof(layers, index):
+    """Sibling hashes from leaf ``index`` up to the root."""
+    proof = []
+    for layer in layers[:-1]:
+        if index ^ 1 < len(layer):
+            proof.append(layer[index ^ 1])
+        index //= 2
+    return proof
+
+def verify_merkle_proof(leaf, proof, root):
+    node = leaf
+    for sibling in proof:
+        node = _hash_pair(node, sibling)
+    return node == root
+
+def verify_post_proof(author, content_hash, vulgarity_score, proof, root):
+    """Check a post's inclusion under ``root``, given as hex strings like ``build_batch`` returns them."""
+    return verify_merkle_proof(
+        post_leaf(author, content_hash, vulgarity_score),
+        [Web3.to_bytes(hexstr=node) for node in proof],
+        Web3.to_bytes(hexstr=root)
+    )
+
+def build_batch(posts):
+    """Merkle root over (post_id, author, content_hash, vulgarity_score) tuples.
+
+    Returns (root, entries) with hex strings; each entry holds what a client
+    needs to check the post's inclusion against the anchored root.
+    """
+    leaves = [post_leaf(author, content_hash, score) for _, author, content_hash, score in posts]
+    layers = merkle_layers(leaves)
+    entries = [{
+        'post_id': post_id,
+        'author': author,
+        'content_hash': content_hash,
+        'vulgarity_score': score,
+        'leaf': Web3.to_hex(leaves[index]),
+        'proof': [Web3.to_hex(node) for node in merkle_proof(layers, index)]
+    } for index, (post_id, author, content_hash, score) in enumerate(posts)]
+    return Web3.to_hex(layers[-1][0]), entries
+
+class PostBatcher:
+    """Collect posts and anchor them on chain together under one Merkle root.
+
+    A batch is cut when it holds ``max_items`` posts or ``max_seconds`` after
+    its first post arrived, whichever comes first, and handed to
+    ``on_batch(root, entries)`` (see ``build_batch``) on a thread of its own;
+    it is expected to store the proofs and send the root with
+    ``anchorPostBatch``. Posts waiting for a batch are only kept in memory.
+    """
+
+    def __init__(self, on_batch, max_items=256, max_seconds=30):
+        self.on_batch = on_batch
+        self.max_items = max_items
+        self.max_seconds = max_seconds
+        self._posts = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, post_id, author, content_hash, vulgarity_score):
+        with self._lock:
+            self._posts.append((post_id, author, content_hash, vulgarity_score))
+            full = len(self._posts) >= self.max_items
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.max_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            # Cut off the caller's thread, which may be holding a database session
+            threading.Thread(target=self.flush, daemon=True).start()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._posts)
+
+    def flush(self):
+        """Cut a batch from the posts collected so far, if any."""
+        with self._lock:
+            posts, self._posts = self._posts, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not posts:
+            return
+        try:
+            root, entries = build_batch(posts)
+            self.on_batch(root, entries)
+        except Exception as e:
+            print(f"Error anchoring batch of {len(posts)} posts: {e}")
+
+RETRY_SECONDS = 30
+
+_blockchain = None
+_last_attempt = None
+_lock = threading.Lock()
+
+def get_blockchain():
+    """Return the shared blockchain manager, connecting on first use.
+
+    Returns None while Ganache is unreachable; the connection is retried at
+    most every ``RETRY_SECONDS`` so a node that is down doesn't stall every
+    request that touches the chain.
+    """
+    global _blockchain, _last_attempt
+    if _blockchain is not None:
+        return _blockchain
+    with _lock:
+        if _blockchain is None and (_last_attempt is None or time.monotonic() - _last_attempt >= RETRY_SECONDS):
+            _last_attempt = time.monotonic()
+            try:
+                _blockchain = BlockchainManager()
+            except Exception as e:
+                print(f"Failed to initialize blockchain manager: {str(e)}")
+        return _blockchain
@@ -0,0 +1,165 @@
+import threading
+from concurrent.futures import Future
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image, ImageOps
+
+class LowResolutionEncoder:
+    """Run a CLIP vision tower on a downscaled input.
+
+    CLIP's position embeddings are interpolated once to a smaller patch grid,
+    so a 128px image is 16 patches for ViT-B/32 instead of 49 at 224px and the
+    transformer does roughly a third of the work. Features land in the same
+    embedding space as the full model, so the cached prompt embeddings score
+    them directly. Instances are batch functions for BatchingInferenceServer.
+    """
+
+    def __init__(self, model, processor, size=128):
+        self.model = model
+        self.vision = model.vision_model
+        patch_size = model.config.vision_config.patch_size
+        self.size = max(patch_size, size - size % patch_size)
+        image_processor = getattr(processor, 'image_processor', None) or processor.feature_extractor
+        self.mean = torch.tensor(image_processor.image_mean).view(1, 3, 1, 1)
+        self.std = torch.tensor(image_processor.image_std).view(1, 3, 1, 1)
+        self.position_embeddings = self._interpolate_positions(self.size // patch_size)
+
+    def _interpolate_positions(self, grid):
+        weight = self.vision.embeddings.position_embedding.weight.detach()
+        class_position, patch_positions = weight[:1], weight[1:]
+        source_grid = int(patch_positions.shape[0] ** 0.5)
+        if grid == source_grid:
+            return weight.unsqueeze(0)
+        patch_positions = patch_positions.reshape(1, source_grid, source_grid, -1).permute(0, 3, 1, 2)
+        patch_positions = F.interpolate(patch_positions, size=(grid, grid), mode='bicubic', align_corners=False)
+        patch_positions = patch_positions.permute(0, 2, 3, 1).reshape(grid * grid, -1)
+        return torch.cat([class_position, patch_positions]).unsqueeze(0)
+
+    def preprocess(self, images):
+        """Center-crop, resize and normalize RGB images into a pixel batch."""
+        arrays = [np.asarray(ImageOps.fit(image.convert('RGB'), (self.size, self.size), Image.BICUBIC),
+                             dtype=np.float32) for image in images]
+        pixels = torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2) / 255.0
+        return (pixels - self.mean) / self.std
+
+    def __call__(self, images):
+        pixel_values = self.preprocess(images)
+        embeddings = self.vision.embeddings
+        with torch.inference_mode():
+            patches = embeddings.patch_embedding(pixel_values.to(embeddings.patch_embedding.weight.dtype))
+            patches = patches.flatten(2).transpose(1, 2)
+            class_embeds = embeddings.class_embedding.expand(patches.shape[0], 1, -1)
+            hidden = torch.cat([class_embeds, patches], dim=1) + self.position_embeddings
+            hidden = self.vision.pre_layrnorm(hidden)
+            hidden = self.vision.encoder(inputs_embeds=hidden)[0]
+            pooled = self.vision.post_layernorm(hidden[:, 0, :])
+            image_features = self.model.visual_projection(pooled)
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        return list(image_features)
+
+class CascadeTier:
+    """One stage of a moderation cascade.
+
+    ``server`` turns an image into features. A score below ``safe_below`` or
+    at least ``unsafe_from`` is confident enough to be final; anything in
+    between escalates to the next tier. The last tier decides everything.
+    """
+
+    def __init__(self, name, server, safe_below=None, unsafe_from=None):
+        self.name = name
+        self.server = server
+        self.safe_below = safe_below
+        self.unsafe_from = unsafe_from
+
+    def outcome(self, score):
+        if self.safe_below is None and self.unsafe_from is None:
+            return 'decided'
+        if self.safe_below is not None and score < self.safe_below:
+            return 'confident_safe'
+        if self.unsafe_from is not None and score >= self.unsafe_from:
+            return 'confident_unsafe'
+        return 'escalated'
+
+class ModerationCascade:
+    """Score images with cheap tiers first and escalate only uncertain ones.
+
+    ``score_features`` maps one feature vector to a vulgarity score. Each tier
+    batches through its own server, so concurrent uploads still share forward
+    passes at every stage. Results are (score, tier name, features) futures,
+    with the features of the tier that decided.
+    """
+
+    OUTCOMES = ('confident_safe', 'confident_unsafe', 'escalated', 'decided', 'errors')
+
+    def __init__(self, tiers, score_features):
+        self.tiers = list(tiers)
+        self.score_features = score_features
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._stats = {tier.name: dict.fromkeys(('scored',) + self.OUTCOMES, 0) for tier in self.tiers}
+
+    def submit(self, image):
+        """Queue one RGB image and return a Future for (score, tier name, features)."""
+        result = Future()
+        with self._lock:
+            self._requests += 1
+        self._submit_tier(0, image, result)
+        return result
+
+    def score(self, image, timeout=None):
+        return self.submit(image).result(timeout=timeout)
+
+    def _submit_tier(self, index, image, result):
+        future = self.tiers[index].server.submit(image)
+        future.add_done_callback(lambda done: self._tier_done(index, image, result, done))
+
+    def _tier_done(self, index, image, result, future):
+        tier = self.tiers[index]
+        is_last = index == len(self.tiers) - 1
+        try:
+            features = future.result()
+            score = self.score_features(features)
+        except Exception as e:
+            self._count(tier.name, 'errors')
+            if is_last:
+                result.set_exception(e)
+            else:
+                # A failing cheap tier should cost compute, not verdicts
+                self._submit_tier(index + 1, image, result)
+            return
+
+        outcome = 'decided' if is_last else tier.outcome(score)
+        self._count(tier.name, outcome)
+        if outcome == 'escalated':
+            self._submit_tier(index + 1, image, result)
+        else:
+            result.set_result((score, tier.name, features))
+
+    def _count(self, tier_name, outcome):
+        with self._lock:
+            stats = self._stats[tier_name]
+            stats['scored'] += 1
+            stats[outcome] += 1
+
+    def metrics(self):
+        """Per-tier counters and hit rates, plus the share of items that reached the last tier."""
+        with self._lock:
+            requests = self._requests
+            stats = {name: dict(counts) for name, counts in self._stats.items()}
+        tiers = []
+        for tier in self.tiers:
+            counts = stats[tier.name]
+            final = counts['confident_safe'] + counts['confident_unsafe'] + counts['decided']
+            counts['name'] = tier.name
+            counts['safe_below'] = tier.safe_below
+            counts['unsafe_from'] = tier.unsafe_from
+            counts['hit_rate'] = final / counts['scored'] if counts['scored'] else 0.0
+            counts['avg_batch_time_ms'] = tier.server.metrics()['avg_batch_time_ms']
+            tiers.append(counts)
+        reached_last = tiers[-1]['scored'] if tiers else 0
+        return {
+            'requests': requests,
+            'tiers': tiers,
+            'escalation_rate': reached_last / requests if requests else 0.0
+        }
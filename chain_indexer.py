@@ -0,0 +1,108 @@
+import threading
+import time
+
+# Seconds between connection attempts while the node is unreachable
+CONNECT_RETRY_SECONDS = 30
+
+class ChainIndexer:
+    """Follows MediaGuard's events from a background thread so reads can come
+    from the database instead of live contract calls.
+
+    Each round reads up to ``chunk_size`` blocks of events past the
+    checkpoint with one eth_getLogs request and hands them to
+    ``on_events(events, blocks)``, which stores them together with the hashes
+    of the blocks read (``blocks`` is ``[(number, hash)]``, the last block of
+    the range included). ``load_blocks()`` returns those stored hashes, newest
+    first. When the newest no longer matches the chain, the blocks after the
+    last one that still does were replaced by a reorg:
+    ``on_reorg(block_number)`` drops everything indexed after that block and
+    indexing continues from there. Blocks less than ``confirmations`` deep
+    are not read at all.
+    """
+
+    def __init__(self, load_blocks, on_events, on_reorg, provider_url=None, start_block=0,
+                 confirmations=0, chunk_size=2000, poll_interval=2.0):
+        self.load_blocks = load_blocks
+        self.on_events = on_events
+        self.on_reorg = on_reorg
+        self.provider_url = provider_url
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the indexer thread if not already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name='chain-indexer', daemon=True)
+            self._thread.start()
+
+    def _open_reader(self):
+        # web3 is only imported by processes that index
+        from blockchain import EventReader, PROVIDER_URL
+        return EventReader(self.provider_url or PROVIDER_URL)
+
+    def run(self, until_synced=False):
+        """Index until stopped, or with ``until_synced`` until the chain head is reached."""
+        reader = None
+        while True:
+            if reader is None:
+                try:
+                    reader = self._open_reader()
+                except Exception as e:
+                    print(f"Chain indexer could not reach the blockchain: {e}")
+                    if until_synced:
+                        raise
+                    time.sleep(CONNECT_RETRY_SECONDS)
+                    continue
+            try:
+                read = self.sync(reader)
+            except Exception as e:
+                print(f"Error in chain indexer: {e}")
+                if until_synced:
+                    raise
+                read = 0
+            if not read:
+                if until_synced:
+                    return
+                time.sleep(self.poll_interval)
+
+    def sync(self, reader):
+        """Index the next chunk of blocks; returns how many were read, 0 once caught up."""
+        next_block = self._resume_from(reader)
+        head = reader.head() - self.confirmations
+        if next_block > head:
+            return 0
+        last_block = min(head, next_block + self.chunk_size - 1)
+        events = reader.events(next_block, last_block)
+        blocks = reader.blocks({event['block_number'] for event in events} | {last_block})
+        if any(blocks.get(event['block_number'], {}).get('hash') != event['block_hash'] for event in events):
+            # A block was replaced while the range was read; read it again next round
+            return 0
+        for event in events:
+            event['timestamp'] = blocks[event['block_number']]['timestamp']
+        self.on_events(events, [(number, block['hash']) for number, block in sorted(blocks.items())])
+        return last_block - next_block + 1
+
+    def _resume_from(self, reader):
+        """First block to read, after undoing what a reorg replaced."""
+        known = self.load_blocks()
+        if not known:
+            return self.start_block
+        newest, newest_hash = known[0]
+        if reader.blocks([newest]).get(newest, {}).get('hash') == newest_hash:
+            return newest + 1
+        # Keep everything up to the newest stored block the chain still has
+        current = reader.blocks([number for number, _ in known])
+        for number, block_hash in known:
+            if current.get(number, {}).get('hash') == block_hash:
+                break
+        else:
+            number = self.start_block - 1
+        print(f"Chain reorganized after block {number}; re-indexing from there")
+        self.on_reorg(number)
+        return number + 1
@@ -1,18 +1,34 @@
 import torch
-from transformers import CLIPProcessor, CLIPModel
 from PIL import Image
 import numpy as np
 from typing import Tuple, Optional
+from prompt_store import PromptEmbeddingStore
+from model_registry import registry, clip
+from moderation_policy import content_category, is_safe
 
-# Initialize CLIP model
-try:
-    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    model.eval()
-except Exception as e:
-    print(f"Error loading CLIP model: {e}")
-    model = None
-    processor = None
+# Text prompts for different categories
+INAPPROPRIATE_PROMPTS = [
+    "inappropriate content", "explicit content", "adult content",
+    "violence", "graphic content", "disturbing content"
+]
+SAFE_PROMPTS = [
+    "safe content", "family friendly", "appropriate content",
+    "wholesome content", "child friendly", "clean content"
+]
+
+# CLIP model, shared with the moderation pipeline through the model registry
+MODEL_NAME = "openai/clip-vit-base-patch32"
+
+def load_models():
+    loaded = clip(MODEL_NAME)
+    if loaded is None:
+        raise RuntimeError(f"CLIP model {MODEL_NAME} is not available")
+    model, processor = loaded
+    prompt_store = PromptEmbeddingStore(model, processor, MODEL_NAME)
+    prompt_store.warm(INAPPROPRIATE_PROMPTS, SAFE_PROMPTS)
+    return model, processor, prompt_store
+
+registry.register('content-analyzer', load_models)
 
 def calculate_vulgarity_score(image_features, text_features, inappropriate_features, safe_features):
     """Calculate a numerical vulgarity score between 0.0 and 1.0."""
@@ -46,54 +62,32 @@ def analyze_content(image: Image.Image) -> Tuple[float, str, bool]:
         - bool: Whether the content is safe
     """
     try:
-        if model is None or processor is None:
+        loaded = registry.get('content-analyzer')
+        if loaded is None:
             print("CLIP model not loaded, returning safe defaults")
             return 0.0, 'safe', True
+        model, processor, prompt_store = loaded
             
         # Convert image to RGB if needed
         if image.mode != 'RGB':
             image = image.convert('RGB')
         
-        # Define text prompts for different categories
-        inappropriate_prompts = [
-            "inappropriate content", "explicit content", "adult content",
-            "violence", "graphic content", "disturbing content"
-        ]
-        safe_prompts = [
-            "safe content", "family friendly", "appropriate content",
-            "wholesome content", "child friendly", "clean content"
-        ]
-        
         # Process image
         inputs = processor(images=image, return_tensors="pt", padding=True)
-        image_features = model.get_image_features(**inputs)
+        with torch.inference_mode():
+            image_features = model.get_image_features(**inputs)
         
-        # Process text prompts
-        inappropriate_text = processor(text=inappropriate_prompts, return_tensors="pt", padding=True)
-        safe_text = processor(text=safe_prompts, return_tensors="pt", padding=True)
-        
-        inappropriate_features = model.get_text_features(**inappropriate_text)
-        safe_features = model.get_text_features(**safe_text)
+        # Text prompt embeddings are cached by the prompt store
+        inappropriate_features = prompt_store.get(INAPPROPRIATE_PROMPTS)
+        safe_features = prompt_store.get(SAFE_PROMPTS)
         
         # Calculate vulgarity score
         vulgarity_score = calculate_vulgarity_score(
             image_features, None, inappropriate_features, safe_features
         )
         
-        # Determine category based on score
-        if vulgarity_score < 0.3:
-            content_category = 'safe'
-        elif vulgarity_score < 0.5:
-            content_category = 'mild'
-        elif vulgarity_score < 0.7:
-            content_category = 'moderate'
-        else:
-            content_category = 'explicit'
-        
-        # Determine if content is safe
-        is_safe = vulgarity_score < 0.5
-        
-        return vulgarity_score, content_category, is_safe
+        # Same categories and threshold as the moderation pipeline
+        return vulgarity_score, content_category(vulgarity_score), is_safe(vulgarity_score)
         
     except Exception as e:
         print(f"Error analyzing content: {str(e)}")
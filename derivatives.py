@@ -0,0 +1,66 @@
+import os
+import tempfile
+from PIL import Image, features
+from media_store import derived_key
+
+DERIVATIVE_WIDTHS = (320, 640, 1080)
+# JPEG comes last so it is the <img> fallback for browsers without WebP/AVIF
+DERIVATIVE_FORMATS = tuple(fmt for fmt, supported in (
+    ('avif', features.check('avif')),
+    ('webp', features.check('webp')),
+    ('jpg', True)
+) if supported)
+SAVE_OPTIONS = {
+    'avif': ('AVIF', {'quality': 60}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})
+}
+
+def derivative_key(key, width, fmt):
+    """Storage key of one resized copy, e.g. ``ab/cd/abcd..../w640.webp``."""
+    return derived_key(key, f"w{width}.{fmt}")
+
+def open_for_width(path, max_width):
+    """Open an image and decode it no larger than needed for ``max_width``.
+
+    For JPEGs, ``draft()`` lets libjpeg decode at 1/2, 1/4 or 1/8 scale
+    directly, so a 4000px upload is never fully decoded just to make 1080px
+    and smaller copies.
+    """
+    img = Image.open(path)
+    width, height = img.size
+    if width > max_width:
+        img.draft('RGB', (max_width, max(1, height * max_width // width)))
+    return img
+
+def generate_image_derivatives(source_path, output_dir, widths=DERIVATIVE_WIDTHS, formats=DERIVATIVE_FORMATS):
+    """Write resized copies of an image in each format.
+
+    Widths larger than the source are replaced by the source width, so small
+    uploads are never upscaled. Runs in a worker process and returns a plain
+    dict: the source size and a list of (width, format, path) for the files
+    written into ``output_dir``.
+    """
+    with Image.open(source_path) as probe:
+        original_size = probe.size
+    original_width = original_size[0]
+    targets = sorted({min(width, original_width) for width in widths}, reverse=True)
+
+    img = open_for_width(source_path, targets[0])
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    files = []
+    current = img
+    # Resize from the previous (larger) copy so each step is cheap
+    for width in targets:
+        if current.width != width:
+            height = max(1, round(current.height * width / current.width))
+            current = current.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            pil_format, options = SAVE_OPTIONS[fmt]
+            fd, path = tempfile.mkstemp(dir=output_dir, prefix='.derivative-', suffix=f'.{fmt}')
+            with os.fdopen(fd, 'wb') as f:
+                current.save(f, pil_format, **options)
+            files.append((width, fmt, path))
+    return {'width': original_size[0], 'height': original_size[1], 'files': files}
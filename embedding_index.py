@@ -0,0 +1,465 @@
+import base64
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may write to an index
+    fcntl = None
+
+SCAN_CHUNK_ROWS = 65536
+
+# New rows caught up with at once past this many are indexed in bulk
+BULK_REGISTER_ROWS = 4096
+
+def encode_embedding(vector):
+    """Pack an embedding as base64 float16 so it fits in a JSON job result."""
+    return base64.b64encode(np.asarray(vector, dtype=np.float16).tobytes()).decode('ascii')
+
+def decode_embedding(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float16).astype(np.float32)
+
+def normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """Exclusive lock across processes; yields False if ``blocking`` is off and it is held."""
+    with open(path, 'a+b') as f:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class EmbeddingIndex:
+    """Persistent approximate nearest-neighbor index of post image embeddings.
+
+    Vectors are L2-normalized and stored as float16 in a memory-mapped file
+    (1 KB per post for CLIP ViT-B/32), next to memory-mapped post ids and
+    inverted-list assignments, so opening an index of millions of posts reads
+    nothing up front and processes share the pages. Inserts append a row;
+    several processes may insert into one directory, serialized by a file
+    lock, and each picks up the others' rows on its next call.
+
+    Search is exact until ``min_train`` vectors are stored. After that an IVF
+    index is trained in the background (spherical k-means into about
+    sqrt(n) lists), new vectors are assigned to their nearest list as they
+    are inserted, and a query only scans the ``nprobe`` lists closest to it.
+    The lists are retrained whenever the index has doubled since.
+    """
+
+    def __init__(self, directory, nprobe=8, min_train=20000, initial_capacity=1024):
+        self.directory = directory
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.initial_capacity = initial_capacity
+        self.dim = None
+        self._lock = threading.RLock()
+        self._opened = False
+        self._capacity = 0
+        self._count = 0
+        self._vectors = None
+        self._ids = None
+        self._lists = None
+        self._centroids = None
+        self._centroids_version = None
+        self._trained_count = 0
+        self._list_rows = None
+        self._list_offsets = None
+        self._built_count = 0
+        self._extra = defaultdict(list)
+        self._unassigned = []
+        self._training = False
+        # Post ids of rows before _id_order_count in sorted order, built on the
+        # first lookup; rows added after it are in _rows unless _ids_stale
+        self._id_order = np.array([], dtype=np.int64)
+        self._sorted_ids = np.array([], dtype=np.int64)
+        self._id_order_count = 0
+        self._rows = {}
+        self._ids_stale = False
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    # Storage
+
+    def _open(self, dim=None):
+        """Map the index files, creating them for ``dim`` if there is no index yet."""
+        meta_path = self._path('meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.dim = json.load(f)['dim']
+        elif dim is None:
+            return False
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(meta_path, 'w') as f:
+                json.dump({'dim': dim}, f)
+            self.dim = dim
+        if not os.path.exists(self._path('ids.i64')):
+            self._resize(self.initial_capacity)
+        self._map()
+        self._opened = True
+        return True
+
+    def _map(self):
+        self._capacity = os.path.getsize(self._path('ids.i64')) // 8
+        self._vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r+',
+                                  shape=(self._capacity, self.dim))
+        self._ids = np.memmap(self._path('ids.i64'), dtype=np.int64, mode='r+', shape=(self._capacity,))
+        # Inverted list + 1 per row; 0 means not assigned to a list
+        self._lists = np.memmap(self._path('lists.i32'), dtype=np.int32, mode='r+', shape=(self._capacity,))
+
+    def _resize(self, capacity):
+        # Growing a file pads it with zeros, i.e. empty rows
+        for name, row_bytes in (('vectors.f16', self.dim * 2), ('ids.i64', 8), ('lists.i32', 4)):
+            with open(self._path(name), 'a+b') as f:
+                f.truncate(capacity * row_bytes)
+
+    def _refresh(self):
+        """Catch up with rows, growth and retraining from other processes; False if there is no index."""
+        if not self._opened and not self._open():
+            return False
+        if os.path.getsize(self._path('ids.i64')) // 8 > self._capacity:
+            self._map()
+        self._load_centroids()
+        if self._count < self._capacity and self._ids[self._count] != 0:
+            tail = np.asarray(self._ids[self._count:])
+            empty = np.flatnonzero(tail == 0)
+            end = self._count + (int(empty[0]) if len(empty) else len(tail))
+            if end - self._count > BULK_REGISTER_ROWS:
+                # E.g. opening an existing index: no per-row work until a lookup needs it
+                start, self._count = self._count, end
+                if self._centroids is not None:
+                    self._build_lists()
+                else:
+                    self._unassigned.extend(range(start, end))
+                self._ids_stale = True
+            else:
+                for row in range(self._count, end):
+                    self._register(row)
+                self._count = end
+        return True
+
+    def _register(self, row):
+        post_id = int(self._ids[row])
+        if post_id > 0:
+            self._rows[post_id] = row
+        assigned = int(self._lists[row]) - 1
+        if assigned >= 0 and self._centroids is not None:
+            self._extra[assigned].append(row)
+        else:
+            self._unassigned.append(row)
+
+    def _load_centroids(self):
+        path = self._path('centroids.npz')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._centroids_version:
+            return
+        with np.load(path) as data:
+            self._centroids = data['centroids']
+            self._trained_count = int(data['trained_count'])
+        self._centroids_version = version
+        self._build_lists()
+
+    def _build_lists(self):
+        """Group rows by inverted list; rows added afterwards are tracked separately."""
+        count = self._count
+        lists = np.asarray(self._lists[:count]) - 1
+        assigned = np.flatnonzero(lists >= 0)
+        order = np.argsort(lists[assigned], kind='stable')
+        self._list_rows = assigned[order]
+        self._list_offsets = np.searchsorted(lists[assigned][order], np.arange(len(self._centroids) + 1))
+        self._unassigned = np.flatnonzero(lists < 0).tolist()
+        self._extra = defaultdict(list)
+        self._built_count = count
+
+    def _index_ids(self):
+        """Sort the id column so a post's row is a binary search away."""
+        # Stable, so the newest of several rows for one post sorts last
+        ids = np.asarray(self._ids[:self._count])
+        self._id_order = np.argsort(ids, kind='stable')
+        self._sorted_ids = ids[self._id_order]
+        self._id_order_count = self._count
+        self._rows = {}
+        self._ids_stale = False
+
+    def _row(self, post_id):
+        if self._ids_stale:
+            self._index_ids()
+        row = self._rows.get(post_id)
+        if row is None:
+            found = np.searchsorted(self._sorted_ids, post_id, side='right') - 1
+            if found >= 0 and self._sorted_ids[found] == post_id:
+                row = int(self._id_order[found])
+        # Removed since, possibly by another process
+        return row if row is not None and self._ids[row] == post_id else None
+
+    def _nearest_list(self, vector):
+        return int(np.argmax(self._centroids @ vector))
+
+    # Public API
+
+    def add(self, post_id, vector):
+        """Store the embedding of a post, replacing any earlier one."""
+        vector = normalize(vector)
+        should_train = False
+        with self._lock:
+            with file_lock(self._lock_path()):
+                if not self._refresh():
+                    self._open(dim=len(vector))
+                if len(vector) != self.dim:
+                    raise ValueError(f"Embedding has {len(vector)} dimensions, index has {self.dim}")
+                previous = self._row(post_id)
+                if previous is not None:
+                    self._ids[previous] = -1
+                row = self._count
+                if row >= self._capacity:
+                    self._resize(max(self._capacity * 2, self.initial_capacity))
+                    self._map()
+                self._vectors[row] = vector
+                self._lists[row] = self._nearest_list(vector) + 1 if self._centroids is not None else 0
+                # Written last: a row is visible to other processes once it has an id
+                self._ids[row] = post_id
+                for array in (self._vectors, self._lists, self._ids):
+                    array.flush()
+                self._count += 1
+                self._register(row)
+            if (not self._training and self._count >= self.min_train
+                    and (self._centroids is None or self._count >= 2 * self._trained_count)):
+                self._training = should_train = True
+        if should_train:
+            threading.Thread(target=self._train_in_background, name='embedding-index-train', daemon=True).start()
+
+    def _lock_path(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return self._path('.lock')
+
+    def remove(self, post_id):
+        """Drop a post from search results."""
+        with self._lock:
+            if not self._refresh():
+                return
+            with file_lock(self._path('.lock')):
+                row = self._row(post_id)
+                if row is not None:
+                    self._ids[row] = -1
+                    self._ids.flush()
+                    self._rows.pop(post_id, None)
+
+    def get(self, post_id):
+        """The stored embedding of a post as float32, or None."""
+        with self._lock:
+            if not self._refresh():
+                return None
+            row = self._row(post_id)
+            return None if row is None else self._vectors[row].astype(np.float32)
+
+    def get_many(self, post_ids):
+        """Stored embeddings for many posts at once: (found post ids, float32 matrix).
+
+        Posts without an embedding are left out. Looks ids up in a sorted copy
+        of the id column, so a batch costs a binary search per id rather than
+        a scan of the index.
+        """
+        wanted = np.asarray(post_ids, dtype=np.int64)
+        with self._lock:
+            if not self._refresh() or not self._count or not len(wanted):
+                return [], np.zeros((0, self.dim or 0), dtype=np.float32)
+            if self._id_order_count != self._count:
+                self._index_ids()
+            order, sorted_ids, ids, vectors = self._id_order, self._sorted_ids, self._ids, self._vectors
+        rows = order[(np.searchsorted(sorted_ids, wanted, side='right') - 1).clip(0)]
+        # Also drops rows removed since the order was built; their id is -1 now
+        found = np.asarray(ids[rows]) == wanted
+        rows = rows[found]
+        return wanted[found].tolist(), vectors[rows].astype(np.float32)
+
+    def search(self, vector, k=10):
+        """Return up to ``k`` (post id, cosine similarity) pairs, most similar first."""
+        query = normalize(vector)
+        with self._lock:
+            if not self._refresh():
+                return []
+            vectors, ids, count = self._vectors, self._ids, self._count
+            if self._centroids is None:
+                candidates = None
+            else:
+                nprobe = min(self.nprobe, len(self._centroids))
+                probes = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+                parts = [self._list_rows[self._list_offsets[p]:self._list_offsets[p + 1]] for p in probes]
+                parts.extend(np.array(self._extra[p], dtype=np.int64) for p in probes if self._extra[p])
+                parts.append(np.array(self._unassigned, dtype=np.int64))
+                candidates = np.sort(np.concatenate(parts))
+
+        if candidates is None:
+            # Exact scan, a chunk at a time so float32 copies stay small
+            rows, scores = [], []
+            for start in range(0, count, SCAN_CHUNK_ROWS):
+                chunk = np.arange(start, min(start + SCAN_CHUNK_ROWS, count))
+                chunk_scores = vectors[start:start + len(chunk)].astype(np.float32) @ query
+                top = np.argpartition(-chunk_scores, min(k, len(chunk)) - 1)[:k]
+                rows.append(chunk[top])
+                scores.append(chunk_scores[top])
+            rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+            scores = np.concatenate(scores) if scores else np.array([], dtype=np.float32)
+        else:
+            rows = candidates
+            scores = vectors[rows].astype(np.float32) @ query
+
+        post_ids = np.asarray(ids[rows]) if len(rows) else np.array([], dtype=np.int64)
+        live = post_ids > 0
+        post_ids, scores = post_ids[live], scores[live]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            post_ids, scores = post_ids[top], scores[top]
+        order = np.argsort(-scores)
+        return [(int(post_ids[i]), float(scores[i])) for i in order]
+
+    # Training
+
+    def _train_in_background(self):
+        try:
+            self.train()
+        except Exception as e:
+            print(f"Error training embedding index: {e}")
+        finally:
+            self._training = False
+
+    def train(self, nlist=None, iterations=10, sample_size=None, seed=0):
+        """(Re)build the inverted lists from the stored vectors.
+
+        Runs without blocking inserts or searches; only assigning the rows
+        inserted meanwhile and publishing the new centroids hold the lock.
+        Returns the number of lists, or 0 if another process is training.
+        """
+        with self._lock:
+            if not self._refresh():
+                return 0
+            vectors, ids, lists, count = self._vectors, self._ids, self._lists, self._count
+        with file_lock(self._path('.train.lock'), blocking=False) as acquired:
+            if not acquired:
+                return 0
+            live = np.flatnonzero(np.asarray(ids[:count]) > 0)
+            if not len(live):
+                return 0
+            nlist = min(nlist or max(1, int(np.sqrt(len(live)))), len(live))
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(live, min(len(live), sample_size or nlist * 64), replace=False))
+            data = vectors[sample].astype(np.float32)
+            centroids = data[rng.choice(len(data), nlist, replace=False)]
+            for _ in range(iterations):
+                assignments = self._assign(data, centroids)
+                order = np.argsort(assignments, kind='stable')
+                groups, starts = np.unique(assignments[order], return_index=True)
+                sums = np.add.reduceat(data[order], starts)
+                # Lists that lost all their points keep their old centroid
+                centroids[groups] = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+            for start in range(0, count, SCAN_CHUNK_ROWS):
+                end = min(start + SCAN_CHUNK_ROWS, count)
+                lists[start:end] = self._assign(vectors[start:end].astype(np.float32), centroids) + 1
+            lists.flush()
+
+            with self._lock, file_lock(self._path('.lock')):
+                self._refresh()
+                # Rows inserted while training were assigned to the old lists
+                for start in range(count, self._count, SCAN_CHUNK_ROWS):
+                    end = min(start + SCAN_CHUNK_ROWS, self._count)
+                    self._lists[start:end] = self._assign(self._vectors[start:end].astype(np.float32), centroids) + 1
+                self._lists.flush()
+                tmp_path = self._path(f'centroids.{os.getpid()}.tmp')
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, centroids=centroids, trained_count=len(live))
+                os.replace(tmp_path, self._path('centroids.npz'))
+                self._load_centroids()
+        print(f"Trained embedding index: {nlist} lists over {len(live)} vectors")
+        return nlist
+
+    @staticmethod
+    def _assign(data, centroids):
+        return np.concatenate([
+            np.argmax(data[start:start + SCAN_CHUNK_ROWS] @ centroids.T, axis=1)
+            for start in range(0, len(data), SCAN_CHUNK_ROWS)
+        ]).astype(np.int32) if len(data) else np.array([], dtype=np.int32)
+
+    def stats(self):
+        with self._lock:
+            if not self._refresh():
+                return {'vectors': 0, 'lists': 0}
+            return {
+                'vectors': int(np.count_nonzero(np.asarray(self._ids[:self._count]) > 0)),
+                'dim': self.dim,
+                'lists': 0 if self._centroids is None else len(self._centroids),
+                'trained_on': self._trained_count,
+                'nprobe': self.nprobe,
+                'bytes': self._capacity * self.dim * 2
+            }
+
+class TieredEmbeddingIndex:
+    """One ``EmbeddingIndex`` per moderation cascade tier.
+
+    Features from the low-resolution prefilter and from the full model are
+    different embedding spaces, so each post's embedding is kept in the
+    index of the tier that computed it and only searched against that
+    index. The full model's index lives in ``directory`` itself, the other
+    tiers' in subdirectories named after them. A post is in one index at a
+    time: adding it to one tier removes it from the others.
+    """
+
+    def __init__(self, directory, tiers=('full', 'prefilter'), **options):
+        self.indexes = {
+            tier: EmbeddingIndex(directory if tier == 'full' else os.path.join(directory, tier), **options)
+            for tier in tiers
+        }
+
+    def index(self, tier):
+        return self.indexes[tier]
+
+    def add(self, post_id, vector, tier='full'):
+        """Store the embedding a post's ``tier`` computed, replacing any earlier one."""
+        self.indexes[tier].add(post_id, vector)
+        for other, index in self.indexes.items():
+            if other != tier:
+                index.remove(post_id)
+
+    def get(self, post_id):
+        """(tier, float32 embedding) of a post, or (None, None)."""
+        for tier, index in self.indexes.items():
+            vector = index.get(post_id)
+            if vector is not None:
+                return tier, vector
+        return None, None
+
+    def remove(self, post_id):
+        for index in self.indexes.values():
+            index.remove(post_id)
+
+    def search(self, vector, tier, k=10):
+        """Posts most similar to ``vector``, among those embedded by the same tier."""
+        return self.indexes[tier].search(vector, k)
+
+    def train(self):
+        """Rebuild every tier's inverted lists; returns {tier: number of lists}."""
+        return {tier: index.train() for tier, index in self.indexes.items()}
+
+    def stats(self):
+        return {tier: index.stats() for tier, index in self.indexes.items()}
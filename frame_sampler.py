@@ -0,0 +1,202 @@
+import bisect
+import queue
+import re
+import subprocess
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+from moviepy.config import get_setting
+
+# Frames are downscaled before leaving the sampler; CLIP only needs 224px
+MAX_FRAME_SIZE = 448
+CANDIDATES_PER_SLOT = 4
+PTS_TIME = re.compile(rb'pts_time:\s*(-?[\d.]+)')
+OUTPUT_SIZE = re.compile(rb'Video: rawvideo.*?, (\d+)x(\d+)[ ,]')
+
+def _signature(frame):
+    """Small normalized HSV histogram used to compare frames."""
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+def scene_distance(a, b):
+    """0 for identical frames, up to 1 for completely different ones."""
+    if a is None or b is None:
+        return 1.0
+    return float(cv2.compareHist(a, b, cv2.HISTCMP_BHATTACHARYYA))
+
+def _scaled_size(width, height, max_size):
+    scale = min(1.0, max_size / max(width, height))
+    return max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2)
+
+def _to_image(frame, max_size=MAX_FRAME_SIZE):
+    height, width = frame.shape[:2]
+    if max(height, width) > max_size:
+        frame = cv2.resize(frame, _scaled_size(width, height, max_size), interpolation=cv2.INTER_AREA)
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+def plan_slots(total_frames, fps, max_frames=10, interval_seconds=None):
+    """Split a clip into (start, end) frame ranges to pick one frame from each.
+
+    With ``interval_seconds`` there is one slot per interval (capped at
+    ``max_frames`` if given), otherwise the clip is split into ``max_frames``
+    equal slots. Clips with fewer frames than slots get one slot per frame.
+    """
+    if total_frames <= 0:
+        return []
+    if interval_seconds:
+        slot_count = max(1, int(total_frames / (fps * interval_seconds)))
+        if max_frames:
+            slot_count = min(slot_count, max_frames)
+    else:
+        slot_count = max_frames
+    slot_count = min(slot_count, total_frames)
+    return [(slot * total_frames // slot_count, (slot + 1) * total_frames // slot_count)
+            for slot in range(slot_count)]
+
+def _most_distinct(frames, slot_of, last_signature=None):
+    """Pick the most distinct frame per slot from a time-ordered stream.
+
+    ``frames`` yields (timestamp, BGR frame). For each slot, the frame whose
+    histogram differs most from the previously picked frame wins, so static
+    stretches don't crowd out scene changes. Only the current best candidate
+    is held in memory. Yields (slot, timestamp, frame).
+    """
+    best = None
+    current = None
+    for timestamp, frame in frames:
+        slot = slot_of(timestamp)
+        if slot is None:
+            continue
+        if slot != current and best is not None:
+            yield current, best[1], best[2]
+            last_signature = best[3]
+            best = None
+        current = slot
+        signature = _signature(frame)
+        distance = scene_distance(last_signature, signature)
+        if best is None or distance > best[0]:
+            best = (distance, timestamp, frame, signature)
+    if best is not None:
+        yield current, best[1], best[2]
+
+def _keyframes(video_path, max_size):
+    """Yield (timestamp, BGR frame) for the keyframes only.
+
+    ffmpeg is told to skip every non-key frame in the decoder, so a long clip
+    costs a handful of intra-frame decodes instead of a full decode.
+    Timestamps come from the showinfo filter on stderr. ffmpeg applies the
+    rotation metadata of phone videos itself, so frames are fitted within
+    ``max_size`` keeping their displayed aspect ratio, and the size they
+    come out at is read from ffmpeg's description of its output.
+    """
+    command = [
+        get_setting('FFMPEG_BINARY'), '-nostdin', '-loglevel', 'info',
+        '-skip_frame', 'nokey', '-i', video_path, '-an', '-sn',
+        '-vf', f'scale=min(iw\\,{max_size}):min(ih\\,{max_size}):force_original_aspect_ratio=decrease,showinfo',
+        '-vsync', 'passthrough', '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timestamps = queue.Queue()
+    sizes = queue.Queue()
+
+    def read_stderr():
+        output = False
+        for line in process.stderr:
+            match = PTS_TIME.search(line)
+            if match:
+                timestamps.put(float(match.group(1)))
+            elif line.startswith(b'Output #0'):
+                output = True
+            elif output and sizes.empty():
+                match = OUTPUT_SIZE.search(line)
+                if match:
+                    sizes.put((int(match.group(1)), int(match.group(2))))
+        # ffmpeg exited; None if it never got as far as writing frames
+        sizes.put(None)
+
+    reader = threading.Thread(target=read_stderr, daemon=True)
+    reader.start()
+    try:
+        size = sizes.get(timeout=30)
+        if size is None:
+            return
+        width, height = size
+        frame_size = width * height * 3
+        while True:
+            data = process.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            yield timestamps.get(timeout=30), np.frombuffer(data, np.uint8).reshape(height, width, 3)
+    finally:
+        process.kill()
+        process.wait()
+
+def _sequential(video, fps, slots, skip):
+    """Yield (timestamp, BGR frame) for candidate frames in one forward pass.
+
+    Frames between candidates are only grabbed, never converted, and there are
+    no seeks that would re-decode from the previous keyframe.
+    """
+    position = 0
+    for slot, (start, end) in enumerate(slots):
+        if slot in skip:
+            continue
+        step = max(1, (end - start) // CANDIDATES_PER_SLOT)
+        for index in range(start, end, step):
+            while position < index:
+                if not video.grab():
+                    return
+                position += 1
+            ok, frame = video.read()
+            if not ok:
+                return
+            position += 1
+            yield index / fps, frame
+
+def sample_frames(video_path, max_frames=10, interval_seconds=None, max_size=MAX_FRAME_SIZE, keyframes=True):
+    """Yield (timestamp, PIL image) for one visually distinct frame per time slot.
+
+    Keyframes are tried first, since they are cheap to decode and encoders
+    place them at scene cuts. If they cover fewer than half of the slots
+    (very long GOPs), the remaining slots are filled by a sequential
+    grab/skip pass. Frames are downscaled to ``max_size`` and yielded as soon
+    as their slot is decided, so callers can stream them into the scorer.
+    """
+    video = cv2.VideoCapture(video_path)
+    try:
+        if not video.isOpened():
+            return
+        fps = video.get(cv2.CAP_PROP_FPS) or 25.0
+        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        slots = plan_slots(total_frames, fps, max_frames, interval_seconds)
+        if not slots:
+            return
+        starts = [start for start, _ in slots]
+
+        def slot_of(timestamp):
+            index = int(timestamp * fps + 0.5)
+            if index < 0 or index >= total_frames:
+                return None
+            return bisect.bisect_right(starts, index) - 1
+
+        filled = set()
+        if keyframes and width and height:
+            try:
+                frames = _keyframes(video_path, max_size)
+                for slot, timestamp, frame in _most_distinct(frames, slot_of):
+                    filled.add(slot)
+                    yield timestamp, _to_image(frame, max_size)
+            except (OSError, queue.Empty) as e:
+                print(f"Keyframe sampling failed, decoding sequentially: {e}")
+            if len(filled) * 2 >= len(slots):
+                return
+
+        for _, timestamp, frame in _most_distinct(_sequential(video, fps, slots, filled), slot_of):
+            yield timestamp, _to_image(frame, max_size)
+    finally:
+        video.release()
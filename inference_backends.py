@@ -0,0 +1,133 @@
+import copy
+import inspect
+import os
+import torch
+
+DEFAULT_ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'onnx')
+
+class CLIPVisionEncoder(torch.nn.Module):
+    """CLIP's vision tower and projection as one module returning normalized features.
+
+    Exposes ``vision_model``, ``visual_projection`` and ``config`` like
+    CLIPModel, so code that drives the tower directly works on a quantized
+    copy too.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.vision_model = model.vision_model
+        self.visual_projection = model.visual_projection
+        self.config = model.config
+
+    def forward(self, pixel_values):
+        pooled = self.vision_model(pixel_values=pixel_values)[1]
+        image_features = self.visual_projection(pooled)
+        return image_features / image_features.norm(dim=-1, keepdim=True)
+
+class TorchVisionBackend:
+    """fp32 PyTorch eager under ``torch.inference_mode``.
+
+    ``module`` is the PyTorch model the features come from; the moderation
+    prefilter runs its low-resolution pass on the same weights.
+    """
+
+    name = 'torch'
+
+    def __init__(self, model, processor):
+        self.model = model
+        self.processor = processor
+        self.module = model
+
+    def pixel_values(self, images):
+        return self.processor(images=images, return_tensors="pt")['pixel_values']
+
+    def __call__(self, images):
+        with torch.inference_mode():
+            image_features = self.model.get_image_features(pixel_values=self.pixel_values(images))
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        return list(image_features)
+
+class QuantizedTorchVisionBackend(TorchVisionBackend):
+    """Vision tower with int8 dynamically quantized Linear layers.
+
+    Weights are quantized once; activations are quantized per batch, so no
+    calibration data is needed. Only a copy of the vision tower is converted,
+    the text tower used for prompt embeddings stays fp32.
+    """
+
+    name = 'int8'
+
+    def __init__(self, model, processor):
+        super().__init__(model, processor)
+        encoder = copy.deepcopy(CLIPVisionEncoder(model)).eval()
+        self.module = torch.ao.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def __call__(self, images):
+        with torch.inference_mode():
+            return list(self.module(self.pixel_values(images)))
+
+class OnnxVisionBackend(TorchVisionBackend):
+    """Vision tower exported to ONNX and run with ONNX Runtime on CPU.
+
+    The export is cached under ``cache_dir`` per model, so only the first
+    process pays for it. Requires onnxruntime (and onnx for the export).
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model, processor, model_name, cache_dir=None, threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError('onnxruntime is required for the onnx inference backend (pip install onnxruntime onnx)')
+        super().__init__(model, processor)
+        cache_dir = cache_dir or os.getenv('ONNX_CACHE_DIR', DEFAULT_ONNX_DIR)
+        self.path = os.path.join(cache_dir, f"{model_name.replace('/', '--')}-vision.onnx")
+        if not os.path.exists(self.path):
+            self.export(model, self.path)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(self.path, options, providers=['CPUExecutionProvider'])
+
+    @staticmethod
+    def export(model, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        encoder = CLIPVisionEncoder(model).eval()
+        size = model.config.vision_config.image_size
+        options = {}
+        # The TorchScript exporter needs no extra packages; newer torch defaults to dynamo
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            options['dynamo'] = False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                encoder, (torch.zeros(1, 3, size, size),), tmp_path,
+                input_names=['pixel_values'], output_names=['image_features'],
+                dynamic_axes={'pixel_values': {0: 'batch'}, 'image_features': {0: 'batch'}},
+                opset_version=17, **options
+            )
+        os.replace(tmp_path, path)
+
+    def __call__(self, images):
+        pixel_values = self.pixel_values(images).numpy()
+        image_features = self.session.run(None, {'pixel_values': pixel_values})[0]
+        return list(torch.from_numpy(image_features))
+
+BACKENDS = {
+    'torch': TorchVisionBackend,
+    'int8': QuantizedTorchVisionBackend,
+    'onnx': OnnxVisionBackend
+}
+
+def create_vision_backend(kind, model, processor, model_name, threads=None):
+    """Build the vision backend selected by ``MODERATION_BACKEND`` ('torch', 'int8' or 'onnx')."""
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {kind}")
+    if threads:
+        torch.set_num_threads(threads)
+    if kind == 'onnx':
+        return OnnxVisionBackend(model, processor, model_name, threads=threads)
+    return BACKENDS[kind](model, processor)
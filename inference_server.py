@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class BatchingInferenceServer:
+    """Dynamic micro-batching front end for a model.
+
+    Concurrent callers submit single items. A background thread takes
+    everything waiting, up to ``max_batch_size`` items, runs ``batch_fn`` once
+    on the whole batch and hands each caller its own result. Items submitted
+    while a batch runs make up the next one, so a lone item is dispatched at
+    once and batches grow with the load. With ``max_wait_ms`` the thread also
+    lingers that long for more items before dispatching a batch that isn't
+    full. ``batch_fn`` takes a list of items and returns a list of results in
+    the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=0, name='inference'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'batched_items': 0,
+            'max_queue_depth': 0,
+            'total_batch_time': 0.0,
+            'total_queue_wait': 0.0
+        }
+
+    def start(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+                self._worker.start()
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result."""
+        self.start()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+        return future
+
+    def infer(self, item, timeout=None):
+        """Run one item through the batcher and wait for its result."""
+        return self.submit(item).result(timeout=timeout)
+
+    def infer_many(self, items, timeout=None):
+        """Submit several items at once so they can share a batch."""
+        futures = [self.submit(item) for item in items]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def metrics(self):
+        """Return counters for tuning batch size against latency."""
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_wait_ms'] = self.max_wait * 1000.0
+        stats['avg_batch_size'] = stats['batched_items'] / batches if batches else 0.0
+        stats['batch_fill_ratio'] = stats['avg_batch_size'] / self.max_batch_size if batches else 0.0
+        stats['avg_batch_time_ms'] = stats['total_batch_time'] * 1000.0 / batches if batches else 0.0
+        stats['avg_queue_wait_ms'] = stats['total_queue_wait'] * 1000.0 / stats['batched_items'] if stats['batched_items'] else 0.0
+        return stats
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Take what is already waiting without blocking
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(batch):
+                    # Callers left without a result would wait forever
+                    raise ValueError(f"{self.name} returned {len(results)} results for {len(batch)} items")
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            finished = time.monotonic()
+
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['batched_items'] += len(batch)
+                self._stats['total_batch_time'] += finished - started
+                self._stats['total_queue_wait'] += sum(started - queued_at for _, _, queued_at in batch)
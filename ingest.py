@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+CHUNK_SIZE = 64 * 1024
+HEADER_SIZE = 16
+
+# ISO base media major brands of video files; others, e.g. HEIF and AVIF
+# images ('heic', 'mif1', 'avif') or audio ('M4A '), are not accepted
+VIDEO_BRANDS = {
+    b'isom', b'iso2', b'iso3', b'iso4', b'iso5', b'iso6', b'mp41', b'mp42', b'avc1',
+    b'M4V ', b'M4VH', b'M4VP', b'mmp4', b'MSNV', b'dash', b'XAVC',
+    b'3gp4', b'3gp5', b'3gp6', b'3g2a', b'qt  '
+}
+
+IngestedFile = namedtuple('IngestedFile', ['path', 'content_hash', 'size', 'extension', 'kind'])
+
+class IngestError(Exception):
+    """Raised when an upload is rejected before it reaches storage."""
+
+def sniff_type(header):
+    """Return (extension, kind) for a supported media file header, or None."""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg', 'image'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png', 'image'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif', 'image'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', 'image'
+    if header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return 'avi', 'video'
+    if header[4:8] == b'ftyp':
+        if header[8:12] not in VIDEO_BRANDS:
+            return None
+        return ('mov' if header[8:12] == b'qt  ' else 'mp4'), 'video'
+    if header[4:8] in (b'moov', b'mdat', b'wide', b'free'):
+        return 'mov', 'video'
+    if header.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'):
+        return 'wmv', 'video'
+    return None
+
+class HashingFile:
+    """Writable temp file that hashes and measures data as it is written.
+
+    Werkzeug writes each uploaded file part into this while it parses the
+    request body, so by the time the view runs the SHA-256, the size and the
+    leading magic bytes are already known without reading the file back.
+    The temp file lives in the upload folder so the media store can rename it
+    into place atomically; it is removed on close unless it was committed.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.ingest-')
+        self._file = os.fdopen(fd, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.header = b''
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise RequestEntityTooLarge()
+        if len(self.header) < HEADER_SIZE:
+            self.header += bytes(data[:HEADER_SIZE - len(self.header)])
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        return self._file.flush()
+
+    def commit(self):
+        """Close the file and keep it on disk for the media store to move into place."""
+        self._file.close()
+        self.committed = True
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+class StreamingUploadRequest(Request):
+    """Request that streams file uploads into hashing temp files in the upload folder."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(current_app.config['UPLOAD_FOLDER'], current_app.config.get('MAX_CONTENT_LENGTH'))
+
+def file_sha256(file_path, chunk_size=CHUNK_SIZE):
+    """Calculate the SHA-256 content hash of a file without loading it whole."""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def ingest_upload(file_storage, upload_dir, max_bytes=None):
+    """Finish receiving an uploaded file and describe it.
+
+    The extension comes from the file's magic bytes rather than the
+    client-supplied name. Uploads parsed by StreamingUploadRequest are already
+    hashed; any other stream is copied once in chunks. The returned path is a
+    temp file in ``upload_dir`` that the caller hands to the media store.
+    Raises IngestError for oversized or unsupported files.
+    """
+    stream = file_storage.stream
+    if not isinstance(stream, HashingFile):
+        spooled = HashingFile(upload_dir, max_bytes)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                spooled.write(chunk)
+        except RequestEntityTooLarge:
+            spooled.close()
+            raise IngestError('File is too large')
+        stream = spooled
+
+    try:
+        if max_bytes is not None and stream.size > max_bytes:
+            raise IngestError('File is too large')
+        if stream.size == 0:
+            raise IngestError('Uploaded file is empty')
+        detected = sniff_type(stream.header)
+        if detected is None:
+            raise IngestError('Unsupported file type')
+
+        extension, kind = detected
+        stream.commit()
+        return IngestedFile(stream.temp_path, stream.hexdigest(), stream.size, extension, kind)
+    finally:
+        stream.close()
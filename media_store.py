@@ -0,0 +1,145 @@
+import mimetypes
+import os
+import shutil
+from flask import url_for
+
+def blob_key(content_hash, extension):
+    """Return the sharded storage key for a blob, e.g. ``ab/cd/abcd....jpg``."""
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.{extension}"
+
+def derived_prefix(key):
+    """Prefix under which files generated from a blob are stored: the key without its extension."""
+    return os.path.splitext(key)[0]
+
+def derived_key(key, name):
+    """Key of a file generated from a blob, e.g. ``ab/cd/abcd..../poster.jpg``."""
+    return f"{derived_prefix(key)}/{name}"
+
+def is_blob_key(key):
+    # Files uploaded before the media store are flat names in the upload folder
+    return bool(key) and '/' in key
+
+class LocalMediaBackend:
+    """Stores blobs under a directory served as static files."""
+
+    def __init__(self, root, static_prefix='img/uploads'):
+        self.root = root
+        self.static_prefix = static_prefix
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, source_path, key):
+        """Move a finished file into place; identical content already stored is kept."""
+        dest = self.path(key)
+        if os.path.exists(dest):
+            os.remove(source_path)
+            return
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(source_path, dest)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def delete_prefix(self, prefix):
+        """Delete every file stored under ``prefix/``."""
+        shutil.rmtree(self.path(prefix), ignore_errors=True)
+
+    def local_path(self, key):
+        return self.path(key)
+
+    def url(self, key):
+        return url_for('static', filename=f"{self.static_prefix}/{key}")
+
+class S3MediaBackend:
+    """Stores blobs in an S3-compatible bucket (AWS S3, MinIO, LocalStack...).
+
+    Uploaded files are kept in ``cache_dir`` as well, so the moderation and
+    derivative workers on this node read them locally instead of downloading
+    them again. Requires boto3.
+    """
+
+    def __init__(self, bucket, cache_dir, endpoint_url=None, prefix='', public_url=None, url_expiry=3600):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError('boto3 is required for the s3 media backend (pip install boto3)')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.url_expiry = url_expiry
+        self.cache = LocalMediaBackend(cache_dir)
+
+    def object_key(self, key):
+        return f"{self.prefix}{key}"
+
+    def put(self, source_path, key):
+        if not self.exists(key):
+            content_type = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+            self.client.upload_file(source_path, self.bucket, self.object_key(key),
+                                    ExtraArgs={'ContentType': content_type})
+        self.cache.put(source_path, key)
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+        self.cache.delete(key)
+
+    def delete_prefix(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(prefix) + '/'):
+            objects = [{'Key': item['Key']} for item in page.get('Contents', [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects})
+        self.cache.delete_prefix(prefix)
+
+    def local_path(self, key):
+        path = self.cache.path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            self.client.download_file(self.bucket, self.object_key(key), tmp_path)
+            os.replace(tmp_path, path)
+        return path
+
+    def url(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{self.object_key(key)}"
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.object_key(key)},
+            ExpiresIn=self.url_expiry
+        )
+
+def create_media_backend(config):
+    """Build the media backend selected by ``MEDIA_BACKEND`` ('local' or 's3')."""
+    kind = config.get('MEDIA_BACKEND', 'local')
+    if kind == 'local':
+        return LocalMediaBackend(config['UPLOAD_FOLDER'])
+    if kind == 's3':
+        return S3MediaBackend(
+            config['MEDIA_S3_BUCKET'],
+            cache_dir=config['MEDIA_CACHE_DIR'],
+            endpoint_url=config.get('MEDIA_S3_ENDPOINT_URL'),
+            prefix=config.get('MEDIA_S3_PREFIX', ''),
+            public_url=config.get('MEDIA_S3_PUBLIC_URL')
+        )
+    raise ValueError(f"Unknown media backend: {kind}")
+
+def copy_to_temp(source_path, directory):
+    """Copy a file next to the store so it can be moved into place atomically."""
+    tmp_path = os.path.join(directory, f".import-{os.getpid()}-{os.path.basename(source_path)}")
+    shutil.copyfile(source_path, tmp_path)
+    return tmp_path
@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+
+def resident_memory():
+    """Current resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Peak rather than current RSS, but available on macOS (reported in bytes there)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class ModelRegistry:
+    """Load each model at most once per process.
+
+    Models are registered with a loader and built on the first ``get``, or
+    up front with ``preload`` (e.g. before a pre-forking server forks, so the
+    workers share the weights copy-on-write). A loader that fails is not
+    retried; ``get`` returns None for it, like the modules did when a model
+    could not be downloaded. Load time and the growth in resident memory are
+    recorded per model.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders.setdefault(name, loader)
+
+    def __contains__(self, name):
+        return name in self._loaders
+
+    def loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        """Return the model registered as ``name``, loading it on first use."""
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name in self._models:
+                return self._models[name]
+            loader = self._loaders[name]
+            rss_before = resident_memory()
+            started = time.perf_counter()
+            try:
+                model = loader()
+                error = None
+            except Exception as e:
+                print(f"Error loading model {name}: {e}")
+                model = None
+                error = str(e)
+            load_seconds = time.perf_counter() - started
+            rss_delta = resident_memory() - rss_before
+            self._stats[name] = {
+                'load_seconds': load_seconds,
+                'rss_delta_bytes': rss_delta,
+                'pid': os.getpid(),
+                'error': error
+            }
+            if error is None:
+                print(f"Loaded model {name} in {load_seconds:.1f}s (+{rss_delta / 2 ** 20:.0f} MB resident)")
+            self._models[name] = model
+            return model
+
+    def preload(self, *names):
+        """Load the named models (all registered ones by default) now."""
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def stats(self):
+        """Load time and resident memory growth for each model loaded in this process."""
+        with self._lock:
+            models = {name: dict(self._stats.get(name, {}), loaded=self._models.get(name) is not None)
+                      for name in self._loaders}
+        return {
+            'models': models,
+            'process_rss_bytes': resident_memory(),
+            'pid': os.getpid()
+        }
+
+registry = ModelRegistry()
+
+def load_clip(model_name):
+    from transformers import CLIPModel, CLIPProcessor
+    processor = CLIPProcessor.from_pretrained(model_name)
+    model = CLIPModel.from_pretrained(model_name)
+    model.eval()
+    return model, processor
+
+def clip(model_name):
+    """Shared (model, processor) for a CLIP checkpoint, or None if it can't be loaded."""
+    registry.register(model_name, lambda: load_clip(model_name))
+    return registry.get(model_name)
@@ -0,0 +1,351 @@
+import hashlib
+import json
+import os
+import torch
+from collections import namedtuple
+from model_registry import registry, clip
+from prompt_store import PromptEmbeddingStore
+from inference_server import BatchingInferenceServer
+from cascade import LowResolutionEncoder, CascadeTier, ModerationCascade
+from inference_backends import create_vision_backend, TorchVisionBackend
+from derivatives import open_for_width
+from ingest import file_sha256
+from frame_sampler import sample_frames
+from verdict_cache import VerdictCache, dhash
+from embedding_index import encode_embedding
+from moderation_policy import REJECT_THRESHOLD, CATEGORY_BOUNDS, content_category, is_safe
+
+# Define inappropriate content categories
+INAPPROPRIATE_CATEGORIES = [
+    "adult content", "explicit content", "nsfw", "inappropriate content",
+    "vulgar content", "offensive content", "hate speech", "violence",
+    "graphic content", "disturbing content", "sexual content",
+    "drugs and alcohol", "gore", "extreme violence"
+]
+
+# Define safe content categories
+SAFE_CATEGORIES = [
+    "family friendly", "safe content", "appropriate content",
+    "wholesome content", "general audience", "suitable for all",
+    "educational content", "artistic content", "nature content",
+    "food and cooking", "travel and adventure"
+]
+
+# CLIP model for content moderation, loaded through the shared registry on first use
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# Low-resolution prefilter and the band of scores it leaves to the full model
+CASCADE_SETTINGS = {
+    'enabled': os.getenv('MODERATION_CASCADE', '1') != '0',
+    'prefilter_size': int(os.getenv('MODERATION_PREFILTER_SIZE', '128')),
+    'safe_below': float(os.getenv('MODERATION_PREFILTER_SAFE_BELOW', '0.45')),
+    'unsafe_from': float(os.getenv('MODERATION_PREFILTER_UNSAFE_FROM', '0.75'))
+}
+
+ModerationModels = namedtuple('ModerationModels', ['model', 'processor', 'prompt_store', 'vision_backend', 'cascade'])
+
+def create_backend(model, processor):
+    """Build the vision backend picked by MODERATION_BACKEND, falling back to fp32 torch."""
+    kind = os.getenv('MODERATION_BACKEND', 'torch')
+    threads = int(os.getenv('MODERATION_INFERENCE_THREADS', '0')) or None
+    try:
+        return create_vision_backend(kind, model, processor, CLIP_MODEL_NAME, threads)
+    except Exception as e:
+        print(f"Error setting up the {kind} inference backend, using torch: {e}")
+        return TorchVisionBackend(model, processor)
+
+def encode_images(images):
+    """Run the vision tower on a list of RGB images and normalize the features."""
+    return get_models().vision_backend(images)
+
+# Concurrent analyses share vision forward passes through the batcher
+image_feature_server = BatchingInferenceServer(
+    encode_images,
+    max_batch_size=int(os.getenv('MODERATION_MAX_BATCH_SIZE', '16')),
+    max_wait_ms=float(os.getenv('MODERATION_MAX_WAIT_MS', '0')),
+    name='clip-vision'
+)
+
+def score_image_features(image_features):
+    """Vulgarity score for one normalized image feature vector."""
+    prompt_store = get_models().prompt_store
+    return calculate_vulgarity_scores(
+        image_features.unsqueeze(0),
+        prompt_store.get(INAPPROPRIATE_CATEGORIES),
+        prompt_store.get(SAFE_CATEGORIES)
+    )[0]
+
+def create_cascade(vision_backend, processor):
+    """Put a low-resolution pass of the same CLIP model in front of the full one.
+
+    Most uploads are clearly safe, so only scores inside the prefilter's
+    uncertain band pay for a full-resolution pass. ``benchmarks/cascade_eval.py``
+    picks the band for a labeled dataset. Set MODERATION_CASCADE=0 to score
+    everything at full resolution.
+    """
+    if not CASCADE_SETTINGS['enabled']:
+        return None
+    try:
+        prefilter_server = BatchingInferenceServer(
+            LowResolutionEncoder(vision_backend.module, processor, CASCADE_SETTINGS['prefilter_size']),
+            max_batch_size=int(os.getenv('MODERATION_MAX_BATCH_SIZE', '16')),
+            max_wait_ms=float(os.getenv('MODERATION_MAX_WAIT_MS', '0')),
+            name='clip-vision-prefilter'
+        )
+    except Exception as e:
+        print(f"Error setting up the moderation prefilter: {e}")
+        return None
+    return ModerationCascade([
+        CascadeTier(
+            'prefilter', prefilter_server,
+            safe_below=CASCADE_SETTINGS['safe_below'],
+            unsafe_from=CASCADE_SETTINGS['unsafe_from']
+        ),
+        CascadeTier('full', image_feature_server)
+    ], score_image_features)
+
+def load_moderation_models():
+    """Load CLIP and build everything derived from it."""
+    loaded = clip(CLIP_MODEL_NAME)
+    if loaded is None:
+        raise RuntimeError(f"CLIP model {CLIP_MODEL_NAME} is not available")
+    model, processor = loaded
+    # Encode the fixed prompt lists once instead of on every upload
+    prompt_store = PromptEmbeddingStore(model, processor, CLIP_MODEL_NAME)
+    prompt_store.warm(INAPPROPRIATE_CATEGORIES, SAFE_CATEGORIES)
+    vision_backend = create_backend(model, processor)
+    return ModerationModels(model, processor, prompt_store, vision_backend, create_cascade(vision_backend, processor))
+
+registry.register('moderation', load_moderation_models)
+
+def get_models():
+    """The moderation models for this process, loaded on first use; None if CLIP is unavailable."""
+    return registry.get('moderation')
+
+def preload_models():
+    """Load the moderation models now, e.g. in a worker initializer or before forking."""
+    get_models()
+
+def cascade_metrics():
+    """Cascade tier counters, or None if the models aren't loaded in this process."""
+    if not registry.loaded('moderation'):
+        return None
+    models = get_models()
+    return models.cascade.metrics() if models and models.cascade else None
+
+def scoring_version(**extra):
+    """Identifies the model, prompt lists and thresholds scores are computed with."""
+    payload = json.dumps(dict({
+        'model': CLIP_MODEL_NAME,
+        'inappropriate': INAPPROPRIATE_CATEGORIES,
+        'safe': SAFE_CATEGORIES,
+        'reject_threshold': REJECT_THRESHOLD,
+        'categories': CATEGORY_BOUNDS
+    }, **extra))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+# Verdicts for exact and near-duplicate re-uploads skip the model entirely.
+# They also depend on where the cascade stops and on the backend's precision.
+verdict_cache = VerdictCache(
+    os.getenv('VERDICT_CACHE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'verdict_cache.db')),
+    max_entries=int(os.getenv('VERDICT_CACHE_SIZE', '100000')),
+    max_distance=int(os.getenv('VERDICT_CACHE_MAX_DISTANCE', '4')),
+    version=scoring_version(cascade=CASCADE_SETTINGS, backend=os.getenv('MODERATION_BACKEND', 'torch'))
+)
+
+def calculate_vulgarity_score(image_features, text_features, inappropriate_features, safe_features):
+    """Calculate a numerical vulgarity score between 0.0 and 1.0."""
+    # Calculate similarity scores
+    inappropriate_scores = torch.cosine_similarity(image_features, inappropriate_features)
+    safe_scores = torch.cosine_similarity(image_features, safe_features)
+    
+    # Get maximum scores
+    max_inappropriate = torch.max(inappropriate_scores).item()
+    max_safe = torch.max(safe_scores).item()
+    
+    # Calculate score (0.0 to 1.0)
+    total = max_inappropriate + max_safe
+    if total == 0:
+        return 0.0
+    score = max_inappropriate / total
+    
+    return score
+
+def calculate_vulgarity_scores(image_features, inappropriate_features, safe_features):
+    """Calculate one vulgarity score per row of a batch of image features."""
+    image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+    max_inappropriate = (image_features @ inappropriate_features.T).max(dim=1).values
+    max_safe = (image_features @ safe_features.T).max(dim=1).values
+    
+    total = max_inappropriate + max_safe
+    scores = torch.where(total == 0, torch.zeros_like(total), max_inappropriate / total)
+    return scores.tolist()
+
+def get_content_category(score):
+    """Convert vulgarity score to content category."""
+    return content_category(score)
+
+def analyze_content(image, caption):
+    """Analyze both image and caption for inappropriate content.
+    
+    Returns (is_safe, score, category, tier, features) where ``tier`` names
+    the cascade stage that produced the score and ``features`` is the image
+    embedding it scored, both None when the model was not run.
+    """
+    models = get_models()
+    if not models:
+        return True, 0.0, "safe", None, None  # Allow content if model is not available
+    
+    try:
+        if models.cascade is not None:
+            # Clearly safe or clearly unsafe images stop at the low-resolution pass
+            score, tier, image_features = models.cascade.score(image.convert('RGB'))
+            return is_safe(score), score, get_content_category(score), tier, image_features
+        
+        # Process image (batched with any concurrent requests)
+        image_features = image_feature_server.infer(image.convert('RGB'))
+        
+        # Prompt embeddings are computed once at startup. The caption embedding
+        # does not contribute to the score, so the text tower is not run here.
+        inappropriate_features = models.prompt_store.get(INAPPROPRIATE_CATEGORIES)
+        safe_features = models.prompt_store.get(SAFE_CATEGORIES)
+        
+        # Calculate vulgarity score
+        score = calculate_vulgarity_score(image_features.unsqueeze(0), None, inappropriate_features, safe_features)
+        category = get_content_category(score)
+        
+        # Allow content if score is at or below the rejection threshold
+        return is_safe(score), score, category, 'full', image_features
+        
+    except Exception as e:
+        print(f"Error in content analysis: {e}")
+        return True, 0.0, "safe", None, None  # Allow content if analysis fails
+
+def analyze_video_frames(frames, caption):
+    """Score sampled video frames as they are decoded.
+    
+    ``frames`` may be a generator: each frame is submitted to the batching
+    server as soon as it arrives, so decoding overlaps inference and frames
+    are released once encoded instead of being collected up front.
+    Returns (is_safe, score, category, frame_scores, tier, features,
+    features_tier) where the aggregate score is the highest frame score,
+    ``tier`` is the deepest cascade stage any frame reached, ``features`` is
+    the embedding of the highest scoring frame and ``features_tier`` the
+    stage that computed it.
+    """
+    models = get_models()
+    if not models:
+        frame_scores = [0.0 for _ in frames]
+        return True, 0.0, "safe", frame_scores, None, None, None
+    
+    try:
+        if models.cascade is not None:
+            # Each frame escalates on its own; confident frames stop at the prefilter
+            futures = [models.cascade.submit(frame.convert('RGB')) for frame in frames]
+            if not futures:
+                return True, 0.0, "safe", [], None, None, None
+            results = [future.result() for future in futures]
+            frame_scores = [score for score, _, _ in results]
+            frame_features = [features for _, _, features in results]
+            frame_tiers = [tier for _, tier, _ in results]
+            tier_order = [tier.name for tier in models.cascade.tiers]
+            tier = max(frame_tiers, key=tier_order.index)
+        else:
+            futures = [image_feature_server.submit(frame.convert('RGB')) for frame in frames]
+            if not futures:
+                return True, 0.0, "safe", [], None, None, None
+            frame_features = [future.result() for future in futures]
+            
+            frame_scores = calculate_vulgarity_scores(
+                torch.stack(frame_features),
+                models.prompt_store.get(INAPPROPRIATE_CATEGORIES),
+                models.prompt_store.get(SAFE_CATEGORIES)
+            )
+            tier = 'full'
+            frame_tiers = [tier] * len(frame_scores)
+        score = max(frame_scores)
+        category = get_content_category(score)
+        worst = frame_scores.index(score)
+        return is_safe(score), score, category, frame_scores, tier, frame_features[worst], frame_tiers[worst]
+        
+    except Exception as e:
+        print(f"Error in video content analysis: {e}")
+        return True, 0.0, "safe", [], None, None, None
+
+def extract_video_frames(video_path, max_frames=10):
+    """Extract up to ``max_frames`` distinct frames from a video for analysis."""
+    try:
+        return [image for _, image in sample_frames(video_path, max_frames=max_frames)]
+    except Exception as e:
+        print(f"Error extracting video frames: {e}")
+        return []
+
+def moderate_upload(file_path, caption, is_video, content_hash=None):
+    """Run the full moderation pipeline for an uploaded file.
+    
+    This runs inside a moderation worker, so it only depends on this module and
+    returns a plain dict that can be sent back to the web process. The stored
+    file is never rewritten; ``content_hash`` is the SHA-256 computed while the
+    upload was ingested and is only recomputed when it is missing.
+    """
+    content_hash = content_hash or file_sha256(file_path)
+    if is_video:
+        perceptual_hash = None
+        cached = verdict_cache.lookup(content_hash)
+        if cached:
+            return cached_verdict(cached, content_hash)
+        
+        # Stream distinct frames from one sequential pass into the batched scorer
+        try:
+            frames = (image for _, image in sample_frames(file_path))
+            is_safe, vulgarity_score, content_category, frame_scores, tier, image_features, features_tier = \
+                analyze_video_frames(frames, caption)
+        except Exception as e:
+            print(f"Error extracting video frames: {e}")
+            frame_scores = []
+        if not frame_scores:
+            return {'error': 'Error processing video file'}
+    else:
+        # Load and downscale a copy of the image for analysis
+        try:
+            img = open_for_width(file_path, 1080)
+            img = img.convert('RGB')
+            img.thumbnail((1080, 1080))
+        except Exception as e:
+            return {'error': f'Error processing image file: {e}'}
+        
+        perceptual_hash = dhash(img)
+        cached = verdict_cache.lookup(content_hash, perceptual_hash)
+        if cached:
+            return cached_verdict(cached, content_hash)
+        
+        # Analyze content
+        is_safe, vulgarity_score, content_category, tier, image_features = analyze_content(img, caption)
+        features_tier = tier
+    
+    # Don't cache the fallback verdict returned when the model is unavailable or fails
+    if tier is not None:
+        verdict_cache.store(content_hash, perceptual_hash, vulgarity_score, content_category, is_safe)
+    
+    return {
+        'is_safe': is_safe,
+        'vulgarity_score': vulgarity_score,
+        'content_category': content_category,
+        'content_hash': content_hash,
+        'tier': tier,
+        # For the web process's similarity index; prefilter and full features are kept apart
+        'embedding': encode_embedding(image_features) if image_features is not None else None,
+        'embedding_tier': features_tier
+    }
+
+def cached_verdict(cached, content_hash):
+    return {
+        'is_safe': cached['is_safe'],
+        'vulgarity_score': cached['vulgarity_score'],
+        'content_category': cached['content_category'],
+        'content_hash': content_hash,
+        'cache': cached['match'],
+        'tier': 'cache',
+        # The model didn't run; the matched upload's embedding stands in for this one
+        'duplicate_of': cached['sha256']
+    }
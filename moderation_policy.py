@@ -0,0 +1,23 @@
+import os
+
+# Posts scoring above this are rejected. Shared by the moderation workers,
+# the web app and re-scoring so a change applies everywhere at once.
+REJECT_THRESHOLD = float(os.getenv('MODERATION_REJECT_THRESHOLD', '0.5'))
+
+# Upper bound (exclusive) of each content category; higher scores are explicit
+CATEGORY_BOUNDS = (
+    (0.2, 'safe'),
+    (0.4, 'mild'),
+    (0.7, 'moderate')
+)
+
+def content_category(score):
+    """Convert vulgarity score to content category."""
+    for bound, category in CATEGORY_BOUNDS:
+        if score < bound:
+            return category
+    return 'explicit'
+
+def is_safe(score):
+    """Whether a vulgarity score is low enough for a post to be published."""
+    return score <= REJECT_THRESHOLD
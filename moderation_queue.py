@@ -0,0 +1,242 @@
+import importlib
+import json
+import multiprocessing
+import sqlite3
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# A job still running after this long was abandoned by a stopped process
+STALE_CLAIM_SECONDS = 900
+
+def call(target, *args):
+    """Call ``target`` with ``args``, importing it first if it is a 'module:function' string.
+
+    Lets the web process name a handler without importing its module, so
+    heavy dependencies are only loaded by the workers that run it.
+    """
+    if isinstance(target, str):
+        module_name, _, attribute = target.partition(':')
+        target = getattr(importlib.import_module(module_name), attribute)
+    return target(*args)
+
+class ModerationQueue:
+    """SQLite-backed moderation job queue drained by a local worker pool.
+
+    Jobs are persisted before they are handed to the pool, so uploads accepted
+    while the workers are busy (or before a restart) are not lost. Each job runs
+    ``handler(file_path, caption, is_video, content_hash)`` in a worker and the returned dict is
+    passed to ``on_result(post_id, result)`` in the web process. ``initializer``
+    runs once in each worker as it starts, e.g. to load models before the
+    first job arrives. Both may be given as 'module:function' strings, which
+    are imported in the worker on first use.
+    """
+
+    def __init__(self, db_path, handler, on_result, max_workers=2, executor='process', initializer=None):
+        self.db_path = db_path
+        self.handler = handler
+        self.on_result = on_result
+        self.initializer = initializer
+        self.max_workers = max_workers
+        self.executor_kind = executor
+        self._executor = None
+        self._dispatcher = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS moderation_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    post_id INTEGER NOT NULL,
+                    file_path TEXT NOT NULL,
+                    caption TEXT,
+                    is_video INTEGER NOT NULL DEFAULT 0,
+                    content_hash TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    result TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(moderation_jobs)')]
+            if 'content_hash' not in columns:
+                conn.execute('ALTER TABLE moderation_jobs ADD COLUMN content_hash TEXT')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_moderation_jobs_status ON moderation_jobs (status, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_moderation_jobs_post ON moderation_jobs (post_id)')
+
+    def start(self):
+        """Start the worker pool and dispatcher thread if not already running."""
+        with self._lock:
+            if self._dispatcher is not None:
+                return
+            self._executor = self._create_executor()
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='moderation-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def resume(self):
+        """Start the workers if jobs were left waiting by a previous process."""
+        stale = (datetime.utcnow() - timedelta(seconds=STALE_CLAIM_SECONDS)).isoformat()
+        with self._connect() as conn:
+            waiting = conn.execute(
+                "SELECT 1 FROM moderation_jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND updated_at < ?) LIMIT 1",
+                (stale,)
+            ).fetchone()
+        if waiting:
+            self.start()
+            self._wakeup.set()
+
+    def _create_executor(self):
+        if self.executor_kind == 'thread':
+            return ThreadPoolExecutor(max_workers=self.max_workers, **self._initializer_args())
+        # Spawn fresh interpreters so workers don't inherit torch thread state
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            **self._initializer_args()
+        )
+
+    def _replace_executor(self):
+        """Start a new pool in place of one broken by a worker that died."""
+        with self._lock:
+            broken, self._executor = self._executor, self._create_executor()
+        broken.shutdown(wait=False)
+
+    def _initializer_args(self):
+        if self.initializer is None:
+            return {}
+        return {'initializer': call, 'initargs': (self.initializer,)}
+
+    def enqueue(self, post_id, file_path, caption, is_video, content_hash=None):
+        """Persist a moderation job and wake the dispatcher."""
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO moderation_jobs (post_id, file_path, caption, is_video, content_hash, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (post_id, file_path, caption, int(bool(is_video)), content_hash, now, now)
+            )
+            job_id = cursor.lastrowid
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def status(self, post_id):
+        """Return the latest job for a post as a dict, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT * FROM moderation_jobs WHERE post_id = ? ORDER BY id DESC LIMIT 1',
+                (post_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def pending_count(self):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM moderation_jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+
+    def _claim_jobs(self, limit):
+        now = datetime.utcnow()
+        conn = self._connect()
+        try:
+            # Take the write lock first so processes sharing the table don't claim the same jobs
+            conn.execute('BEGIN IMMEDIATE')
+            # Jobs left running by a stopped process are picked up again
+            conn.execute(
+                "UPDATE moderation_jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (now.isoformat(), (now - timedelta(seconds=STALE_CLAIM_SECONDS)).isoformat())
+            )
+            rows = conn.execute(
+                "SELECT * FROM moderation_jobs WHERE status = 'queued' ORDER BY id LIMIT ?",
+                (limit,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE moderation_jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                [(now.isoformat(), row['id']) for row in rows]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def _requeue(self, jobs):
+        """Put claimed jobs that never reached a worker back in the queue."""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE moderation_jobs SET status = 'queued', updated_at = ? WHERE id = ? AND status = 'running'",
+                [(datetime.utcnow().isoformat(), job['id']) for job in jobs]
+            )
+
+    def _dispatch_loop(self):
+        while True:
+            jobs, submitted = [], 0
+            # Errors are logged and retried; the thread is never restarted once it stops
+            try:
+                with self._lock:
+                    free_slots = self.max_workers - self._in_flight
+                jobs = self._claim_jobs(free_slots) if free_slots > 0 else []
+                for job in jobs:
+                    future = self._executor.submit(
+                        call, self.handler, job['file_path'], job['caption'], bool(job['is_video']), job['content_hash']
+                    )
+                    submitted += 1
+                    with self._lock:
+                        self._in_flight += 1
+                    future.add_done_callback(lambda f, job=job: self._finish(job, f))
+            except Exception as e:
+                print(f"Error dispatching moderation jobs: {e}")
+                try:
+                    self._requeue(jobs[submitted:])
+                except Exception as requeue_error:
+                    # Picked up again once the claim goes stale
+                    print(f"Error requeueing moderation jobs: {requeue_error}")
+                if isinstance(e, BrokenExecutor):
+                    self._replace_executor()
+                jobs = []
+            if not jobs:
+                self._wakeup.wait(timeout=5)
+                self._wakeup.clear()
+
+    def _finish(self, job, future):
+        try:
+            result = future.result()
+            status = 'done'
+        except Exception as e:
+            print(f"Error running moderation job {job['id']}: {e}")
+            result = {'error': str(e)}
+            status = 'failed'
+
+        try:
+            self.on_result(job['post_id'], result)
+        except Exception as e:
+            print(f"Error applying moderation result for post {job['post_id']}: {e}")
+            status = 'failed'
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'UPDATE moderation_jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?',
+                    (status, json.dumps(result), datetime.utcnow().isoformat(), job['id'])
+                )
+        except Exception as e:
+            print(f"Error recording moderation job {job['id']}: {e}")
+        finally:
+            # The worker slot is free either way
+            with self._lock:
+                self._in_flight -= 1
+            self._wakeup.set()
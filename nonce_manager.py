@@ -0,0 +1,132 @@
+import sqlite3
+import time
+
+# A nonce handed out and still unsent after this long was abandoned by a stopped process
+UNSENT_NONCE_SECONDS = 60
+
+class NonceManager:
+    """Hands out nonces for locally signed transactions, shared through SQLite
+    by every process sending from the same accounts.
+
+    Nonces are allocated without asking the node, so transactions can be
+    signed and sent back to back from many workers. A nonce whose
+    transaction was never sent, or was dropped before being mined, is
+    ``release``d and handed out again before new ones, so later transactions
+    don't wait forever behind the gap. ``resync`` catches up with the node's
+    transaction counts when something else sent from the account, or after
+    the node restarted and lost its pending transactions. Nonces are tracked
+    from ``allocate`` until ``sent`` or ``release``, so no process takes a
+    nonce another one is still sending for a gap.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS sender_nonces (sender TEXT PRIMARY KEY, next_nonce INTEGER NOT NULL)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS released_nonces (
+                    sender TEXT NOT NULL,
+                    nonce INTEGER NOT NULL,
+                    PRIMARY KEY (sender, nonce)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS unsent_nonces (
+                    sender TEXT NOT NULL,
+                    nonce INTEGER NOT NULL,
+                    allocated_at REAL NOT NULL,
+                    PRIMARY KEY (sender, nonce)
+                )
+            ''')
+
+    def _transaction(self):
+        conn = self._connect()
+        # Take the write lock first so processes never hand out the same nonce
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
+
+    def allocate(self, sender):
+        """(nonce, reused) for ``sender``'s next transaction, or None until it has been resynced.
+
+        ``reused`` is true for a released nonce, whose earlier transaction may
+        still be waiting in a mempool and has to be outbid.
+        """
+        sender = sender.lower()
+        conn = self._transaction()
+        try:
+            released = conn.execute(
+                'SELECT MIN(nonce) FROM released_nonces WHERE sender = ?', (sender,)
+            ).fetchone()[0]
+            if released is not None:
+                conn.execute('DELETE FROM released_nonces WHERE sender = ? AND nonce = ?', (sender, released))
+                allocated = released, True
+            else:
+                row = conn.execute('SELECT next_nonce FROM sender_nonces WHERE sender = ?', (sender,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE sender_nonces SET next_nonce = next_nonce + 1 WHERE sender = ?', (sender,))
+                allocated = row[0], False
+            conn.execute(
+                'INSERT OR REPLACE INTO unsent_nonces (sender, nonce, allocated_at) VALUES (?, ?, ?)',
+                (sender, allocated[0], time.time())
+            )
+            conn.commit()
+            return allocated
+        finally:
+            conn.close()
+
+    def sent(self, sender, nonce):
+        """Record that the node accepted the transaction using ``nonce``."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM unsent_nonces WHERE sender = ? AND nonce = ?', (sender.lower(), nonce))
+
+    def release(self, sender, nonce):
+        """Hand ``nonce`` out again; its transaction was never sent or was dropped."""
+        sender = sender.lower()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM unsent_nonces WHERE sender = ? AND nonce = ?', (sender, nonce))
+            conn.execute('INSERT OR IGNORE INTO released_nonces (sender, nonce) VALUES (?, ?)', (sender, nonce))
+
+    def resync(self, sender, mined, pending, fill_gaps=False):
+        """Reconcile with the node's counts of ``sender``'s mined and pending transactions.
+
+        Released nonces the chain has since used are forgotten. With
+        ``fill_gaps``, nonces handed out past what the node knows of are
+        taken to be lost with their transactions and released, except those
+        some process allocated less than ``UNSENT_NONCE_SECONDS`` ago and
+        hasn't sent yet.
+        """
+        sender = sender.lower()
+        conn = self._transaction()
+        try:
+            conn.execute('DELETE FROM released_nonces WHERE sender = ? AND nonce < ?', (sender, mined))
+            conn.execute(
+                'DELETE FROM unsent_nonces WHERE sender = ? AND (nonce < ? OR allocated_at < ?)',
+                (sender, mined, time.time() - UNSENT_NONCE_SECONDS)
+            )
+            row = conn.execute('SELECT next_nonce FROM sender_nonces WHERE sender = ?', (sender,)).fetchone()
+            next_nonce = row[0] if row else pending
+            if fill_gaps:
+                # Still on their way to the node from other processes
+                unsent = {nonce for (nonce,) in conn.execute(
+                    'SELECT nonce FROM unsent_nonces WHERE sender = ?', (sender,)
+                )}
+                conn.executemany(
+                    'INSERT OR IGNORE INTO released_nonces (sender, nonce) VALUES (?, ?)',
+                    [(sender, nonce) for nonce in range(pending, next_nonce) if nonce not in unsent]
+                )
+            conn.execute(
+                'INSERT INTO sender_nonces (sender, next_nonce) VALUES (?, ?) '
+                'ON CONFLICT (sender) DO UPDATE SET next_nonce = excluded.next_nonce',
+                (sender, max(next_nonce, pending))
+            )
+            conn.commit()
+        finally:
+            conn.close()
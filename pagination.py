@@ -0,0 +1,46 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+def encode_cursor(created_at, item_id):
+    """Encode a (created_at, id) position as an opaque URL-safe cursor."""
+    raw = f"{created_at.isoformat()}|{item_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor into (created_at, id), or None if it is missing or invalid."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, item_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def keyset_page(query, created_column, id_column, cursor=None, limit=20, key=None):
+    """Return one page of a query ordered newest first by (created_at, id).
+
+    Instead of OFFSET, the page starts strictly after the position encoded in
+    ``cursor``, so every page is a bounded range scan no matter how deep the
+    reader has scrolled. ``key`` maps a result row to its (created_at, id)
+    position and defaults to the row's own ``created_at`` and ``id``.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    key = key or (lambda row: (row.created_at, row.id))
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, item_id = position
+        # The leading bound on created_at lets the planner use a range scan
+        query = query.filter(and_(
+            created_column <= created_at,
+            or_(created_column < created_at, id_column < item_id)
+        ))
+
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*key(rows[-1]))
+    return rows, next_cursor
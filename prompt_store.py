@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import torch
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'prompt_embeddings')
+
+class PromptEmbeddingStore:
+    """Compute CLIP text embeddings for fixed prompt lists once and reuse them.
+
+    Embeddings are L2-normalized and persisted to disk under a key derived from
+    the model name and the prompt list, so a restart (or another worker) can load
+    them instead of running the text tower again.
+    """
+
+    def __init__(self, model, processor, model_name, cache_dir=None, device=None):
+        self.model = model
+        self.processor = processor
+        self.model_name = model_name
+        self.device = device
+        self.cache_dir = cache_dir or os.getenv('PROMPT_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self._embeddings = {}
+
+    def cache_key(self, prompts):
+        """Return the key identifying a prompt list for this model."""
+        payload = json.dumps({'model': self.model_name, 'prompts': list(prompts)})
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def cache_path(self, prompts):
+        model_slug = self.model_name.replace('/', '--')
+        return os.path.join(self.cache_dir, f"{model_slug}-{self.cache_key(prompts)[:16]}.pt")
+
+    def get(self, prompts):
+        """Return a (len(prompts), dim) tensor of normalized text embeddings."""
+        key = self.cache_key(prompts)
+        embeddings = self._embeddings.get(key)
+        if embeddings is not None:
+            return embeddings
+
+        path = self.cache_path(prompts)
+        if os.path.exists(path):
+            try:
+                embeddings = torch.load(path, map_location=self.device)
+            except Exception as e:
+                print(f"Error loading prompt embeddings from {path}: {e}")
+
+        if embeddings is None:
+            embeddings = self.encode(prompts)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                torch.save(embeddings, tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Error saving prompt embeddings to {path}: {e}")
+
+        self._embeddings[key] = embeddings
+        return embeddings
+
+    def encode(self, prompts):
+        """Run the text tower on a prompt list and normalize the result."""
+        with torch.no_grad():
+            inputs = self.processor(text=list(prompts), return_tensors="pt", padding=True, truncation=True)
+            if self.device is not None:
+                inputs = inputs.to(self.device)
+            features = self.model.get_text_features(**inputs)
+        return features / features.norm(dim=-1, keepdim=True)
+
+    def warm(self, *prompt_lists):
+        """Load or compute embeddings for each prompt list up front."""
+        for prompts in prompt_lists:
+            self.get(prompts)
@@ -0,0 +1,119 @@
+import json
+import os
+import torch
+import moderation
+from derivatives import open_for_width
+from frame_sampler import sample_frames
+
+class Rescorer:
+    """Score stored posts against the current prompt lists.
+
+    Scores come from the full-resolution embeddings kept in the similarity
+    index, a whole chunk at a time: one (posts x dim) by (dim x prompts)
+    product per prompt list. Posts without one, including those the cascade
+    decided on prefilter features, are run through the vision model from
+    their media when ``recompute`` is on and skipped otherwise; their new
+    embeddings replace the prefilter's in the index so the next run doesn't
+    have to.
+
+    ``embedding_index`` is a ``TieredEmbeddingIndex``.
+    """
+
+    def __init__(self, embedding_index, recompute=True, batch_size=32):
+        self.models = moderation.get_models()
+        if self.models is None:
+            raise RuntimeError(f"CLIP model {moderation.CLIP_MODEL_NAME} could not be loaded")
+        self.embedding_index = embedding_index
+        self.recompute = recompute
+        self.batch_size = batch_size
+        self.inappropriate = self.models.prompt_store.get(moderation.INAPPROPRIATE_CATEGORIES)
+        self.safe = self.models.prompt_store.get(moderation.SAFE_CATEGORIES)
+
+    @property
+    def key(self):
+        """Identifies the prompts and thresholds a run scores with, for its checkpoint."""
+        return moderation.scoring_version()
+
+    def score_features(self, features):
+        return moderation.calculate_vulgarity_scores(features, self.inappropriate, self.safe)
+
+    def score(self, posts):
+        """Score a chunk of (post id, is_video, local media path or None).
+
+        Returns ({post id: score}, number of posts whose embedding was
+        recomputed). Posts that can't be scored are left out.
+        """
+        # Only full-resolution embeddings; the prefilter's are recomputed like missing ones
+        found_ids, vectors = self.embedding_index.index('full').get_many([post_id for post_id, _, _ in posts])
+        scores = dict(zip(found_ids, self.score_features(torch.from_numpy(vectors)))) if found_ids else {}
+        recomputed = 0
+        if self.recompute:
+            missing = [(post_id, is_video, path) for post_id, is_video, path in posts
+                       if post_id not in scores and path and os.path.exists(path)]
+            images = [post for post in missing if not post[1]]
+            for start in range(0, len(images), self.batch_size):
+                recomputed += self._score_images(images[start:start + self.batch_size], scores)
+            for post_id, _, path in (post for post in missing if post[1]):
+                recomputed += self._score_video(post_id, path, scores)
+        return scores, recomputed
+
+    def _store(self, post_id, features, score, scores):
+        scores[post_id] = score
+        try:
+            self.embedding_index.add(post_id, features.numpy(), 'full')
+        except Exception as e:
+            print(f"Error indexing embedding for post {post_id}: {e}")
+
+    def _score_images(self, batch, scores):
+        loaded = []
+        for post_id, _, path in batch:
+            try:
+                img = open_for_width(path, 1080).convert('RGB')
+                img.thumbnail((1080, 1080))
+                loaded.append((post_id, img))
+            except Exception as e:
+                print(f"Error loading image for post {post_id}: {e}")
+        if not loaded:
+            return 0
+        features = torch.stack(self.models.vision_backend([img for _, img in loaded]))
+        for (post_id, _), row, score in zip(loaded, features, self.score_features(features)):
+            self._store(post_id, row, score, scores)
+        return len(loaded)
+
+    def _score_video(self, post_id, path, scores):
+        try:
+            frames = [image.convert('RGB') for _, image in sample_frames(path)]
+        except Exception as e:
+            print(f"Error extracting video frames for post {post_id}: {e}")
+            return 0
+        if not frames:
+            return 0
+        features = torch.stack([row for start in range(0, len(frames), self.batch_size)
+                                for row in self.models.vision_backend(frames[start:start + self.batch_size])])
+        # Like moderation: the video scores as its worst frame
+        frame_scores = self.score_features(features)
+        worst = max(range(len(frame_scores)), key=frame_scores.__getitem__)
+        self._store(post_id, features[worst], frame_scores[worst], scores)
+        return 1
+
+def load_checkpoint(path, key):
+    """Progress of an interrupted run with the same prompts and thresholds, or None."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
+    if state.get('key') != key:
+        print(f"Checkpoint {path} was written for other prompts or thresholds, starting over")
+        return None
+    return state
+
+def save_checkpoint(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import pytest
+from app import create_app, db, User, Post, MediaBlob, store_media, release_media, media_backend
+
+CONTENT = b'same image bytes'
+CONTENT_HASH = hashlib.sha256(CONTENT).hexdigest()
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'MODERATION_QUEUE_DB': str(tmp_path / 'moderation_queue.db'),
+        'TRANSACTION_DB': str(tmp_path / 'transactions.db'),
+        'EMBEDDING_INDEX_DIR': str(tmp_path / 'embeddings'),
+        'CHAIN_INDEXER': False
+    })
+    with app.app_context():
+        db.create_all()
+    return app
+
+def add_user(username, **kwargs):
+    user = User(username=username, email=f'{username}@example.com', **kwargs)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def add_post(app, user, status, score):
+    """A post referencing the shared blob, stored the way uploads are."""
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f'.upload-{user.id}-{status}')
+    with open(path, 'wb') as f:
+        f.write(CONTENT)
+    key = store_media(path, CONTENT_HASH, 'jpg', len(CONTENT))
+    post = Post(image=key, user_id=user.id, status=status, vulgarity_score=score, content_hash=CONTENT_HASH)
+    db.session.add(post)
+    db.session.commit()
+    return post
+
+def test_analyze_user_twice_keeps_shared_blob(app):
+    with app.app_context():
+        add_user('admin', is_admin=True)
+        author = add_user('author', wallet_address='0x' + '1' * 40)
+        other = add_user('other', wallet_address='0x' + '2' * 40)
+        # The same content posted by another user stays published
+        add_post(app, other, 'published', 0.1)
+        add_post(app, author, 'published', 0.9)
+        rejected = add_post(app, author, 'pending', 0.9)
+        # Rejection gave up this post's reference, as apply_moderation_result does
+        release_media(rejected.image)
+        rejected.status = 'rejected'
+        author.is_blocked = True
+        db.session.commit()
+        assert MediaBlob.query.get(CONTENT_HASH).ref_count == 2
+        author_id = author.id
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    for _ in range(2):
+        response = client.get(f'/admin/analyze_user/{author_id}')
+        assert response.status_code == 302
+
+    with app.app_context():
+        assert Post.query.filter_by(user_id=author_id).count() == 0
+        blob = MediaBlob.query.get(CONTENT_HASH)
+        assert blob is not None
+        assert blob.ref_count == 1
+        assert media_backend.exists(blob.key)
@@ -3,11 +3,13 @@ import tensorflow as tf
 import numpy as np
 from PIL import Image
 import cv2
-from moviepy.editor import VideoFileClip
 import logging
-from transformers import CLIPProcessor, CLIPModel
 import torch
 from huggingface_hub import login
+from prompt_store import PromptEmbeddingStore
+from model_registry import clip
+from inference_server import BatchingInferenceServer
+from frame_sampler import sample_frames
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +27,8 @@ class ContentAnalyzer:
     def __init__(self):
         self.model = None
         self.processor = None
+        self.prompt_store = None
+        self.inference_server = None
         self.image_size = (224, 224)
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
@@ -76,19 +80,40 @@ class ContentAnalyzer:
             model_name = "openai/clip-vit-large-patch14"  # Using larger model for better accuracy
             logger.info(f"Loading CLIP model: {model_name}")
             
-            # Load model and processor
-            self.model = CLIPModel.from_pretrained(model_name)
-            self.processor = CLIPProcessor.from_pretrained(model_name)
+            # Load model and processor once per process, shared by every analyzer
+            loaded = clip(model_name)
+            if loaded is None:
+                raise Exception(f"Model {model_name} is not available")
+            self.model, self.processor = loaded
             
             # Move model to appropriate device
             self.model = self.model.to(self.device)
-            self.model.eval()
+            
+            # Category prompt embeddings are encoded once and reused for every image
+            self.prompt_store = PromptEmbeddingStore(self.model, self.processor, model_name, device=self.device)
+            self.prompt_store.warm(*self.category_prompts.values())
+            
+            # Concurrent analyze_image calls share vision forward passes
+            self.inference_server = BatchingInferenceServer(
+                self.encode_images,
+                max_batch_size=int(os.getenv('MODERATION_MAX_BATCH_SIZE', '16')),
+                max_wait_ms=float(os.getenv('MODERATION_MAX_WAIT_MS', '0')),
+                name='content-analyzer'
+            )
             
             logger.info("Model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise Exception(f"Failed to load model: {str(e)}")
         
+    def encode_images(self, images):
+        """Encode a batch of RGB images into normalized CLIP image features."""
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            image_features = self.model.get_image_features(**inputs)
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        return list(image_features)
+        
     def analyze_image(self, image_path):
         try:
             if self.model is None:
@@ -115,21 +140,16 @@ class ContentAnalyzer:
                 'total_frames': 1
             }
             
+            # Encode the image once through the batching server
+            image_features = self.inference_server.infer(image)
+            logit_scale = self.model.logit_scale.exp()
+            
             # Process each category with multiple prompts
             for category, prompts in self.category_prompts.items():
-                # Process inputs for all prompts in this category
-                inputs = self.processor(
-                    images=[image] * len(prompts),
-                    text=prompts,
-                    return_tensors="pt",
-                    padding=True
-                ).to(self.device)
-                
-                # Get model predictions
+                # Compare against the cached embeddings for all prompts in this category
                 with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    logits_per_image = outputs.logits_per_image
-                    probs = torch.nn.functional.softmax(logits_per_image, dim=1)
+                    logits_per_image = logit_scale * image_features @ self.prompt_store.get(prompts).T
+                    probs = torch.nn.functional.softmax(logits_per_image, dim=0)
                 
                 # Take the maximum probability across all prompts for this category
                 category_score = float(torch.max(probs).cpu().numpy())
@@ -169,11 +189,10 @@ class ContentAnalyzer:
             if not os.path.exists(video_path):
                 raise FileNotFoundError(f"Video file not found: {video_path}")
             
-            # Load video
-            video = VideoFileClip(video_path)
-            duration = video.duration
-            fps = video.fps
-            total_frames = int(duration * fps)
+            # Read the frame count without decoding anything
+            video = cv2.VideoCapture(video_path)
+            total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+            video.release()
             
             # Initialize results
             results = {
@@ -184,14 +203,10 @@ class ContentAnalyzer:
                 'total_frames': total_frames
             }
             
-            # Sample frames for analysis (every 30th frame)
+            # Sample the most distinct frame from each second in one sequential pass
             frame_count = 0
-            for frame in video.iter_frames(fps=fps/30):  # Analyze 1 frame per second
+            for _, frame_pil in sample_frames(video_path, max_frames=None, interval_seconds=1.0):
                 try:
-                    # Convert frame to PIL Image
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frame_pil = Image.fromarray(frame_rgb)
-                    
                     # Analyze frame
                     frame_results = self.analyze_image(frame_pil)
                     
@@ -0,0 +1,119 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+# (height, video bitrate, audio bitrate), largest first
+RENDITIONS = [
+    (1080, '5000k', '160k'),
+    (720, '2800k', '128k'),
+    (360, '800k', '96k')
+]
+SEGMENT_SECONDS = 4
+MASTER_PLAYLIST = 'hls/master.m3u8'
+FALLBACK_VIDEO = 'video.mp4'
+POSTER = 'poster.jpg'
+
+def _bufsize(bitrate):
+    return f"{int(bitrate[:-1]) * 3 // 2}k"
+
+def plan_renditions(source_height, renditions=RENDITIONS):
+    """Renditions no taller than the source; a short source gets one at its own height."""
+    planned = [r for r in renditions if r[0] <= source_height]
+    if not planned:
+        smallest = renditions[-1]
+        planned = [(source_height - source_height % 2, smallest[1], smallest[2])]
+    return planned
+
+def transcode_video(source_path, output_dir, threads=2, renditions=RENDITIONS):
+    """Transcode an upload to H.264/AAC HLS renditions, an MP4 fallback and a poster.
+
+    Everything is written under a new temp directory inside ``output_dir``
+    using the relative names the media store keeps them under. A single
+    ffmpeg process decodes the source once and encodes every rendition.
+    Returns a plain dict with the source size and duration, the rendition
+    heights and a list of (relative name, path) files.
+    """
+    # moviepy is only needed to locate and probe with ffmpeg; keep it out of the web process
+    from moviepy.config import get_setting
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    ffmpeg = get_setting('FFMPEG_BINARY')
+    infos = ffmpeg_parse_infos(source_path)
+    width, height = infos['video_size']
+    duration = infos.get('duration') or 0
+    has_audio = infos.get('audio_found', False)
+    planned = plan_renditions(height, renditions)
+
+    work_dir = tempfile.mkdtemp(dir=output_dir, prefix='.transcode-')
+    try:
+        for i in range(len(planned)):
+            os.makedirs(os.path.join(work_dir, 'hls', f'v{i}'))
+
+        # One decoded stream, split into each rendition plus the MP4 fallback
+        count = len(planned)
+        fallback_height, fallback_bitrate, _ = planned[count // 2]
+        filters = ['[0:v]split=%d%s' % (count + 1, ''.join(f'[s{i}]' for i in range(count + 1)))]
+        filters += [f'[s{i}]scale=-2:{h}[r{i}]' for i, (h, _, _) in enumerate(planned)]
+        filters.append(f'[s{count}]scale=-2:{fallback_height}[fallback]')
+
+        video_options = ['-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+                         '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})']
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-i', source_path, '-threads', str(threads),
+                   '-filter_complex', ';'.join(filters)]
+
+        command += ['-map', '[fallback]']
+        if has_audio:
+            command += ['-map', '0:a:0', '-c:a', 'aac', '-b:a', '128k', '-ac', '2']
+        command += ['-c:v', 'libx264', '-b:v', fallback_bitrate, '-maxrate', fallback_bitrate,
+                    '-bufsize', _bufsize(fallback_bitrate)] + video_options
+        command += ['-movflags', '+faststart', os.path.join(work_dir, FALLBACK_VIDEO)]
+
+        stream_map = []
+        for i, (_, video_bitrate, audio_bitrate) in enumerate(planned):
+            command += ['-map', f'[r{i}]']
+            command += [f'-c:v:{i}', 'libx264', f'-b:v:{i}', video_bitrate,
+                        f'-maxrate:v:{i}', video_bitrate, f'-bufsize:v:{i}', _bufsize(video_bitrate)]
+            if has_audio:
+                command += ['-map', '0:a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', audio_bitrate, f'-ac:a:{i}', '2']
+                stream_map.append(f'v:{i},a:{i}')
+            else:
+                stream_map.append(f'v:{i}')
+        command += video_options + [
+            '-f', 'hls',
+            '-hls_time', str(SEGMENT_SECONDS),
+            '-hls_playlist_type', 'vod',
+            '-hls_flags', 'independent_segments',
+            '-hls_segment_filename', os.path.join(work_dir, 'hls', 'v%v', 'segment_%03d.ts'),
+            '-master_pl_name', 'master.m3u8',
+            '-var_stream_map', ' '.join(stream_map),
+            os.path.join(work_dir, 'hls', 'v%v', 'index.m3u8')
+        ]
+        subprocess.run(command, check=True, capture_output=True)
+
+        # Poster from a frame a little way in, to skip fade-ins and black leaders
+        poster_at = min(1.0, duration / 2) if duration else 0
+        subprocess.run([
+            ffmpeg, '-y', '-loglevel', 'error', '-ss', f'{poster_at:.2f}', '-i', source_path,
+            '-frames:v', '1', '-vf', f'scale=-2:{min(height - height % 2, 720)}', '-q:v', '3',
+            os.path.join(work_dir, POSTER)
+        ], check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise RuntimeError(f"ffmpeg failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    files = []
+    for root, _, names in os.walk(work_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append((os.path.relpath(path, work_dir).replace(os.sep, '/'), path))
+    return {
+        'width': width,
+        'height': height,
+        'duration': duration,
+        'renditions': [h for h, _, _ in planned],
+        'work_dir': work_dir,
+        'files': files
+    }
@@ -0,0 +1,308 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from nonce_manager import NonceManager
+
+# Seconds between connection attempts while the node is unreachable
+CONNECT_RETRY_SECONDS = 30
+
+# A claimed transaction still unsent after this long was abandoned by a stopped process
+STALE_CLAIM_SECONDS = 60
+
+def _timestamp(seconds_from_now=0):
+    return (datetime.utcnow() + timedelta(seconds=seconds_from_now)).isoformat()
+
+class TransactionSubmitter:
+    """SQLite-backed queue of blockchain transactions sent from a background thread.
+
+    ``submit`` persists a transaction and returns at once, so requests never
+    wait on the chain. A thread running an asyncio loop sends queued
+    transactions through web3's async provider without waiting for them to be
+    mined, and polls the receipts of everything pending concurrently in one
+    round per ``poll_interval``. Once a transaction is mined, or has failed
+    ``max_attempts`` times (retried with exponential backoff),
+    ``on_result(kind, target_id, result)`` is called with what it did, or
+    ``{'error': ...}``. A transaction still unmined after ``receipt_timeout``
+    is only sent again once the node no longer has it. A user's transactions
+    wait for their registration to be mined, since the contract rejects
+    posts from unregistered users.
+
+    With an ``owner_key``, the contract owner's transactions are signed
+    here, with nonces allocated in the same database, so every process's
+    submitter can send them at once.
+    """
+
+    def __init__(self, db_path, on_result, provider_url=None, poll_interval=1.0, max_attempts=5,
+                 backoff_seconds=10, receipt_timeout=300, batch_size=100, owner_key=None):
+        self.db_path = db_path
+        self.on_result = on_result
+        self.provider_url = provider_url
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.receipt_timeout = receipt_timeout
+        self.batch_size = batch_size
+        self.owner_key = owner_key
+        self._thread = None
+        self._loop = None
+        self._wakeup = None
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chain_transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    target_id INTEGER NOT NULL,
+                    sender TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    tx_hash TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TEXT NOT NULL,
+                    sent_at TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_chain_transactions_status ON chain_transactions (status, next_attempt_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_chain_transactions_sender ON chain_transactions (sender, kind, id)')
+
+    def start(self):
+        """Start the submitter thread if not already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=asyncio.run, args=(self._run(),),
+                                            name='transaction-submitter', daemon=True)
+            self._thread.start()
+
+    def submit(self, kind, target_id, sender, *args):
+        """Queue a transaction, start sending, and return its id without waiting for the chain."""
+        transaction_id = self.queue(kind, target_id, sender, *args)
+        self.start()
+        self._wake()
+        return transaction_id
+
+    def queue(self, kind, target_id, sender, *args):
+        """Queue a transaction for whichever process has the submitter running.
+
+        ``target_id`` is the post, user or batch id the result is recorded on;
+        ``sender`` and ``args`` are what ``AsyncBlockchainManager.send`` takes.
+        """
+        now = _timestamp()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO chain_transactions (kind, target_id, sender, args, next_attempt_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (kind, target_id, sender, json.dumps(args), now, now, now)
+            )
+            return cursor.lastrowid
+
+    def _wake(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def pending_count(self):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM chain_transactions WHERE status IN ('queued', 'sending', 'pending')"
+            ).fetchone()[0]
+
+    def stats(self):
+        """Number of transactions in each status."""
+        with self._connect() as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM chain_transactions GROUP BY status').fetchall())
+
+    def retry_failed(self):
+        """Queue transactions that ran out of attempts again; returns how many.
+
+        They are sent by whichever process has the submitter running.
+        """
+        now = _timestamp()
+        with self._connect() as conn:
+            count = conn.execute(
+                "UPDATE chain_transactions SET status = 'queued', attempts = 0, error = NULL, "
+                "next_attempt_at = ?, updated_at = ? WHERE status = 'failed'",
+                (now, now)
+            ).rowcount
+        self._wake()
+        return count
+
+    async def _open_chain(self):
+        # web3 is only imported once there is something to send
+        from blockchain import AsyncBlockchainManager, PROVIDER_URL
+        nonces = NonceManager(self.db_path) if self.owner_key else None
+        return await AsyncBlockchainManager.connect(self.provider_url or PROVIDER_URL, self.owner_key, nonces)
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _run(self):
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        chain = None
+        while True:
+            # Any error, e.g. a locked database, is logged and retried; the
+            # thread is never restarted once it stops
+            try:
+                if chain is None:
+                    if not self.pending_count():
+                        # Nothing to send yet; web3 isn't imported until there is
+                        await self._sleep(5)
+                        continue
+                    try:
+                        chain = await self._open_chain()
+                    except Exception as e:
+                        print(f"Transaction submitter could not reach the blockchain: {e}")
+                        await self._sleep(CONNECT_RETRY_SECONDS)
+                        continue
+                sent = await self._send_queued(chain)
+                pending = await self._poll_pending(chain)
+                if not sent:
+                    # Receipts are polled while anything is in flight; otherwise wait
+                    # for a submit or the next retry to come due
+                    await self._sleep(self.poll_interval if pending else self._seconds_until_due(5))
+            except Exception as e:
+                print(f"Error in transaction submitter: {e}")
+                await self._sleep(5)
+
+    def _seconds_until_due(self, longest):
+        with self._connect() as conn:
+            due = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM chain_transactions WHERE status = 'queued'"
+            ).fetchone()[0]
+        if due is None:
+            return longest
+        return min(longest, max(0, (datetime.fromisoformat(due) - datetime.utcnow()).total_seconds()))
+
+    def _claim(self):
+        """Mark up to ``batch_size`` due transactions as being sent by this process."""
+        now = _timestamp()
+        conn = self._connect()
+        try:
+            # Take the write lock first so processes sharing the table don't claim the same rows
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                "UPDATE chain_transactions SET status = 'queued', updated_at = ? WHERE status = 'sending' AND updated_at < ?",
+                (now, _timestamp(-STALE_CLAIM_SECONDS))
+            )
+            rows = conn.execute(
+                "SELECT * FROM chain_transactions t WHERE status = 'queued' AND next_attempt_at <= ? "
+                "AND NOT EXISTS (SELECT 1 FROM chain_transactions r WHERE r.sender = t.sender "
+                "AND r.kind = 'register_user' AND r.id < t.id AND r.status IN ('queued', 'sending', 'pending')) "
+                "ORDER BY id LIMIT ?",
+                (now, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE chain_transactions SET status = 'sending', updated_at = ? WHERE id = ?",
+                [(now, row['id']) for row in rows]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return [dict(row, status='sending') for row in rows]
+
+    async def _send_queued(self, chain):
+        rows = self._claim()
+        if not rows:
+            return 0
+        hashes = await asyncio.gather(
+            *(chain.send(row['kind'], row['sender'], *json.loads(row['args'])) for row in rows),
+            return_exceptions=True
+        )
+        now = _timestamp()
+        for row, tx_hash in zip(rows, hashes):
+            if isinstance(tx_hash, Exception):
+                self._retry(row, str(tx_hash))
+            elif tx_hash is None:
+                # Nothing to do on chain, e.g. the user was already registered
+                self._finish(row, 'skipped', {'tx_hash': None})
+            else:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE chain_transactions SET status = 'pending', tx_hash = ?, attempts = attempts + 1, "
+                        "sent_at = ?, error = NULL, updated_at = ? WHERE id = ?",
+                        (tx_hash, now, now, row['id'])
+                    )
+        return len(rows)
+
+    async def _poll_pending(self, chain):
+        with self._connect() as conn:
+            rows = [dict(row) for row in conn.execute(
+                "SELECT * FROM chain_transactions WHERE status = 'pending' ORDER BY id LIMIT ?",
+                (self.batch_size * 10,)
+            )]
+        if not rows:
+            return 0
+        receipts = await chain.receipts([row['tx_hash'] for row in rows])
+        timed_out = _timestamp(-self.receipt_timeout)
+        overdue = [row['tx_hash'] for row in rows if row['tx_hash'] not in receipts and row['sent_at'] < timed_out]
+        # A slow transaction is still valid; sending it again could get both mined
+        known = await chain.known_transactions(overdue) if overdue else set()
+        dropped = False
+        for row in rows:
+            receipt = receipts.get(row['tx_hash'])
+            if receipt is None:
+                if row['sent_at'] < timed_out and row['tx_hash'] not in known:
+                    # Dropped by the node, e.g. on a restart; send it again
+                    self._retry(row, f"Dropped after {self.receipt_timeout}s without being mined", attempted=True)
+                    dropped = True
+            elif receipt['status'] != 1:
+                self._retry(row, 'Transaction failed', attempted=True)
+            else:
+                self._finish(row, 'confirmed', chain.describe(row['kind'], receipt))
+        if dropped:
+            # Its nonce is sent again rather than left as a gap stalling later transactions
+            await chain.recover_nonces()
+        return len(rows)
+
+    def _retry(self, row, error, attempted=False):
+        """Queue a failed transaction again after a backoff, or give up on it."""
+        # Sent transactions were counted when they were sent
+        attempts = row['attempts'] + (0 if attempted else 1)
+        if attempts >= self.max_attempts:
+            print(f"Giving up on {row['kind']} transaction {row['id']} after {attempts} attempts: {error}")
+            self._finish(row, 'failed', {'error': error}, attempts=attempts)
+            return
+        now = _timestamp()
+        with self._connect() as conn:
+            # Another process polling the same table may have requeued it first
+            conn.execute(
+                "UPDATE chain_transactions SET status = 'queued', attempts = ?, error = ?, "
+                "next_attempt_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (attempts, error, _timestamp(self.backoff_seconds * 2 ** (attempts - 1)), now, row['id'], row['status'])
+            )
+
+    def _finish(self, row, status, result, attempts=None):
+        with self._connect() as conn:
+            # Another process polling the same table may have recorded it first
+            claimed = conn.execute(
+                'UPDATE chain_transactions SET status = ?, result = ?, error = ?, attempts = ?, updated_at = ? '
+                'WHERE id = ? AND status = ?',
+                (status, json.dumps(result), result.get('error'),
+                 row['attempts'] if attempts is None else attempts, _timestamp(), row['id'], row['status'])
+            ).rowcount
+        if not claimed:
+            return
+        try:
+            self.on_result(row['kind'], row['target_id'], result)
+        except Exception as e:
+            print(f"Error applying {row['kind']} transaction result for {row['target_id']}: {e}")
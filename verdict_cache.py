@@ -0,0 +1,215 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image
+
+HASH_BITS = 64
+
+def dhash(image, hash_size=8):
+    """Return a 64-bit difference hash of a PIL image."""
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << HASH_BITS) if value >= (1 << (HASH_BITS - 1)) else value
+
+def _to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+class VerdictCache:
+    """Bounded LRU cache of moderation verdicts with near-duplicate lookup.
+
+    Entries are keyed by the exact SHA-256 of the stored file and indexed by a
+    perceptual hash. Near-duplicate search uses multi-index hashing: the 64-bit
+    hash is split into ``max_distance + 1`` chunks, so any hash within
+    ``max_distance`` bits must match at least one chunk exactly and only those
+    buckets have to be compared. Entries are persisted to SQLite and reloaded
+    on startup.
+
+    ``version`` identifies the model, prompts and thresholds the verdicts were
+    scored with. Verdicts stored under another version are dropped on startup
+    and never returned, so changing any of them doesn't serve stale verdicts.
+    """
+
+    def __init__(self, db_path, max_entries=100000, max_distance=4, version=''):
+        self.db_path = db_path
+        self.version = version
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._phash_owners = {}
+        chunks = max_distance + 1
+        base, extra = divmod(HASH_BITS, chunks)
+        self._chunks = []
+        shift = 0
+        for i in range(chunks):
+            width = base + (1 if i < extra else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._index = [dict() for _ in self._chunks]
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._init_db()
+        self._load()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    sha256 TEXT PRIMARY KEY,
+                    phash INTEGER,
+                    vulgarity_score REAL NOT NULL,
+                    content_category TEXT NOT NULL,
+                    is_safe INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    version TEXT
+                )
+            ''')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(verdicts)')]
+            if 'version' not in columns:
+                # Caches written before verdicts were versioned
+                conn.execute('ALTER TABLE verdicts ADD COLUMN version TEXT')
+            conn.execute('DELETE FROM verdicts WHERE version IS NOT ?', (self.version,))
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_verdicts_last_used ON verdicts (last_used)')
+
+    def _load(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT sha256, phash, vulgarity_score, content_category, is_safe FROM verdicts '
+                'WHERE version = ? ORDER BY last_used DESC LIMIT ?',
+                (self.version, self.max_entries)
+            ).fetchall()
+        for sha256, phash, score, category, is_safe in reversed(rows):
+            self._insert(sha256, None if phash is None else _to_unsigned(phash), score, category, bool(is_safe))
+
+    def _chunk_keys(self, phash):
+        return [(phash >> shift) & mask for shift, mask in self._chunks]
+
+    def _insert(self, sha256, phash, score, category, is_safe):
+        if sha256 in self._entries:
+            self._remove(sha256)
+        self._entries[sha256] = {
+            'sha256': sha256,
+            'phash': phash,
+            'vulgarity_score': score,
+            'content_category': category,
+            'is_safe': is_safe
+        }
+        if phash is not None:
+            owners = self._phash_owners.setdefault(phash, set())
+            if not owners:
+                for index, key in zip(self._index, self._chunk_keys(phash)):
+                    index.setdefault(key, set()).add(phash)
+            owners.add(sha256)
+
+    def _remove(self, sha256):
+        entry = self._entries.pop(sha256, None)
+        if entry is None or entry['phash'] is None:
+            return
+        phash = entry['phash']
+        owners = self._phash_owners.get(phash)
+        if owners is None:
+            return
+        owners.discard(sha256)
+        if not owners:
+            del self._phash_owners[phash]
+            for index, key in zip(self._index, self._chunk_keys(phash)):
+                bucket = index.get(key)
+                if bucket is not None:
+                    bucket.discard(phash)
+                    if not bucket:
+                        del index[key]
+
+    def _touch(self, sha256):
+        self._entries.move_to_end(sha256)
+        with self._connect() as conn:
+            conn.execute('UPDATE verdicts SET last_used = ? WHERE sha256 = ?', (time.time(), sha256))
+
+    def find_similar(self, phash):
+        """Return the cached phash closest to ``phash`` within max_distance, or None."""
+        best, best_distance = None, self.max_distance + 1
+        for index, key in zip(self._index, self._chunk_keys(phash)):
+            for candidate in index.get(key, ()):
+                distance = (candidate ^ phash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best
+
+    def lookup(self, sha256, phash=None):
+        """Return a cached verdict dict for an exact or near-duplicate upload, or None."""
+        with self._lock:
+            entry = self._entries.get(sha256)
+            if entry is None:
+                # Another worker process may have stored it since we loaded
+                with self._connect() as conn:
+                    row = conn.execute(
+                        'SELECT phash, vulgarity_score, content_category, is_safe FROM verdicts '
+                        'WHERE sha256 = ? AND version = ?',
+                        (sha256, self.version)
+                    ).fetchone()
+                if row is not None:
+                    self._insert(sha256, None if row[0] is None else _to_unsigned(row[0]), row[1], row[2], bool(row[3]))
+                    self._evict()
+                    entry = self._entries[sha256]
+            if entry is not None:
+                self._touch(sha256)
+                self.hits += 1
+                return dict(entry, match='exact')
+
+            if phash is not None:
+                similar = self.find_similar(phash)
+                if similar is not None:
+                    owner = next(iter(self._phash_owners[similar]))
+                    self._touch(owner)
+                    self.near_hits += 1
+                    return dict(self._entries[owner], match='near')
+
+            self.misses += 1
+            return None
+
+    def store(self, sha256, phash, vulgarity_score, content_category, is_safe):
+        """Record a verdict and evict the least recently used entries past the limit."""
+        with self._lock:
+            self._insert(sha256, phash, vulgarity_score, content_category, bool(is_safe))
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO verdicts (sha256, phash, vulgarity_score, content_category, is_safe, last_used, version) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (sha256, None if phash is None else _to_signed(phash), vulgarity_score,
+                     content_category, int(bool(is_safe)), time.time(), self.version)
+                )
+            self._evict()
+
+    def _evict(self):
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            sha256 = next(iter(self._entries))
+            self._remove(sha256)
+            evicted.append((sha256,))
+        if evicted:
+            with self._connect() as conn:
+                conn.executemany('DELETE FROM verdicts WHERE sha256 = ?', evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,49 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+class WorkerPool:
+    """Bounded pool that runs media jobs off the request thread.
+
+    ``job(*args)`` runs in a worker and must return a plain dict;
+    ``on_result(key, result)`` is called from a pool callback thread with that
+    dict, or ``{'error': ...}`` if the job raised. ``max_workers`` bounds how
+    many jobs run at once on this node.
+    """
+
+    def __init__(self, job, on_result, max_workers=2, executor='process', name='worker'):
+        self.job = job
+        self.on_result = on_result
+        self.max_workers = max_workers
+        self.executor_kind = executor
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None and self.executor_kind == 'thread':
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            elif self._executor is None:
+                # Spawn fresh interpreters so workers don't inherit torch thread state
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def submit(self, key, *args):
+        future = self._get_executor().submit(self.job, *args)
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def _finish(self, key, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error running {self.name} job for {key}: {e}")
+            result = {'error': str(e)}
+        try:
+            self.on_result(key, result)
+        except Exception as e:
+            print(f"Error applying {self.name} result for {key}: {e}")